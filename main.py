@@ -6,9 +6,13 @@ con preset ottimizzati per Resolume, vMix, Millumin e export generico.
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk, ImageFilter, ImageOps
+from PIL import Image, ImageTk, ImageFilter, ImageOps, ImageChops
 import threading
-from queue import Queue
+from queue import Queue, Full, Empty
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import io
 import math
 import re
 import zipfile
@@ -22,6 +26,7 @@ import os
 import logging
 import gc
 import copy
+import time
 import json
 
 # Configura logging (solo su file in temp user, non nella cartella dell'exe)
@@ -82,6 +87,152 @@ def _precompute_bayer_tiled(h, w):
     tiled = np.tile(_BAYER_8x8, (h // 8 + 1, w // 8 + 1))[:h, :w]
     return tiled[:, :, np.newaxis]
 
+
+GRAIN_PLANE_SEED = 2024  # Seed fisso: stesso grain a ogni export (segmenti riproducibili)
+
+
+def _precompute_grain_plane(h, w, grain):
+    """Pre-calcola il grain deband (h, w, 3) int8 in [-grain, grain], fisso per tutto l'export:
+    ogni frame e ogni regione (dirty rect, ritagliata come bayer_tiled) ricevono lo stesso grain,
+    quindi nessun grain in movimento sulle zone ferme."""
+    if np is None or grain <= 0:
+        return None
+    grain = min(127, grain)
+    return np.random.default_rng(GRAIN_PLANE_SEED).integers(-grain, grain + 1, (h, w, 3), dtype=np.int8)
+
+
+# Gamma del contenuto (sRGB / Rec.709 display): riferimento per la correzione gamma del LED wall
+CONTENT_GAMMA = 2.2
+
+
+def color_transform_params(filters, intensity=1.0):
+    """Parametri colore dai filtri (scalati da intensity): livelli, esponente gamma, gain RGB.
+    Esponente = CONTENT_GAMMA / wall_gamma: il receiving card applica wall_gamma, il contenuto
+    è pensato per 2.2 -> un wall a 1.8 riceve i mezzitoni scuriti di conseguenza.
+    """
+    scale = max(0.01, min(1.0, float(intensity)))
+    bl = int(filters.get("black_level", 0) * scale)
+    wl = int(255 - (255 - filters.get("white_level", 255)) * scale)
+    wl = max(wl, bl + 1)
+    wall_gamma = filters.get("wall_gamma") or CONTENT_GAMMA
+    exponent = round(1.0 + (CONTENT_GAMMA / wall_gamma - 1.0) * scale, 4)
+    gains = (filters.get("color_calibration") or {}).get("gains") or (1.0, 1.0, 1.0)
+    gains = tuple(round(1.0 + (float(g) - 1.0) * scale, 4) for g in gains[:3])
+    return bl, wl, exponent, gains
+
+
+@lru_cache(maxsize=16)
+def _color_lut(bl, wl, exponent, gains, peak):
+    """LUT 1D per canale (3, 256) float32 in ordine BGR, valori 0..peak"""
+    v = np.clip((np.arange(256, dtype=np.float64) - bl) / (wl - bl), 0.0, 1.0) ** exponent
+    table = np.stack([np.clip(v * g, 0.0, 1.0) * peak for g in reversed(gains)]).astype(np.float32)
+    table.setflags(write=False)
+    return table
+
+
+def build_color_lut(filters, intensity=1.0, peak=255.0):
+    """LUT colore pre-calcolata (livelli + gamma del wall + gain di calibrazione), o None se la
+    trasformazione è solo lineare (livelli: più veloce in aritmetica float che con un gather).
+    Tutte le correzioni sono separabili per canale: basta una LUT 1D, niente 3D.
+    """
+    if not VIDEO_SUPPORT:
+        return None
+    bl, wl, exponent, gains = color_transform_params(filters, intensity)
+    if exponent == 1.0 and gains == (1.0, 1.0, 1.0):
+        return None
+    return _color_lut(bl, wl, exponent, gains, float(peak))
+
+
+# Deband: deband_threshold in 1/16 di livello 8 bit (scala f3kdb), maschera su luma ridotta 1/4
+DEBAND_THRESHOLD_UNIT = 16.0
+DEBAND_MASK_SCALE = 4
+
+
+def deband_flat_mask(bgr, threshold):
+    """Maschera zone piatte (gradienti lenti, dove il banding è visibile) da un frame BGR uint8.
+    Luma ridotta di DEBAND_MASK_SCALE, escursione locale 3x3 (dilate - erode) <= soglia, bordi
+    ammorbiditi e riportata a piena risoluzione. Restituisce (h, w, 1) float32 0-1, o None se
+    il frame non ha zone piatte (nessun grain/dither da calcolare).
+    """
+    h, w = bgr.shape[:2]
+    small = cv2.resize(bgr, (max(1, w // DEBAND_MASK_SCALE), max(1, h // DEBAND_MASK_SCALE)),
+                       interpolation=cv2.INTER_AREA)
+    luma = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    kernel = np.ones((3, 3), np.uint8)
+    spread = cv2.dilate(luma, kernel) - cv2.erode(luma, kernel)
+    flat = (spread <= threshold / DEBAND_THRESHOLD_UNIT).astype(np.float32)
+    if not flat.any():
+        return None
+    flat = cv2.blur(flat, (3, 3))
+    return cv2.resize(flat, (w, h), interpolation=cv2.INTER_LINEAR)[:, :, np.newaxis]
+
+
+# Dirty rect (export video): alone attorno ai layer video per i filtri a finestra (maschera deband
+# 1/4 + blur, median/bilateral, sharpen), allineato alla griglia Bayer 8x8; oltre questa frazione
+# del frame il composito completo costa uguale
+DIRTY_RECT_HALO = 24
+DIRTY_RECT_MAX_FRACTION = 0.5
+
+
+def dirty_rect(boxes, frame_w, frame_h, halo=DIRTY_RECT_HALO):
+    """Unione dei box (x, y, w, h) -> (interno, esteso), o None se vuota o troppo grande.
+    interno = box + alone: pixel che i filtri a finestra cambiano (da copiare nel frame);
+    esteso = interno + alone, allineato a 8 px: contesto necessario per processarli.
+    """
+    x0 = max(0, min(x for x, _, _, _ in boxes) - halo)
+    y0 = max(0, min(y for _, y, _, _ in boxes) - halo)
+    x1 = min(frame_w, max(x + w for x, _, w, _ in boxes) + halo)
+    y1 = min(frame_h, max(y + h for _, y, _, h in boxes) + halo)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    outer = (max(0, (x0 - halo) // 8 * 8), max(0, (y0 - halo) // 8 * 8),
+             min(frame_w, -(-(x1 + halo) // 8) * 8), min(frame_h, -(-(y1 + halo) // 8) * 8))
+    if (outer[2] - outer[0]) * (outer[3] - outer[1]) > frame_w * frame_h * DIRTY_RECT_MAX_FRACTION:
+        return None
+    return (x0, y0, x1, y1), outer
+
+
+# Denoise temporale: soglia di movimento in livelli 8 bit (sopra = pixel in movimento, non mediato)
+TEMPORAL_MOTION_LEVELS = 4.0
+TEMPORAL_MOTION_PER_STRENGTH = 16.0
+# Frame processati senza encode prima di ogni segmento: lo stato arriva a regime (peso residuo
+# dello stato iniziale strength^8 < 2% con strength <= 0.6), niente salto di rumore al cambio segmento
+TEMPORAL_WARMUP_FRAMES = 8
+
+
+def temporal_denoise(frame, state, strength, unit=1.0):
+    """Media ricorsiva adattiva al movimento: out = frame + w * (precedente - frame).
+    w = strength dove il frame è fermo, scende a 0 quando la differenza (luma) supera la soglia:
+    niente scie sul movimento, niente flicker su grain/rumore statico.
+    state: dict per sequenza di frame (un segmento, un loop di export); tiene solo l'uscita
+    precedente, che per un filtro ricorsivo riassume tutta la storia.
+    unit: 1 livello 8 bit nella scala del frame (257 a 16 bit).
+    """
+    src = frame if frame.dtype == np.uint8 else frame.astype(np.float32)
+    prev = state.get("prev")
+    state["prev"] = src
+    if prev is None or prev.shape != src.shape or prev.dtype != src.dtype:
+        return frame
+    strength = min(0.6, strength)
+    thr = (TEMPORAL_MOTION_LEVELS + TEMPORAL_MOTION_PER_STRENGTH * strength) * unit
+    motion = cv2.cvtColor(cv2.absdiff(src, prev), cv2.COLOR_BGR2GRAY).astype(np.float32, copy=False)
+    weight = np.maximum(thr - motion, 0.0) * (strength / thr)
+    out = cv2.blendLinear(src, prev, 1.0 - weight, weight)
+    state["prev"] = out
+    if out.dtype == frame.dtype:
+        return out
+    return np.clip(out + 0.5, 0, np.iinfo(frame.dtype).max).astype(frame.dtype)
+
+
+def apply_color_lut(bgr, table):
+    """Gather vettoriale: ndarray BGR uint8 -> float32 (un lookup per pixel)"""
+    if (table[0] == table[1]).all() and (table[1] == table[2]).all():
+        return table[0][bgr]
+    out = np.empty(bgr.shape, dtype=np.float32)
+    for c in range(3):
+        out[:, :, c] = table[c][bgr[:, :, c]]
+    return out
+
 # Costanti per i formati supportati (set per lookup O(1))
 IMAGE_FORMATS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.tiff'}
 VIDEO_FORMATS = {'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm'}
@@ -351,6 +502,15 @@ VIDEO_PROFILES_BASE = {
                    "color_space": "Rec.709", "bit_depth": 10,
                    "bitrate_mode": "vbr", "bitrate_1080p_mbps": 147, "bitrate_4k_mbps": 588,
                    "gop_size": 1, "b_frames": 0},
+    # Alpha (export RGBA): HAP Alpha per Resolume/Millumin, ProRes 4444 per Millumin broadcast
+    "hap_alpha": {"codec": "hap", "format_name": "hap_alpha", "pixel_format": "rgba", "container": "mov",
+                  "color_space": "sRGB", "bit_depth": 8, "alpha": True,
+                  "bitrate_mode": "vbr", "bitrate_1080p_mbps": 70, "bitrate_4k_mbps": 280,
+                  "gop_size": 1, "b_frames": 0, "hap_chunks": 8},
+    "prores_4444": {"codec": "prores_ks", "profile": "4", "pixel_format": "yuva444p10le", "container": "mov",
+                    "color_space": "Rec.709", "bit_depth": 10, "alpha": True,
+                    "bitrate_mode": "vbr", "bitrate_1080p_mbps": 330, "bitrate_4k_mbps": 1320,
+                    "gop_size": 1, "b_frames": 0},
     "h264_intra": {"codec": "libx264", "profile": "high", "level": "5.2", "pixel_format": "yuv420p",
                    "container": "mp4", "color_space": "Rec.709", "bit_depth": 8,
                    "bitrate_mode": "cbr", "bitrate_1080p_mbps": 200, "bitrate_4k_mbps": 800,
@@ -384,12 +544,24 @@ CODEC_COMPATIBILITY = {
     "generic_h265": "30-40% più compatto di H.264. Richiede hardware recente.",
 }
 
+# Banda di playback per file sostenibile dal media server (MB/s, valori indicativi per la stima export):
+# HAP letto da SSD SATA e decompresso in GPU, DNxHR/ProRes decodificati in CPU,
+# H.264 High 5.2 (300 Mbit/s) e H.265 Main 5.1 high tier (160 Mbit/s) dal decoder hardware
+MEDIA_SERVER_PLAYBACK_MBPS = {
+    "resolume": 500,
+    "vmix": 300,
+    "millumin": 400,
+    "generic_h264": 37.5,
+    "generic_h265": 20,
+}
+
 
-def get_export_profile(led_wall_key, software_key, output_hz, custom_presets=None):
+def get_export_profile(led_wall_key, software_key, output_hz, custom_presets=None, alpha=False):
     """
     Restituisce il profilo export ottimale per la combinazione LED wall + software.
     output_hz: frequenza segnale (25/30/50/60) - usata per FPS
     custom_presets: {name: data} per preset custom (filtri da magic_upscale_filters)
+    alpha: codec con canale alpha dove il software lo supporta (HAP Alpha / ProRes 4444)
     """
     custom_presets = custom_presets or {}
     wall_spec = LED_WALL_SPECS.get(led_wall_key)
@@ -399,7 +571,8 @@ def get_export_profile(led_wall_key, software_key, output_hz, custom_presets=Non
         gs = cdata.get("grayscale_specs", {})
         gray = gs.get("gray_depth_bits", 14)
         tier = QUALITY_ENTRY if gray <= 13 else (QUALITY_BROADCAST if gray >= 16 else QUALITY_PROFESSIONAL)
-        wall_spec = {"quality_tier": tier}
+        wall_spec = {"quality_tier": tier, "gamma": gs.get("gamma", CONTENT_GAMMA),
+                     "color_calibration": cdata.get("color_calibration")}
         filters = cdata.get("magic_upscale_filters", FILTER_PROFILES["novastar_a8_plus"])
     elif not wall_spec:
         wall_spec = LED_WALL_SPECS["novastar_a8_plus"]
@@ -408,6 +581,11 @@ def get_export_profile(led_wall_key, software_key, output_hz, custom_presets=Non
     else:
         filters = FILTER_PROFILES.get(led_wall_key, FILTER_PROFILES["novastar_a8_plus"])
     tier = wall_spec["quality_tier"]
+    # Gamma e calibrazione del wall: entrano nella LUT colore del processing (build_color_lut)
+    filters = dict(filters)
+    filters.setdefault("wall_gamma", wall_spec.get("gamma", CONTENT_GAMMA))
+    if wall_spec.get("color_calibration"):
+        filters.setdefault("color_calibration", wall_spec["color_calibration"])
 
     # Video profile
     if software_key == "vmix":
@@ -420,6 +598,11 @@ def get_export_profile(led_wall_key, software_key, output_hz, custom_presets=Non
         vid_key = "h265_intra"
     else:
         vid_key = "h264_intra"
+    # vMix (DNxHR) e H.264/H.265 non hanno alpha: restano RGB
+    if alpha and software_key == "resolume":
+        vid_key = "hap_alpha"
+    elif alpha and software_key == "millumin":
+        vid_key = "prores_4444" if tier == QUALITY_BROADCAST else "hap_alpha"
 
     video = copy.deepcopy(VIDEO_PROFILES_BASE[vid_key])
     video["framerate"] = min(output_hz, 60)
@@ -449,13 +632,365 @@ def get_export_profile(led_wall_key, software_key, output_hz, custom_presets=Non
     }
 
 
+# =============================================================================
+# IMPORT MEDIA - probe ffprobe + decodifica anteprima (eseguiti nel thread pool)
+# =============================================================================
+
+# Worker import parallelo: decodifica I/O-bound (PIL/FFmpeg rilasciano il GIL)
+IMPORT_MAX_WORKERS = max(2, min(8, os.cpu_count() or 4))
+
+
+def _subprocess_flags():
+    """creationflags per subprocess: nessuna finestra console su Windows"""
+    return getattr(subprocess, 'CREATE_NO_WINDOW', 0) if sys.platform == 'win32' else 0
+
+
+def _find_ffprobe(ffmpeg_path):
+    """Cerca ffprobe accanto a ffmpeg (stessa cartella bin), poi nel PATH."""
+    import shutil
+    if ffmpeg_path:
+        p = Path(ffmpeg_path)
+        sibling = p.with_name("ffprobe.exe" if p.suffix.lower() == ".exe" else "ffprobe")
+        if sibling.is_file():
+            return str(sibling)
+    return shutil.which("ffprobe")
+
+
+def _parse_ffprobe_rate(rate):
+    """Converte un frame rate ffprobe ('50/1', '30000/1001') in float (0.0 se non valido)"""
+    try:
+        if not rate:
+            return 0.0
+        if "/" in rate:
+            num, den = rate.split("/", 1)
+            return float(num) / float(den) if float(den) else 0.0
+        return float(rate)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def probe_video_ffprobe(ffprobe_path, filepath, timeout=15):
+    """Legge fps, frame count, durata e dimensioni del primo stream video via ffprobe.
+    Restituisce dict {fps, frame_count, duration, width, height} oppure None se ffprobe fallisce.
+    """
+    if not ffprobe_path:
+        return None
+    cmd = [ffprobe_path, "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "stream=width,height,avg_frame_rate,r_frame_rate,nb_frames,duration"
+           ":format=duration", "-of", "json", str(filepath)]
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout,
+                             creationflags=_subprocess_flags())
+        if out.returncode != 0:
+            logger.debug(f"ffprobe {filepath}: {out.stderr.strip()[-200:]}")
+            return None
+        data = json.loads(out.stdout or "{}")
+        streams = data.get("streams") or []
+        if not streams:
+            return None
+        st = streams[0]
+        fps = _parse_ffprobe_rate(st.get("avg_frame_rate")) or _parse_ffprobe_rate(st.get("r_frame_rate"))
+        if fps <= 0:
+            fps = 30.0
+        try:
+            duration = float(st.get("duration") or data.get("format", {}).get("duration") or 0)
+        except ValueError:
+            duration = 0.0
+        try:
+            frame_count = int(st.get("nb_frames") or 0)
+        except ValueError:
+            frame_count = 0
+        if frame_count <= 0 and duration > 0:
+            frame_count = int(round(duration * fps))
+        if duration <= 0 and frame_count > 0:
+            duration = frame_count / fps
+        return {"fps": fps, "frame_count": frame_count, "duration": duration,
+                "width": int(st.get("width") or 0), "height": int(st.get("height") or 0)}
+    except (subprocess.TimeoutExpired, OSError, ValueError) as e:
+        logger.debug(f"ffprobe {filepath}: {e}")
+        return None
+
+
+def video_frame_counts(caps, ffmpeg_path=None):
+    """Frame per layer video dell'export {layer: n}: ffprobe (nb_frames, o durata x fps) se disponibile.
+    CAP_PROP_FRAME_COUNT di OpenCV è stimato dall'header (spesso errato su VFR e MP4 senza nb_frames):
+    resta solo come fallback senza ffprobe.
+    """
+    ffprobe_path = _find_ffprobe(ffmpeg_path)
+    counts = {}
+    for layer, cap in caps.items():
+        info = probe_video_ffprobe(ffprobe_path, layer.video_path) if ffprobe_path else None
+        if info and info["frame_count"] > 0:
+            counts[layer] = info["frame_count"]
+        else:
+            counts[layer] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    return counts
+
+
+def decode_first_frame_ffmpeg(ffmpeg_path, filepath, timeout=30):
+    """Decodifica solo il primo frame video con FFmpeg (BMP su pipe). None se fallisce."""
+    if not ffmpeg_path:
+        return None
+    cmd = [ffmpeg_path, "-v", "error", "-i", str(filepath), "-frames:v", "1",
+           "-f", "image2pipe", "-vcodec", "bmp", "pipe:1"]
+    try:
+        out = subprocess.run(cmd, capture_output=True, timeout=timeout, creationflags=_subprocess_flags())
+        if out.returncode != 0 or not out.stdout:
+            return None
+        img = Image.open(io.BytesIO(out.stdout))
+        img.load()
+        return img.convert('RGB')
+    except (subprocess.TimeoutExpired, OSError, ValueError) as e:
+        logger.debug(f"Primo frame FFmpeg {filepath}: {e}")
+        return None
+
+
+def decode_media_file(filepath, ffmpeg_path=None, ffprobe_path=None, cancel_event=None):
+    """Decodifica un file per l'import (thread-safe, nessun accesso Tk).
+    Immagini: PIL. Video: primo frame + metadata via FFmpeg/ffprobe, fallback OpenCV.
+    Restituisce dict {path, is_video, image, fps, frame_count, duration} oppure None se annullato.
+    """
+    filepath = str(filepath)
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+    if not os.path.isfile(filepath):
+        raise FileNotFoundError(f"File non trovato: {filepath}")
+    ext = Path(filepath).suffix.lower()
+    if ext in IMAGE_FORMATS:
+        img = Image.open(filepath)
+        img.load()  # Forza il caricamento e rilascia il file handle
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA')
+        return {"path": filepath, "is_video": False, "image": img}
+    if ext not in VIDEO_FORMATS:
+        raise ValueError(f"Formato non supportato: {ext}")
+    if not VIDEO_SUPPORT:
+        raise RuntimeError("OpenCV non installato. Installa con: pip install opencv-python")
+
+    meta = probe_video_ffprobe(ffprobe_path, filepath)
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+    img = decode_first_frame_ffmpeg(ffmpeg_path, filepath) if meta else None
+    if img is None or meta is None:
+        # Fallback OpenCV (FFmpeg/ffprobe assenti o file non leggibile da FFmpeg)
+        cap = cv2.VideoCapture(filepath)
+        try:
+            if not cap.isOpened():
+                raise RuntimeError("Impossibile aprire il video")
+            if img is None:
+                ret, frame = cap.read()
+                if not ret:
+                    raise RuntimeError("Impossibile leggere il primo frame")
+                img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            if meta is None:
+                fps = cap.get(cv2.CAP_PROP_FPS)
+                if fps <= 0:
+                    fps = 30.0  # Fallback sicuro
+                frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                meta = {"fps": fps, "frame_count": frame_count,
+                        "duration": frame_count / fps if fps > 0 else 0}
+        finally:
+            cap.release()
+    return {"path": filepath, "is_video": True, "image": img, "fps": meta["fps"],
+            "frame_count": meta["frame_count"], "duration": meta["duration"]}
+
+
+# =============================================================================
+# PROGETTO - file .rcproj (JSON) + cache asset content-addressed
+# =============================================================================
+
+PROJECT_EXT = ".rcproj"
+PROJECT_FORMAT = "r-converter-project"
+PROJECT_VERSION = 1
+
+# Cache asset: proxy raw (caricamento = lettura file, nessuna decodifica)
+ASSET_CACHE_MAX_BYTES = 4 * 1024 ** 3
+ASSET_HASH_FULL_LIMIT = 64 * 1024 * 1024   # sopra questa soglia: hash campionato
+ASSET_HASH_SAMPLE_BYTES = 4 * 1024 * 1024  # campione testa/centro/coda
+
+
+def _get_app_data_dir():
+    """Cartella dati utente (%LOCALAPPDATA%/R-Converter, ~/.r-converter su altri OS)"""
+    if sys.platform == 'win32':
+        return Path(os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))) / 'R-Converter'
+    return Path.home() / '.r-converter'
+
+
+def compute_asset_hash(filepath):
+    """Hash del contenuto di un file sorgente (blake2b-160).
+    File > ASSET_HASH_FULL_LIMIT: dimensione + campioni testa/centro/coda (video multi-GB in <50ms).
+    """
+    import hashlib
+    h = hashlib.blake2b(digest_size=20)
+    size = os.path.getsize(filepath)
+    h.update(str(size).encode())
+    with open(filepath, "rb") as f:
+        if size <= ASSET_HASH_FULL_LIMIT:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        else:
+            for pos in (0, size // 2, size - ASSET_HASH_SAMPLE_BYTES):
+                f.seek(max(0, pos))
+                h.update(f.read(ASSET_HASH_SAMPLE_BYTES))
+    return h.hexdigest()
+
+
+def compute_image_hash(img):
+    """Hash dei pixel di un'immagine PIL (layer senza file sorgente)"""
+    import hashlib
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{img.mode}:{img.size[0]}x{img.size[1]}".encode())
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+class AssetCache:
+    """Cache content-addressed: <root>/<hash[:2]>/<hash>/{meta.json, proxy.raw}.
+    proxy.raw contiene i pixel non compressi dell'immagine del layer (o primo frame video):
+    riaprire un progetto legge file, senza decodificare sorgenti né lanciare ffprobe.
+    """
+
+    def __init__(self, root_dir, max_bytes=ASSET_CACHE_MAX_BYTES):
+        self.root_dir = Path(root_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _entry_dir(self, asset_hash):
+        return self.root_dir / asset_hash[:2] / asset_hash
+
+    def has(self, asset_hash):
+        return (self._entry_dir(asset_hash) / "meta.json").is_file()
+
+    def store(self, asset_hash, media):
+        """Salva proxy e metadata (scrittura atomica: meta.json per ultimo)"""
+        entry = self._entry_dir(asset_hash)
+        if self.has(asset_hash):
+            return
+        img = media["image"]
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA')
+        with self._lock:
+            entry.mkdir(parents=True, exist_ok=True)
+            (entry / "proxy.raw").write_bytes(img.tobytes())
+            meta = {"mode": img.mode, "size": list(img.size), "is_video": bool(media.get("is_video")),
+                    "fps": media.get("fps"), "frame_count": media.get("frame_count"),
+                    "duration": media.get("duration")}
+            tmp = entry / "meta.json.tmp"
+            tmp.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp, entry / "meta.json")
+
+    def load(self, asset_hash):
+        """Carica il media dalla cache (dict come decode_media_file, path=None) oppure None"""
+        entry = self._entry_dir(asset_hash)
+        try:
+            meta = json.loads((entry / "meta.json").read_text(encoding="utf-8"))
+            raw = (entry / "proxy.raw").read_bytes()
+            img = Image.frombytes(meta["mode"], tuple(meta["size"]), raw)
+            os.utime(entry / "meta.json")  # LRU: ultimo utilizzo
+        except (OSError, ValueError, KeyError) as e:
+            logger.debug(f"Asset cache miss {asset_hash}: {e}")
+            return None
+        media = {"path": None, "is_video": meta.get("is_video", False), "image": img}
+        if media["is_video"]:
+            media.update(fps=meta.get("fps") or 30.0, frame_count=meta.get("frame_count") or 0,
+                         duration=meta.get("duration") or 0.0)
+        return media
+
+    def prune(self):
+        """Rimuove le entry meno usate finché la cache supera max_bytes"""
+        import shutil
+        entries = []
+        total = 0
+        for meta in self.root_dir.glob("*/*/meta.json"):
+            entry = meta.parent
+            try:
+                size = sum(p.stat().st_size for p in entry.iterdir())
+                entries.append((meta.stat().st_mtime, size, entry))
+                total += size
+            except OSError:
+                continue
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logger.info(f"Asset cache: rimossa {entry.name} ({size / 1048576:.1f} MB)")
+
+
+def _asset_stat(filepath):
+    """(size, mtime_ns) per verificare senza ri-hash che il sorgente non sia cambiato"""
+    st = os.stat(filepath)
+    return st.st_size, st.st_mtime_ns
+
+
+def write_project_file(filepath, project):
+    """Scrive il progetto JSON in modo atomico (tmp + replace)"""
+    tmp = f"{filepath}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(project, f, indent=2)
+    os.replace(tmp, filepath)
+
+
+def read_project_file(filepath):
+    """Legge e valida un file progetto .rcproj"""
+    with open(filepath, encoding="utf-8") as f:
+        project = json.load(f)
+    if not isinstance(project, dict) or project.get("format") != PROJECT_FORMAT:
+        raise ValueError("File progetto non valido")
+    if project.get("version", 0) > PROJECT_VERSION:
+        raise ValueError(f"Versione progetto {project.get('version')} non supportata")
+    return project
+
+
+def resolve_project_asset(asset, project_dir, cache, ffmpeg_path=None, ffprobe_path=None):
+    """Risolve un asset del progetto (thread pool). Ordine:
+    1. sorgente invariato (size+mtime) e proxy in cache -> proxy, nessuna decodifica
+    2. sorgente spostato/copiato -> ri-hash; se il contenuto coincide usa il proxy
+    3. cache miss -> decodifica sorgente e popola la cache
+    4. sorgente assente -> solo proxy (video non esportabile finché il file non torna)
+    Restituisce (media, hash, path sorgente o None).
+    """
+    asset_hash = asset.get("hash")
+    candidates = []
+    if asset.get("path"):
+        candidates.append(asset["path"])
+    if asset.get("rel_path"):
+        candidates.append(os.path.normpath(os.path.join(project_dir, asset["rel_path"])))
+    source = next((c for c in candidates if os.path.isfile(c)), None)
+
+    if source is not None:
+        try:
+            unchanged = list(_asset_stat(source)) == [asset.get("size"), asset.get("mtime_ns")]
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            new_hash = compute_asset_hash(source)
+            if new_hash != asset_hash:
+                logger.warning(f"Asset modificato dopo il salvataggio: {source}")
+            asset_hash = new_hash
+    if asset_hash:
+        media = cache.load(asset_hash)
+        if media is not None:
+            return media, asset_hash, source
+    if source is None:
+        raise FileNotFoundError(f"Asset non trovato (né sorgente né cache): {asset.get('path')}")
+    media = decode_media_file(source, ffmpeg_path, ffprobe_path)
+    cache.store(asset_hash, media)
+    return media, asset_hash, source
+
+
 class ImageLayer:
     """Rappresenta un'immagine nel collage con le sue proprietà"""
     __slots__ = ['id', 'original_image', 'name', 'offset_x', 'offset_y', 'zoom',
                  'rotation', 'flip_h', 'flip_v', 'is_video', 'video_path',
-                 'video_fps', 'video_frames', 'bounds_in_canvas', '_cache', '_cache_key',
+                 'video_fps', 'video_frames', 'source_path', 'bounds_in_canvas', '_cache', '_cache_key',
                  '_zoom_cache', '_zoom_cache_key']
 
+    # Campi serializzati nel file progetto (.rcproj)
+    STATE_FIELDS = ('name', 'offset_x', 'offset_y', 'zoom', 'rotation', 'flip_h', 'flip_v',
+                    'is_video', 'video_fps', 'video_frames')
+
     def __init__(self, image, name="Immagine"):
         self.id = str(uuid.uuid4())[:8]
         self.original_image = image
@@ -475,6 +1010,9 @@ class ImageLayer:
         self.video_fps = 30
         self.video_frames = 0
 
+        # File sorgente (immagine o video) - riferimento asset nel progetto
+        self.source_path = None
+
         # Bounds calcolati nel canvas
         self.bounds_in_canvas = None  # (x, y, w, h)
 
@@ -545,159 +1083,1566 @@ class ImageLayer:
         self.original_image = None
         self.bounds_in_canvas = None
 
+    def get_state(self):
+        """Trasformazioni e proprietà serializzabili (file progetto)"""
+        return {field: getattr(self, field) for field in self.STATE_FIELDS}
+
+    def set_state(self, state):
+        """Ripristina trasformazioni e proprietà da get_state (campi mancanti ignorati)"""
+        for field in self.STATE_FIELDS:
+            if field in state:
+                setattr(self, field, state[field])
+        self.invalidate_cache()
+
     def get_display_name(self):
         return f"{self.name} ({self.id})"
 
 
-class RConverter:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("R-Converter PRO  •  Broadcast LED Wall")
-        self.root.state('zoomed')  # Fullscreen su Windows
-        self.root.minsize(1100, 700)
+def resolve_project_assets(project, project_path, cache, ffmpeg_path=None):
+    """Risolve in parallelo tutti gli asset di un progetto (thread pool).
+    Restituisce ({hash: (media, hash, sorgente)}, lista errori).
+    """
+    project_dir = os.path.dirname(os.path.abspath(project_path))
+    ffprobe_path = _find_ffprobe(ffmpeg_path)
+    resolved = {}
+    errors = []
+    with ThreadPoolExecutor(max_workers=IMPORT_MAX_WORKERS, thread_name_prefix="project") as pool:
+        futures = [(a, pool.submit(resolve_project_asset, a, project_dir, cache, ffmpeg_path, ffprobe_path))
+                   for a in project.get("assets", [])]
+        for asset, future in futures:
+            try:
+                resolved[asset.get("hash")] = future.result()
+            except Exception as e:
+                logger.error(f"Asset progetto: {e}")
+                errors.append(str(e))
+    return resolved, errors
 
-        # Lista delle immagini (layers)
-        self.layers = []
-        self.selected_layer = None
 
-        # Stato video (per il primo layer se è video)
-        self.is_video = False
-        self.video_file = None
+# =============================================================================
+# MEMORIA EXPORT - code di frame dimensionate sulla RAM disponibile
+# =============================================================================
 
-        # Parametri output (default: Holiday Inn 3840x1152 @ 50Hz)
-        self.output_width = tk.IntVar(value=3840)
-        self.output_height = tk.IntVar(value=1152)
-        self.bg_color_var = tk.StringVar(value="#000000")
+EXPORT_MEMORY_FRACTION = 0.5  # Quota della RAM libera (oltre la riserva) per i buffer di export
+EXPORT_MEMORY_RESERVE = 1024 ** 3  # RAM lasciata a sistema e FFmpeg: sotto questa soglia code al minimo
+EXPORT_MEMORY_SAMPLE_S = 0.5  # Intervallo minimo tra due letture della RAM libera
 
-        # Parametri qualità (inizializzati qui, usati nel pannello export)
-        self.img_quality = tk.IntVar(value=100)
 
-        # Stato UI
-        self.display_image = None
-        self.canvas_bounds = None
-        self.preview_scale = 1.0
-        self.handles = {}
+def available_memory():
+    """RAM fisica disponibile in byte (None se non determinabile)"""
+    if sys.platform == 'win32':
+        import ctypes
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+        stat = MEMORYSTATUSEX()
+        stat.dwLength = ctypes.sizeof(stat)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(stat)):
+            return stat.ullAvailPhys
+        return None
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
 
-        # Stato trascinamento
-        self.is_dragging = False
-        self.active_handle = None
-        self.drag_start_x = 0
-        self.drag_start_y = 0
-        self.drag_start_offset_x = 0
-        self.drag_start_offset_y = 0
-        self.resize_start_zoom = 100
-        self.resize_start_pos = (0, 0)
-        self.rotation_start_angle = 0
-        self.rotation_start_value = 0
-        self.rotation_center = (0, 0)
 
-        # Debounce per redraw
-        self._redraw_scheduled = False
-        self._redraw_job = None
-        self._resize_job = None
+def peak_process_memory():
+    """Picco di memoria residente del processo in byte (None se non determinabile)"""
+    if sys.platform == 'win32':
+        import ctypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+        return None
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024  # Linux: kB
+    except (ImportError, OSError, ValueError):
+        return None
 
-        # Cache dimensioni canvas (evita update_idletasks nel hot path)
-        self._cached_canvas_size = (0, 0)
 
-        # Oggetti canvas riutilizzabili (evita delete/create ogni frame)
-        self._canvas_persistent_ids = None
+class ExportMemoryGovernor:
+    """Budget RAM delle code di frame, condiviso da tutti gli export del processo (coda render,
+    worker segmento, encoder). Ogni coda si registra con il peso di un elemento; la sua profondità
+    è la quota del budget ((RAM libera + già in coda - riserva) x fraction, diviso tra le code
+    attive) in elementi, tra minimo e massimo. Ricalcolata dal producer prima di ogni put: sotto
+    pressione le code si accorciano subito, con RAM abbondante bufferizzano di più.
+    """
 
-        # Flag per evitare re-bind ricorsivo scroll
-        self._scroll_bound = False
-        self._scroll_bound_right = False
+    def __init__(self, fraction=EXPORT_MEMORY_FRACTION, reserve=EXPORT_MEMORY_RESERVE):
+        self.fraction = fraction
+        self.reserve = reserve
+        self._lock = threading.Lock()
+        self._queues = {}  # id(coda) -> {"queue", "item_bytes", "min", "max", "default"}
+        self._sample = (0.0, None)
+        self.peak_buffered = 0
+
+    def _available(self):
+        now = time.monotonic()
+        sampled_at, value = self._sample
+        if value is None or now - sampled_at >= EXPORT_MEMORY_SAMPLE_S:
+            value = available_memory()
+            self._sample = (now, value)
+        return value
+
+    def register(self, queue, item_bytes, minimum, maximum, default):
+        """Coda governata: profondità tra minimum e maximum (default se la RAM non è leggibile)"""
+        with self._lock:
+            if not self._queues:
+                self.peak_buffered = 0  # Nuova sessione di export
+            self._queues[id(queue)] = {"queue": queue, "item_bytes": max(1, item_bytes),
+                                       "min": minimum, "max": maximum, "default": default}
+        return self.adapt(queue)
+
+    def unregister(self, queue):
+        with self._lock:
+            self._queues.pop(id(queue), None)
+
+    def adapt(self, queue):
+        """Ricalcola la profondità della coda (chiamato dal producer prima di put)"""
+        with self._lock:
+            entry = self._queues.get(id(queue))
+            if entry is None:
+                return queue.maxsize
+            buffered = sum(e["item_bytes"] * e["queue"].qsize() for e in self._queues.values())
+            self.peak_buffered = max(self.peak_buffered, buffered)
+            available = self._available()
+            if available is None:
+                depth = entry["default"]
+            else:
+                share = max(0, available + buffered - self.reserve) * self.fraction / len(self._queues)
+                depth = int(share // entry["item_bytes"])
+            depth = max(entry["min"], min(entry["max"], depth))
+        if depth != queue.maxsize:
+            with queue.mutex:
+                queue.maxsize = depth
+                queue.not_full.notify_all()
+        return depth
+
+    def frame_budget(self, item_bytes, maximum):
+        """Elementi che entrano nel budget (buffer non in coda, es. frame GIF), tra 1 e maximum"""
+        with self._lock:
+            available = self._available()
+        if available is None:
+            return maximum
+        return max(1, min(maximum, int(max(0, available - self.reserve) * self.fraction // max(1, item_bytes))))
+
+    def describe(self):
+        """Riepilogo per il log a fine export"""
+        peak = peak_process_memory()
+        text = f"Memoria export: picco frame in coda {self.peak_buffered / 1024 ** 2:.0f} MB"
+        if peak is not None:
+            text += f", picco processo {peak / 1024 ** 2:.0f} MB"
+        return text
+
+
+EXPORT_MEMORY = ExportMemoryGovernor()
+
+
+class ExportCancelled(Exception):
+    """Export annullato dall'utente: nessun retry, ripresa o fallback OpenCV"""
+
+
+class ExportController:
+    """Annulla / pausa di un export. Controllo cooperativo: reader, composito e writer chiamano
+    checkpoint() (o wait() nei thread che non devono sollevare) a ogni frame; con cancel() i loop
+    escono, gli encoder FFmpeg vengono terminati e i VideoCapture rilasciati dai rispettivi finally.
+    """
 
-        # Parametri qualità export (gestiti da IMAGE_PROFILES via get_export_profile)
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
 
-        # PRO: Broadcast - variabili pannello destro
-        self.output_hz = tk.IntVar(value=HZ_DEFAULT)
-        self.led_wall_var = tk.StringVar(value="novastar_a8_plus")
-        self.software_target_var = tk.StringVar(value="resolume")
-        self.custom_presets = {}
-        # Processing sempre attivo al massimo (nascosto, obbligatorio)
-        self.proc_uniform = tk.BooleanVar(value=True)
-        self.proc_anti_solar = tk.BooleanVar(value=True)
-        self.proc_anti_flicker = tk.BooleanVar(value=True)
-        self.proc_anti_pixel = tk.BooleanVar(value=True)
-        self.proc_intensity = tk.DoubleVar(value=100.0)  # 0-100 per Scale, convertito a 0-1 in processing
-        self.ffmpeg_path = None
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()  # Sblocca i thread in pausa
 
-        # Setup
-        self.setup_style()
-        self.create_widgets()
-        self.setup_bindings()
-        self.setup_drag_and_drop()
-        self._find_ffmpeg()
-        self._load_presets_from_appdata()
+    def pause(self):
+        if not self._cancelled.is_set():
+            self._running.clear()
 
-        # Inizializza canvas con preview area LED wall (retry se dimensioni non ancora pronte)
-        self.root.after(100, self._init_canvas_preview_with_retry)
+    def resume(self):
+        self._running.set()
 
-    def setup_style(self):
-        style = ttk.Style()
-        style.theme_use('clam')
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
 
-        # Palette Blu Moderna - Tech/Cyber style
-        self.bg_color = "#0a1929"        # Sfondo blu notte profondo
-        self.bg_secondary = "#132f4c"    # Sfondo secondario blu scuro
-        self.bg_tertiary = "#1a3a5c"     # Terziario per hover
-        self.fg_color = "#e3f2fd"        # Testo bianco-blu
-        self.fg_secondary = "#90caf9"    # Testo secondario blu chiaro
-        self.accent_color = "#29b6f6"    # Cyan/azzurro brillante
-        self.accent_hover = "#4fc3f7"    # Hover più chiaro
-        self.accent_glow = "#0288d1"     # Blu più scuro per contrasto
-        self.success_color = "#66bb6a"   # Verde per export immagine
-        self.video_color = "#7c4dff"     # Viola per export video
-        self.border_color = "#1e4976"    # Bordi blu
+    @property
+    def paused(self):
+        return not self._running.is_set()
 
-        self.root.configure(bg=self.bg_color)
+    def wait(self):
+        """Blocca finché in pausa; False se l'export è stato annullato"""
+        self._running.wait()
+        return not self._cancelled.is_set()
 
-        # Stili base
-        style.configure("TFrame", background=self.bg_color)
-        style.configure("TLabel", background=self.bg_color, foreground=self.fg_color,
-                       font=('Segoe UI', 10))
-        style.configure("Header.TLabel", background=self.bg_color, foreground=self.accent_color,
-                       font=('Segoe UI', 11, 'bold'))
+    def checkpoint(self):
+        """Come wait(), ma solleva ExportCancelled"""
+        if not self.wait():
+            raise ExportCancelled("Export annullato")
 
-        # Pulsanti moderni
-        style.configure("TButton", font=('Segoe UI', 10), padding=8,
-                       background=self.bg_secondary, foreground=self.fg_color)
-        style.map("TButton",
-                 background=[('active', self.bg_tertiary), ('pressed', self.accent_color)])
 
-        # Pulsante accent (esportazione)
-        style.configure("Accent.TButton", font=('Segoe UI', 11, 'bold'), padding=10,
-                       background=self.accent_color, foreground="#0a1929")
-        style.map("Accent.TButton",
-                 background=[('active', self.accent_hover), ('disabled', self.border_color)])
+PROGRESS_WINDOW_S = 10.0  # Finestra mobile per fps ed ETA (segue i cambi di carico, es. video che finisce)
+PROGRESS_REPORT_S = 1.0  # Intervallo minimo tra due aggiornamenti di avanzamento
 
-        # Pulsante verde (export immagine)
-        style.configure("Green.TButton", font=('Segoe UI', 10, 'bold'), padding=8,
-                       background=self.success_color, foreground="#0a1929")
-        style.map("Green.TButton",
-                 background=[('active', '#81c784'), ('disabled', self.border_color)])
 
-        # Pulsante viola (export video)
-        style.configure("Blue.TButton", font=('Segoe UI', 10, 'bold'), padding=8,
-                       background=self.video_color, foreground="#ffffff")
-        style.map("Blue.TButton",
-                 background=[('active', '#9575cd'), ('disabled', self.border_color)])
+def format_size(num_bytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if num_bytes < 1024 or unit == "GB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
 
-        # Scale/Slider
-        style.configure("TScale", background=self.bg_color, troughcolor=self.bg_secondary)
-        style.configure("Horizontal.TScale", background=self.bg_color)
 
-        # Combobox - colori leggibili
-        style.configure("TCombobox",
-                       font=('Segoe UI', 10),
-                       fieldbackground=self.bg_secondary,
-                       background=self.bg_secondary,
-                       foreground=self.fg_color,
-                       arrowcolor=self.fg_color,
-                       selectbackground=self.accent_color,
-                       selectforeground="#0a1929")
-        style.map("TCombobox",
-                 fieldbackground=[('readonly', self.bg_secondary), ('disabled', self.bg_color)],
-                 foreground=[('readonly', self.fg_color), ('disabled', self.border_color)],
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if hours else f"{rest // 60}:{rest % 60:02d}"
+
+
+# Stima export: frame campione codificati col comando FFmpeg reale, estrapolati alla durata
+EXPORT_ESTIMATE_SAMPLES = 5  # Frame campione distribuiti sulla timeline
+EXPORT_ESTIMATE_MARGIN = 1.1  # Margine sullo spazio richiesto (scene più dettagliate dei campioni, container)
+
+
+def sample_frame_indices(total_frames, count=EXPORT_ESTIMATE_SAMPLES):
+    """count indici di frame distribuiti sulla timeline (centro di ogni intervallo)"""
+    count = max(1, min(count, total_frames))
+    return [int((i + 0.5) * total_frames / count) for i in range(count)]
+
+
+class ExportProgress:
+    """Avanzamento di un export: fps su finestra mobile (PROGRESS_WINDOW_S), ETA dai frame che
+    restano al throughput attuale, dimensione output finora e proiezione finale.
+    Dimensione per output: segmenti completati o riusati (file su disco) + encoder in corso
+    (total_size da FFmpeg -progress); proiezione = byte per frame finora x frame totali.
+    Thread-safe: worker paralleli e reader aggiornano lo stesso oggetto.
+    """
+
+    def __init__(self, total_frames, to_render=None, fps=25):
+        self.total_frames = max(1, total_frames)
+        self.to_render = max(1, to_render if to_render is not None else total_frames)
+        self.fps = max(1, fps)
+        self.done = 0
+        self._lock = threading.Lock()
+        self._samples = deque([(time.monotonic(), 0)])
+        self._closed = {}  # output -> [byte, frame] dei segmenti chiusi
+        self._live = {}  # (output, segmento) -> encoder in corso
+        self._last_report = 0.0
+
+    def advance(self, frames=1):
+        """Frame composti e inviati agli encoder; restituisce il totale"""
+        with self._lock:
+            self.done += frames
+            now = time.monotonic()
+            self._samples.append((now, self.done))
+            while len(self._samples) > 2 and now - self._samples[0][0] > PROGRESS_WINDOW_S:
+                self._samples.popleft()
+            return self.done
+
+    def add_output(self, output, size_bytes, frames):
+        """Segmento chiuso (completato o riusato) di un output: byte su disco e frame"""
+        with self._lock:
+            closed = self._closed.setdefault(output, [0, 0])
+            closed[0] += size_bytes
+            closed[1] += frames
+
+    def watch(self, output, segment, encoder):
+        """Encoder in corso di un segmento: conta con le statistiche -progress"""
+        with self._lock:
+            self._live[(output, segment)] = encoder
+
+    def unwatch(self, output, segment):
+        with self._lock:
+            self._live.pop((output, segment), None)
+
+    def rolling_fps(self):
+        with self._lock:
+            (t0, f0), (t1, f1) = self._samples[0], self._samples[-1]
+        return (f1 - f0) / (t1 - t0) if t1 > t0 and f1 > f0 else None
+
+    def eta(self, rate=None):
+        """Secondi rimanenti al throughput attuale (None finché non misurabile).
+        rate: fps già misurati da rolling_fps (evita una seconda lettura della finestra)
+        """
+        rate = rate if rate is not None else self.rolling_fps()
+        if rate is None:
+            return None
+        return max(0, self.to_render - self.done) / rate
+
+    def output_size(self):
+        """(byte finora, byte previsti a fine export) o None senza dati"""
+        with self._lock:
+            totals = {output: list(closed) for output, closed in self._closed.items()}
+            for (output, _), encoder in self._live.items():
+                size, frames = encoder.progress_stats()
+                entry = totals.setdefault(output, [0, 0])
+                entry[0] += size
+                entry[1] += frames
+        totals = [(size, frames) for size, frames in totals.values() if frames > 0]
+        if not totals:
+            return None
+        return (sum(size for size, _ in totals),
+                sum(size / frames * self.total_frames for size, frames in totals))
+
+    def due(self):
+        """True al più una volta per PROGRESS_REPORT_S (aggiornamenti GUI non a ogni frame)"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_report < PROGRESS_REPORT_S:
+                return False
+            self._last_report = now
+            return True
+
+    def describe(self, label):
+        """Es. "FFmpeg: 45% • 23.4 fps (x0.94) • ETA 12:03 • 1.2 GB → ~2.7 GB" """
+        parts = [f"{label}: {int(self.done / self.to_render * 100)}%"]
+        rate = self.rolling_fps()
+        if rate is not None:
+            parts.append(f"{rate:.1f} fps (x{rate / self.fps:.2f})")
+            parts.append(f"ETA {format_duration(self.eta(rate))}")
+        size = self.output_size()
+        if size is not None:
+            parts.append(f"{format_size(size[0])} → ~{format_size(size[1])}")
+        return " • ".join(parts)
+
+
+# =============================================================================
+# ENCODER FFMPEG - processo alimentato via pipe da un writer thread dedicato
+# =============================================================================
+
+ENCODER_QUEUE_FRAMES = 4  # Frame in coda per encoder: il più lento non blocca gli altri
+ENCODER_QUEUE_MAX = 12  # Limite della coda encoder con RAM abbondante (ExportMemoryGovernor)
+FFMPEG_PROGRESS_LINE = re.compile(rb"^([a-z0-9_]+)=\s*(\S*)\s*$")  # Righe chiave=valore di -progress
+ENCODER_PIPE_SIZE = 1024 * 1024  # F_SETPIPE_SZ (Linux): default pipe-max-size per utenti non root
+
+
+def frame_buffer(frame):
+    """Buffer rawvideo (rgb24 / rgb48le) di un frame. OPT-6: ndarray contiguo -> memoryview (nessuna copia);
+    immagini PIL -> tobytes (PIL non espone il buffer interno senza copia).
+    """
+    if VIDEO_SUPPORT and isinstance(frame, np.ndarray):
+        if frame.dtype == np.uint16:
+            frame = frame.astype("<u2", copy=False)  # rgb48le: little endian anche su host big endian
+        return memoryview(np.ascontiguousarray(frame)).cast("B")
+    return frame.tobytes()
+
+
+def unprocessed_frame_array(img, bit_depth=8):
+    """Frame RGB come ndarray per la pipe rawvideo senza processing: uint8, o uint16 (x257) a 16 bit"""
+    arr = np.asarray(img)
+    if arr.ndim == 3 and arr.shape[2] == 4:
+        arr = arr[..., :3]
+    arr = np.ascontiguousarray(arr, dtype=np.uint8)
+    return arr.astype(np.uint16) * 257 if bit_depth > 8 else arr
+
+
+def screen_alpha(key, img, x, y):
+    """Somma la copertura di un layer alla key: A = A + a(1 - A) (alpha 'over', via screen)"""
+    alpha = img.getchannel('A') if 'A' in img.getbands() else Image.new('L', img.size, 255)
+    placed = Image.new('L', key.size, 0)
+    placed.paste(alpha, (x, y))
+    return ImageChops.screen(key, placed)
+
+
+def premultiply_layer_run(img):
+    """Run statico appiattito (RGBA, alpha dritto) -> (colore premoltiplicato, 255 - alpha, bbox).
+    Ritagliato al bbox dell'alpha (un logo occupa pochi pixel); None se interamente trasparente.
+    """
+    bbox = img.getchannel('A').getbbox()
+    if bbox is None:
+        return None
+    arr = np.asarray(img.crop(bbox), dtype=np.uint16)
+    alpha = arr[..., 3:4]
+    premul = ((arr[..., :3] * alpha + 127) // 255).astype(np.uint8)
+    return premul, (255 - alpha).astype(np.uint8), bbox
+
+
+def composite_premultiplied(canvas, run, dx=0, dy=0):
+    """'over' di un run premoltiplicato su canvas RGBA opaco (in place): out = C + dst * (1 - a).
+    Solo l'intersezione tra bbox del run e canvas; dx, dy: origine del canvas nel frame (dirty rect).
+    """
+    premul, inv_alpha, (bx0, by0, bx1, by1) = run
+    x0, y0 = max(0, bx0 - dx), max(0, by0 - dy)
+    x1, y1 = min(canvas.width, bx1 - dx), min(canvas.height, by1 - dy)
+    if x1 <= x0 or y1 <= y0:
+        return
+    sx, sy = x0 + dx - bx0, y0 + dy - by0
+    dst = np.asarray(canvas.crop((x0, y0, x1, y1)).convert('RGB'), dtype=np.uint16)
+    inv = inv_alpha[sy:sy + y1 - y0, sx:sx + x1 - x0]
+    out = premul[sy:sy + y1 - y0, sx:sx + x1 - x0] + (dst * inv + 127) // 255
+    canvas.paste(Image.fromarray(out.astype(np.uint8)), (x0, y0))
+
+
+def key_output_path(filepath):
+    """Percorso della key per un export key/fill: <nome>_key<ext> accanto al fill"""
+    p = Path(filepath)
+    return str(p.with_name(f"{p.stem}_key{p.suffix}"))
+
+
+def processing_bit_depth(profile):
+    """Profondità del processing Python: 16 bit per codec 10-bit (DNxHR HQX, ProRes), altrimenti 8.
+    Livelli, deband e dither a 16 bit sfruttano la precisione del target (niente banding da 8 bit).
+    """
+    return 16 if profile.get("video", {}).get("bit_depth", 8) > 8 else 8
+
+
+def rawvideo_pix_fmt(bit_depth, alpha=False):
+    """pix_fmt della pipe rawvideo per frame a 8 o 16 bit per canale"""
+    if bit_depth > 8:
+        return "rgba64le" if alpha else "rgb48le"
+    return "rgba" if alpha else "rgb24"
+
+
+def has_alpha(profile):
+    """True se il profilo video codifica il canale alpha (HAP Alpha, ProRes 4444)"""
+    return bool(profile.get("video", {}).get("alpha"))
+
+
+def alpha_merge_command(cmd, alpha_input, output_w, output_h, fps):
+    """Comando alpha: fill rgb24 su stdin + alpha in scala di grigi da alpha_input, uniti da
+    alphamerge dentro FFmpeg. Il processing resta RGB e l'alpha non passa dai filtri (-vf solo sul fill).
+    """
+    last_i = max(i for i, arg in enumerate(cmd) if arg == "-i")
+    alpha_index = cmd.count("-i")
+    inputs = cmd[:last_i + 2] + ["-f", "rawvideo", "-pix_fmt", "gray", "-s", f"{output_w}x{output_h}",
+                                 "-r", str(fps), "-i", alpha_input]
+    out_opts = cmd[last_i + 2:-1]
+    fill = "[0:v]"
+    if "-vf" in out_opts:
+        i = out_opts.index("-vf")
+        fill = f"[0:v]{out_opts[i + 1]}[fill];[fill]"
+        del out_opts[i:i + 2]
+    graph = f"{fill}[{alpha_index}:v]alphamerge[v]"
+    return inputs + ["-filter_complex", graph, "-map", "[v]"] + out_opts + [cmd[-1]]
+
+
+def key_fill_command(cmd, fill_path, key_path, key_input, output_w, output_h, fps):
+    """Da un comando a uscita singola (fill su stdin) a 2 ingressi / 2 uscite nello stesso processo:
+    key in scala di grigi dalla pipe key_input, codificata con lo stesso codec senza filtri né audio.
+    """
+    last_i = max(i for i, arg in enumerate(cmd) if arg == "-i")
+    key_index = cmd.count("-i")
+    inputs = cmd[:last_i + 2] + ["-f", "rawvideo", "-pix_fmt", "gray", "-s", f"{output_w}x{output_h}",
+                                 "-r", str(fps), "-i", key_input]
+    out_opts = cmd[last_i + 2:-1]
+    fill_opts = out_opts if "-map" in out_opts else ["-map", "0:v"] + out_opts
+    key_opts = ["-map", f"{key_index}:v"]
+    skip = False
+    for arg in out_opts:
+        if skip:
+            skip = False
+            continue
+        if arg in ("-vf", "-map", "-c:a", "-b:a", "-ar", "-ac"):
+            skip = True
+            continue
+        if arg in ("-shortest", "-an"):
+            continue
+        key_opts.append(arg)
+    return inputs + fill_opts + [fill_path] + key_opts + ["-an", key_path]
+
+
+def _enlarge_pipe(pipe, size=ENCODER_PIPE_SIZE):
+    """Pipe più grande (Linux): meno risvegli writer/FFmpeg per frame da decine di MB.
+    pipe: file object o file descriptor.
+    """
+    try:
+        import fcntl
+        fd = pipe if isinstance(pipe, int) else pipe.fileno()
+        fcntl.fcntl(fd, getattr(fcntl, "F_SETPIPE_SZ", 1031), size)
+    except (ImportError, OSError, ValueError) as e:
+        logger.debug(f"F_SETPIPE_SZ non disponibile: {e}")
+
+
+class PipeWriter:
+    """Coda + writer thread per un ingresso FFmpeg. put() accoda e ritorna subito finché la coda
+    ha posto: più stream dello stesso processo sono alimentati in modo indipendente.
+    open_sink: chiamata nel writer thread, restituisce un oggetto con write(view) -> int e close().
+    """
+
+    def __init__(self, open_sink, label="", queue_frames=ENCODER_QUEUE_FRAMES):
+        self.label = label
+        self.error = None
+        self._open_sink = open_sink
+        self._queue_frames = max(1, queue_frames)
+        self._queue = Queue(maxsize=self._queue_frames)
+        self._governed = False
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    def _writer(self):
+        sink = None
+        try:
+            sink = self._open_sink()
+        except (OSError, ValueError) as e:
+            self.error = e
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            if self.error is not None:
+                continue  # Svuota la coda senza bloccare il producer
+            try:
+                # Pipe non bufferizzata: write() può essere parziale, si avanza sul memoryview
+                view = memoryview(data)
+                while view:
+                    written = sink.write(view)
+                    view = view[written:]
+            except (OSError, ValueError) as e:
+                self.error = e
+        EXPORT_MEMORY.unregister(self._queue)
+        if sink is not None:
+            try:
+                sink.close()
+            except (OSError, ValueError):
+                pass
+
+    def put(self, data):
+        # Profondità dalla RAM disponibile: peso del frame noto solo al primo put
+        if not self._governed:
+            self._governed = True
+            EXPORT_MEMORY.register(self._queue, memoryview(data).nbytes, 1,
+                                   max(self._queue_frames, ENCODER_QUEUE_MAX), self._queue_frames)
+        else:
+            EXPORT_MEMORY.adapt(self._queue)
+        self._queue.put(data)
+
+    def close(self):
+        """Fine stream (non bloccante): il writer chiude la pipe dopo l'ultimo frame"""
+        self._queue.put(None)
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def abort(self):
+        self.error = self.error or Exception("interrotto")
+        try:
+            self._queue.put(None, timeout=5)  # Il writer svuota la coda dopo l'errore
+        except Full:
+            pass
+        self._thread.join(timeout=5)
+        EXPORT_MEMORY.unregister(self._queue)
+
+
+class _NamedPipeSink:
+    """Lato server di una named pipe Windows (write/close come un file)"""
+
+    def __init__(self, handle):
+        self.handle = handle
+
+    def write(self, view):
+        import _winapi
+        written, _ = _winapi.WriteFile(self.handle, view)
+        return written
+
+    def close(self):
+        import _winapi
+        _winapi.CloseHandle(self.handle)
+
+
+class FfmpegInputPipe(PipeWriter):
+    """Ingresso FFmpeg aggiuntivo (oltre a stdin): FIFO su POSIX, named pipe su Windows.
+    path va passato a FFmpeg come -i; il writer thread apre la pipe quando FFmpeg si collega,
+    quindi il producer non si blocca mai sull'apertura.
+    """
+
+    def __init__(self, label="", queue_frames=ENCODER_QUEUE_FRAMES):
+        self._aborted = False
+        self._tmp_dir = None
+        self._handle = None
+        if os.name == "nt":
+            import _winapi
+            self.path = rf"\\.\pipe\rconverter-{uuid.uuid4().hex}"
+            self._handle = _winapi.CreateNamedPipe(
+                self.path, _winapi.PIPE_ACCESS_OUTBOUND, _winapi.PIPE_TYPE_BYTE | _winapi.PIPE_WAIT,
+                1, ENCODER_PIPE_SIZE, 0, 0, _winapi.NULL)
+        else:
+            import tempfile
+            self._tmp_dir = tempfile.mkdtemp(prefix="rconverter-")
+            self.path = os.path.join(self._tmp_dir, "input.fifo")
+            os.mkfifo(self.path)
+        super().__init__(self._open_pipe, label, queue_frames)
+
+    def _open_pipe(self):
+        if self._handle is not None:
+            import _winapi
+            _winapi.ConnectNamedPipe(self._handle, False)
+            if self._aborted:
+                raise OSError("interrotto")
+            return _NamedPipeSink(self._handle)
+        import errno
+        import fcntl
+        # O_NONBLOCK: l'apertura fallisce (ENXIO) finché FFmpeg non apre in lettura -> polling
+        # interrompibile da abort(); poi la pipe torna bloccante per le scritture
+        while True:
+            if self._aborted:
+                raise OSError("interrotto")
+            try:
+                fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+                break
+            except OSError as e:
+                if e.errno != errno.ENXIO:
+                    raise
+                time.sleep(0.02)
+        fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) & ~os.O_NONBLOCK)
+        if sys.platform.startswith("linux"):
+            _enlarge_pipe(fd)
+        return open(fd, "wb", buffering=0)
+
+    def abort(self):
+        self._aborted = True
+        if self._handle is not None:
+            # Sblocca ConnectNamedPipe collegandosi come client
+            import _winapi
+            try:
+                client = _winapi.CreateFile(self.path, _winapi.GENERIC_READ, 0, _winapi.NULL,
+                                            _winapi.OPEN_EXISTING, 0, _winapi.NULL)
+                _winapi.CloseHandle(client)
+            except OSError:
+                pass
+        super().abort()
+        self.cleanup()
+
+    def cleanup(self):
+        if self._tmp_dir:
+            try:
+                os.remove(self.path)
+                os.rmdir(self._tmp_dir)
+            except OSError as e:
+                logger.debug(f"Rimozione FIFO: {e}")
+            self._tmp_dir = None
+
+
+class EncoderPipe:
+    """Processo FFmpeg (rawvideo su stdin) con writer thread e drain di stderr.
+    Più EncoderPipe ricevono lo stesso buffer del frame (fan-out multi-target): ogni encoder
+    consuma dalla propria coda, quindi gli encoder lavorano in parallelo e un composito
+    viene calcolato una sola volta per tutti i target.
+    extra_inputs: FfmpegInputPipe già referenziate nel comando (stream 1..n, es. key/alpha).
+    """
+
+    def __init__(self, cmd, label="", queue_frames=ENCODER_QUEUE_FRAMES, extra_inputs=()):
+        self.label = label
+        self._stderr_tail = []
+        self._progress = {}  # Ultimi valori di -progress (frame, total_size)
+        self.extra_inputs = list(extra_inputs)
+        # -progress su stderr (chiave=valore, letto da _drain_stderr) al posto della riga di statistiche;
+        # opzioni globali aggiunte qui e non nel comando: la firma encoder dei segmenti non cambia
+        cmd = cmd[:1] + ["-progress", "pipe:2", "-nostats"] + cmd[1:]
+        # bufsize=0: stdin non bufferizzato, il memoryview del frame va direttamente a write()
+        try:
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0,
+                                         creationflags=_subprocess_flags())
+        except OSError:
+            for pipe in self.extra_inputs:
+                pipe.abort()
+            raise
+        if sys.platform.startswith("linux"):
+            _enlarge_pipe(self.proc.stdin)
+        # stderr letto in continuo: FFmpeg scrive statistiche durante l'encode e una pipe
+        # piena bloccherebbe il processo (e quindi il writer)
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_thread.start()
+        self.streams = [PipeWriter(lambda: self.proc.stdin, label, queue_frames)] + self.extra_inputs
+
+    def _drain_stderr(self):
+        try:
+            for line in self.proc.stderr:
+                match = FFMPEG_PROGRESS_LINE.match(line)
+                if match:
+                    # Statistiche -progress: fuori dalla coda dei messaggi (errori leggibili)
+                    if match.group(1) in (b"frame", b"total_size") and match.group(2).isdigit():
+                        self._progress[match.group(1)] = int(match.group(2))
+                    continue
+                self._stderr_tail.append(line)
+                if len(self._stderr_tail) > 40:
+                    del self._stderr_tail[:20]
+        except (OSError, ValueError):
+            pass
+
+    def progress_stats(self):
+        """(byte scritti, frame codificati) dall'ultimo blocco -progress di FFmpeg"""
+        return self._progress.get(b"total_size", 0), self._progress.get(b"frame", 0)
+
+    @property
+    def error(self):
+        return next((s.error for s in self.streams if s.error is not None), None)
+
+    def stderr_tail(self, limit=500):
+        return b"".join(self._stderr_tail).decode(errors='replace')[-limit:]
+
+    def write(self, data, stream=0):
+        """Accoda un frame sullo stream indicato (bloccante solo se quella coda è piena)"""
+        if self.error is not None:
+            raise Exception(f"FFmpeg errore ({self.label}): {self.stderr_tail() or self.error}")
+        self.streams[stream].put(data)
+
+    def finish(self, timeout=120):
+        """Chiude tutti gli stream, attende FFmpeg e solleva eccezione se l'encode è fallito"""
+        for s in self.streams:
+            s.close()
+        self.streams[0].join()
+        self.proc.wait(timeout=timeout)
+        self._stderr_thread.join(timeout=5)
+        for pipe in self.extra_inputs:
+            pipe.join(timeout=5)
+            if pipe.is_alive():  # FFmpeg terminato senza aprire la pipe
+                pipe.abort()
+            pipe.cleanup()
+        if self.error is not None or self.proc.returncode != 0:
+            raise Exception(f"FFmpeg errore ({self.label}): {self.stderr_tail() or self.error}")
+
+    def abort(self):
+        """Termina il processo (errore o fallback): il file di output resta incompleto"""
+        if self.proc.poll() is None:
+            try:
+                self.proc.kill()
+            except OSError:
+                pass
+        for s in self.streams:
+            s.abort()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+def group_targets_by_filters(targets):
+    """Raggruppa target [(filepath, profile)] per catena filtri: ogni gruppo = un pass di composito.
+    Target dello stesso LED wall (software diversi) condividono i filtri e quindi un unico pass;
+    codec 8 e 10-bit restano in pass separati (processing e pipe a profondità diverse).
+    """
+    groups = []
+    for filepath, profile in targets:
+        key = json.dumps([profile.get("filters", {}), processing_bit_depth(profile)], sort_keys=True)
+        for group_key, group in groups:
+            if group_key == key:
+                group.append((filepath, profile))
+                break
+        else:
+            groups.append((key, [(filepath, profile)]))
+    return [group for _, group in groups]
+
+
+def hap_chunks_for(output_w, output_h, video):
+    """Chunks HAP: 4 per < 4K (riduce overhead, file più piccoli), fino a hap_chunks per 4K+"""
+    if output_w * output_h < 3840 * 2160:
+        return 4
+    return min(video.get("hap_chunks", 8), 8)
+
+
+# Auto-tuning HAP: chunks e formato scelti da encode di prova e decodifica locale, per risoluzione
+HAP_TUNING_CHUNKS = (1, 2, 4, 8, 16)
+HAP_TUNING_FPS_TOLERANCE = 0.05  # Entro il 5% del decode più veloce vince il file più piccolo (banda disco)
+# Formati HAP che rispettano il tier qualità del LED wall (entry: HAP, HAP Q accettato perché superiore)
+HAP_TIER_FORMATS = {
+    QUALITY_ENTRY: ("hap", "hap_q"),
+    QUALITY_PROFESSIONAL: ("hap_q",),
+    QUALITY_BROADCAST: ("hap_q",),
+}
+
+
+def hap_tuning_formats(profile):
+    """Formati HAP candidati al tuning: alpha resta HAP Alpha, altrimenti quelli ammessi dal tier"""
+    if has_alpha(profile):
+        return ("hap_alpha",)
+    tier = profile.get("led_wall_spec", {}).get("quality_tier", QUALITY_PROFESSIONAL)
+    return HAP_TIER_FORMATS.get(tier, ("hap_q",))
+
+
+def choose_hap_config(results):
+    """Configurazione HAP più veloce in decodifica; a pari velocità (HAP_TUNING_FPS_TOLERANCE)
+    quella col file più piccolo. results: [{format, chunks, decode_fps, frame_bytes, ...}]
+    """
+    best_fps = max(r["decode_fps"] for r in results)
+    fast = [r for r in results if r["decode_fps"] >= best_fps * (1 - HAP_TUNING_FPS_TOLERANCE)]
+    return min(fast, key=lambda r: (r["frame_bytes"], -r["decode_fps"]))
+
+
+class HapTuningCache:
+    """Risultati dell'auto-tuning HAP per risoluzione e formati ammessi (JSON nella cartella dati utente).
+    Misure di decodifica locali: valgono per questa macchina. Caricato alla prima lettura.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @staticmethod
+    def key(profile, output_w, output_h):
+        return f"{output_w}x{output_h}|{'+'.join(hap_tuning_formats(profile))}"
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            try:
+                if self.path.is_file():
+                    self._entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Tuning HAP non caricato: {e}")
+        return self._entries
+
+    def get(self, profile, output_w, output_h):
+        """Configurazione scelta {format, chunks, ...} o None se la risoluzione non è stata misurata"""
+        with self._lock:
+            return self._load().get(self.key(profile, output_w, output_h))
+
+    def store(self, profile, output_w, output_h, config):
+        """Salva la configurazione scelta (scrittura atomica)"""
+        with self._lock:
+            entries = self._load()
+            entries[self.key(profile, output_w, output_h)] = config
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(entries, indent=2), encoding="utf-8")
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logger.warning(f"Salvataggio tuning HAP: {e}")
+
+
+HAP_TUNING = HapTuningCache(_get_app_data_dir() / "hap_tuning.json")
+
+
+def plan_encoder_resources(profile, output_w, output_h, core_budget, encoders=1, compositors=1):
+    """Piano thread encoder da un budget di core (export GUI: tutti i core; coda: quota del job).
+    I worker composito occupano ~1 core ciascuno; il resto è diviso tra gli encoder contemporanei
+    (worker x target), così più export in parallelo non sovraccaricano la CPU.
+    HAP: l'encoder comprime i chunk in parallelo, thread oltre il numero di chunk non servono.
+    Risoluzione già misurata dall'auto-tuning HAP (HAP_TUNING): formato e chunks scelti da lì.
+    """
+    v = profile["video"]
+    codec = v.get("codec", "libx264")
+    cores = max(1, core_budget - compositors)
+    threads = max(1, cores // max(1, encoders))
+    plan = {"core_budget": core_budget, "encoders": encoders, "threads": threads}
+    if codec == "hap" or v.get("format_name") in ("hap", "hap_q"):
+        tuned = HAP_TUNING.get(profile, output_w, output_h)
+        if tuned:
+            plan["hap_format"] = tuned["format"]
+            plan["hap_chunks"] = tuned["chunks"]
+        else:
+            plan["hap_chunks"] = hap_chunks_for(output_w, output_h, v)
+        plan["threads"] = min(threads, plan["hap_chunks"])
+    elif codec == "libx265":
+        plan["x265_pools"] = threads
+    return plan
+
+
+def describe_encoder_plan(plan):
+    """Testo breve del piano encoder (riepilogo export)"""
+    txt = f"{plan['encoders']} encoder x {plan['threads']} thread (budget {plan['core_budget']} core)"
+    if plan.get("hap_format"):
+        txt += f" | {plan['hap_format']} {plan['hap_chunks']} chunks (auto-tuning)"
+    elif plan.get("hap_chunks"):
+        txt += f" | HAP {plan['hap_chunks']} chunks"
+    return txt
+
+
+def encoder_signature(cmd):
+    """Firma delle opzioni encoder senza ffmpeg/output e senza opzioni di threading
+    (non cambiano i frame codificati: un segmento resta riutilizzabile con un budget diverso)
+    """
+    sig = []
+    skip = False
+    for arg in cmd[1:-1]:
+        if skip:
+            skip = False
+            continue
+        if arg in ("-threads", "-filter_threads"):
+            skip = True
+            continue
+        sig.append(re.sub(r":pools=\d+", "", arg))
+    return json.dumps(sig)
+
+
+# =============================================================================
+# RENDER SEGMENTATO - hash per frame, segmenti intra-only riusabili, concat senza re-encode
+# =============================================================================
+
+SEGMENT_FRAMES = 100  # Granularità re-render (4s @ 25fps)
+FRAME_READ_QUEUE_FRAMES = 16  # Frame sorgente letti in anticipo (RAM non leggibile)
+FRAME_READ_QUEUE_MIN = 2  # Sotto pressione di memoria
+FRAME_READ_QUEUE_MAX = 64  # Con RAM abbondante (ExportMemoryGovernor)
+SEGMENT_DIR_NAME = ".rconverter_segments"  # Accanto all'output: stesso disco del file finale
+RENDER_HASH_VERSION = 1  # Incrementare se cambia la pipeline di composito/processing
+STILL_VIDEO_DEFAULT_SECONDS = 10  # Durata video da composito statico (layer video congelati)
+# OPT-5: worker paralleli per segmento (composito + FFmpeg propri); limite per RAM (frame 4K in coda)
+SEGMENT_MAX_WORKERS = max(1, min(4, (os.cpu_count() or 4) // 2))
+EXPORT_RESUME_ATTEMPTS = 1  # Riprese automatiche dal checkpoint dopo un errore FFmpeg
+SEGMENT_WORKER_FRAME_COPIES = 6  # Frame di output in RAM per worker (composito + intermedi processing)
+
+
+def is_intra_only(profile):
+    """True se il profilo video è intra-only (ogni frame indipendente, segmenti concatenabili)"""
+    v = profile.get("video", {})
+    return v.get("gop_size") == 1 and not v.get("b_frames")
+
+
+def segment_dir_for(output_path):
+    """Cartella segmenti di un output: <dir>/.rconverter_segments/<nome file>/"""
+    p = Path(output_path)
+    return p.parent / SEGMENT_DIR_NAME / p.name
+
+
+def frame_input_hash(base_digest, source_digests):
+    """Hash degli input di un frame: chiave comune (trasformazioni, contenuti statici, filtri)
+    + digest dei pixel sorgente di ogni layer video. Stesso hash = stesso frame di output.
+    """
+    import hashlib
+    return hashlib.blake2b(base_digest + b"".join(source_digests), digest_size=8).hexdigest()
+
+
+def plan_segments(total_frames, segment_frames):
+    """Divide [0, total_frames) in segmenti consecutivi di segment_frames frame"""
+    step = max(1, segment_frames)
+    return [{"index": index, "start": start, "count": min(step, total_frames - start)}
+            for index, start in enumerate(range(0, total_frames, step))]
+
+
+def segment_hash(frame_hashes, encoder_signature):
+    """Hash di un segmento: frame contenuti + firma encoder (opzioni FFmpeg)"""
+    import hashlib
+    h = hashlib.blake2b(digest_size=12)
+    h.update(encoder_signature.encode())
+    h.update("".join(frame_hashes).encode())
+    return h.hexdigest()
+
+
+def segment_filename(index, seg_hash, ext):
+    return f"seg_{index:05d}_{seg_hash}{ext}"
+
+
+def write_segment_manifest(seg_dir, manifest):
+    """Manifest segmenti (hash per frame + segmenti) con scrittura atomica"""
+    path = Path(seg_dir) / "manifest.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def read_segment_manifest(seg_dir):
+    """Manifest segmenti (None se assente o illeggibile)"""
+    try:
+        return json.loads((Path(seg_dir) / "manifest.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def checkpointed_frames(seg_dir):
+    """Frame già codificati da un export interrotto: segmenti del checkpoint ancora su disco"""
+    manifest = read_segment_manifest(seg_dir)
+    if not manifest or manifest.get("status") != "partial":
+        return 0
+    return sum(seg["count"] for seg in manifest.get("segments", [])
+               if seg.get("file") and (Path(seg_dir) / seg["file"]).is_file())
+
+
+def concat_segments(ffmpeg_path, segment_paths, output_path, timeout=600):
+    """Unisce i segmenti con il concat demuxer FFmpeg (-c copy: nessun re-encode)"""
+    seg_dir = Path(segment_paths[0]).parent
+    list_path = seg_dir / "concat.txt"
+    lines = []
+    for p in segment_paths:
+        escaped = str(Path(p).resolve()).replace("'", "'\\''")
+        lines.append(f"file '{escaped}'\n")
+    list_path.write_text("".join(lines), encoding="utf-8")
+    cmd = [ffmpeg_path, "-y", "-f", "concat", "-safe", "0", "-i", str(list_path),
+           "-map", "0", "-c", "copy"]
+    if Path(output_path).suffix.lower() == ".mov":
+        cmd.extend(["-f", "mov"])
+    cmd.append(str(output_path))
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=timeout, creationflags=_subprocess_flags())
+    finally:
+        list_path.unlink(missing_ok=True)
+    if result.returncode != 0:
+        raise Exception(f"FFmpeg concat: {result.stderr.decode(errors='replace')[-500:]}")
+
+
+def remove_stale_segments(seg_dir, keep_names):
+    """Rimuove segmenti di render precedenti non più referenziati (e parziali interrotti)"""
+    for p in Path(seg_dir).glob("seg_*"):
+        if p.name not in keep_names:
+            try:
+                p.unlink()
+            except OSError as e:
+                logger.debug(f"Rimozione segmento {p.name}: {e}")
+
+
+# =============================================================================
+# ANALISI DECODIFICA - fps di decodifica locali di un export rispetto al segnale (output_hz)
+# =============================================================================
+
+DECODE_BENCH_FRAMES = 250  # Frame decodificati per misura (file brevi e clip campione in loop)
+DECODE_BENCH_LAYERS = 4  # Decodifiche contemporanee per stream nella misura multi-layer
+DECODE_HEADROOM_MIN = 1.25  # fps di decodifica / output_hz minimo per "OK" (picchi, effetti, GPU condivisa)
+
+
+def measure_decode_fps(ffmpeg_path, path, frames=DECODE_BENCH_FRAMES, timeout=300):
+    """fps di decodifica del primo stream video di path: FFmpeg decodifica su null fino a frames
+    frame (file più brevi in loop). Velocità dai delta di frame tra i blocchi -progress, con l'istante
+    di arrivo di ciascun blocco: avvio del processo e apertura del file restano fuori dalla misura.
+    """
+    cmd = [ffmpeg_path, "-hide_banner", "-nostdin", "-v", "error", "-stats_period", "0.25",
+           "-stream_loop", "-1", "-i", str(path), "-map", "0:v:0", "-frames:v", str(frames),
+           "-progress", "pipe:1", "-f", "null", "-"]
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            creationflags=_subprocess_flags())
+    stderr_tail = []
+    # stderr letto in continuo: una pipe piena bloccherebbe FFmpeg prima della fine di stdout
+    drain = threading.Thread(target=lambda: stderr_tail.extend(proc.stderr), daemon=True)
+    drain.start()
+    watchdog = threading.Timer(timeout, proc.kill)
+    watchdog.start()
+    samples = []  # (istante di arrivo, frame) per ogni blocco -progress
+    frame = 0
+    try:
+        for line in proc.stdout:
+            match = FFMPEG_PROGRESS_LINE.match(line)
+            if not match:
+                continue
+            if match.group(1) == b"frame" and match.group(2).isdigit():
+                frame = int(match.group(2))
+            elif match.group(1) == b"progress" and frame > 0:
+                samples.append((time.perf_counter(), frame))
+        proc.wait()
+    finally:
+        watchdog.cancel()
+    drain.join(timeout=5)
+    if proc.returncode != 0:
+        raise Exception(f"FFmpeg decodifica {Path(path).name}: "
+                        f"{b''.join(stderr_tail).decode(errors='replace').strip()[-300:]}")
+    if not samples:
+        raise Exception(f"FFmpeg decodifica {Path(path).name}: nessun frame video")
+    (t_first, f_first), (t_last, f_last) = samples[0], samples[-1]
+    if f_last > f_first and t_last > t_first:
+        return (f_last - f_first) / (t_last - t_first)
+    # Un solo blocco (decodifica più breve di -stats_period): tempo dall'avvio, misura prudente
+    return f_last / max(t_last - start, 1e-6)
+
+
+def analyze_playback_decode(ffmpeg_path, paths, output_hz, layers=DECODE_BENCH_LAYERS, report=None):
+    """Margine di decodifica in playback. paths: stream riprodotti insieme come un layer (fill + key),
+    decodificati sempre in contemporanea: un layer va alla velocità del suo stream più lento.
+    Un layer: margine per stream = fps / output_hz. Multi-layer: layers copie del layer in contemporanea
+    (layer sovrapposti nel media server); la somma degli fps dei layer, divisa per output_hz, estrapola
+    i layer sostenibili. OK se ogni stream ha almeno DECODE_HEADROOM_MIN di margine e regge almeno un
+    layer. HAP in FFmpeg decomprime anche le texture DXT in CPU (Resolume lo fa in GPU): per HAP la
+    misura è prudente.
+    """
+    report = report or (lambda text: None)
+    output_hz = max(1, output_hz)
+    paths = [str(path) for path in paths]
+
+    def decode_layers(count):
+        """fps per stream di count layer in contemporanea, raggruppati per layer"""
+        jobs = paths * count
+        with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+            results = list(pool.map(lambda p: measure_decode_fps(ffmpeg_path, p), jobs))
+        return [results[i * len(paths):(i + 1) * len(paths)] for i in range(count)]
+
+    report("Analisi decodifica: " + " + ".join(Path(p).name for p in paths))
+    single = decode_layers(1)[0]
+    streams = [{"path": path, "fps": fps, "headroom": fps / output_hz,
+                "ok": fps >= output_hz * DECODE_HEADROOM_MIN} for path, fps in zip(paths, single)]
+    report(f"Analisi decodifica: {layers} layer contemporanei")
+    layer_fps = [min(layer) for layer in decode_layers(layers)]
+    max_layers = int(sum(layer_fps) / (output_hz * DECODE_HEADROOM_MIN))
+    analysis = {
+        "output_hz": output_hz,
+        "streams": streams,
+        "layers": layers,
+        "layer_fps": min(layer_fps),  # fps del layer più lento con layers layer in playback
+        "max_layers": max_layers,
+        "ok": all(s["ok"] for s in streams) and max_layers >= 1,
+    }
+    logger.info(f"Analisi decodifica @ {output_hz} Hz: " +
+                ", ".join(f"{Path(s['path']).name} {s['fps']:.0f} fps ({s['headroom']:.1f}x)" for s in streams) +
+                f" | {layers} layer: {analysis['layer_fps']:.0f} fps per layer, ~{analysis['max_layers']} layer "
+                f"sostenibili -> {'OK' if analysis['ok'] else 'INSUFFICIENTE'}")
+    return analysis
+
+
+# =============================================================================
+# CODA RENDER - job (progetto, LED wall, software[], Hz) persistenti con scheduler
+# =============================================================================
+
+RENDER_CPU_COUNT = os.cpu_count() or 4
+# Ogni job = 1 worker composito Python (~1 core) + 1 encoder FFmpeg (multi-thread)
+RENDER_MAX_COMPOSITORS = max(1, RENDER_CPU_COUNT // 2)
+RENDER_MAX_ENCODERS = max(1, RENDER_CPU_COUNT // 4)
+RENDER_MAX_ATTEMPTS = 2  # 1 retry automatico dopo un errore
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+JOB_STATUS_LABELS = {
+    JOB_PENDING: "In attesa",
+    JOB_RUNNING: "In corso",
+    JOB_DONE: "Completato",
+    JOB_FAILED: "Fallito",
+}
+
+
+class EncoderSlots:
+    """Semaforo pesato degli encode FFmpeg contemporanei della coda render. Un job acquisisce
+    un'unità per encode (worker x target, +1 per la key separata di Key/Fill); richieste oltre la
+    capacità sono ridotte alla capacità: il job aspetta la coda libera invece di bloccarsi per sempre.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self._free = self.capacity
+        self._cond = threading.Condition()
+
+    def acquire(self, count=1, controller=None):
+        """Attende count unità (ridotte alla capacità) e restituisce quante ne ha prese.
+        controller: l'attesa si interrompe con ExportCancelled se il job viene annullato.
+        """
+        count = max(1, min(count, self.capacity))
+        with self._cond:
+            while self._free < count:
+                if controller is not None and controller.cancelled:
+                    raise ExportCancelled("Export annullato")
+                self._cond.wait(timeout=0.5)
+            self._free -= count
+        return count
+
+    def release(self, count=1):
+        with self._cond:
+            self._free = min(self.capacity, self._free + count)
+            self._cond.notify_all()
+
+
+class RenderQueue:
+    """Coda render persistente (JSON) con scheduler a slot limitati.
+    compositor_slots: job attivi (worker composito Python). encoder_slots (EncoderSlots): encode
+    FFmpeg contemporanei pesati, ogni job ne prende uno per processo FFmpeg (più uno per la key
+    separata) solo nella fase di encoding (gli export immagine non li usano).
+    Job interrotti da chiusura/crash tornano "In attesa" al riavvio; job falliti ritentati
+    automaticamente fino a RENDER_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, state_path, runner, on_change=None,
+                 max_compositors=RENDER_MAX_COMPOSITORS, max_encoders=RENDER_MAX_ENCODERS):
+        self.state_path = Path(state_path)
+        self.runner = runner          # runner(job, report, controller) -> solleva eccezione se fallisce
+        self.on_change = on_change    # chiamata (da qualsiasi thread) a ogni cambio di stato
+        self.max_compositors = max_compositors
+        self.compositor_slots = threading.BoundedSemaphore(max_compositors)
+        self.encoder_slots = EncoderSlots(max_encoders)
+        self.jobs = []
+        self.active = False
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._dispatcher = None
+        self._controllers = {}  # id job in corso -> ExportController (annullamento)
+        self.load()
+
+    def core_budget(self):
+        """Core assegnati a un job che parte ora: CPU divise tra i job attivi o in attesa (max slot)"""
+        with self._lock:
+            active = sum(1 for j in self.jobs if j["status"] in (JOB_RUNNING, JOB_PENDING))
+        return max(1, RENDER_CPU_COUNT // max(1, min(self.max_compositors, active)))
+
+    def load(self):
+        """Carica lo stato salvato; i job 'in corso' (app chiusa durante il render) tornano in attesa"""
+        try:
+            if not self.state_path.is_file():
+                return
+            data = json.loads(self.state_path.read_text(encoding="utf-8"))
+            jobs = data.get("jobs", [])
+            for job in jobs:
+                if job.get("status") == JOB_RUNNING:
+                    job["status"] = JOB_PENDING
+                    job["progress"] = "Ripresa dopo riavvio"
+            self.jobs = jobs
+            self.active = bool(data.get("active")) and any(j["status"] == JOB_PENDING for j in jobs)
+            logger.info(f"Coda render caricata: {len(jobs)} job")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Coda render non caricata: {e}")
+
+    def save(self):
+        """Salva lo stato della coda (scrittura atomica)"""
+        with self._lock:
+            data = {"version": 1, "active": self.active, "jobs": self.jobs}
+            try:
+                self.state_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.state_path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+                os.replace(tmp, self.state_path)
+            except OSError as e:
+                logger.warning(f"Salvataggio coda render: {e}")
+
+    def _changed(self):
+        self.save()
+        if self.on_change:
+            self.on_change()
+
+    def add_job(self, **fields):
+        """Aggiunge un job (project, led_wall, software_targets, output_hz, output_paths, ...)"""
+        job = {"id": str(uuid.uuid4())[:8], "status": JOB_PENDING, "attempts": 0,
+               "error": None, "progress": "", "created": time.time(), "finished": None}
+        job.update(fields)
+        with self._lock:
+            self.jobs.append(job)
+        self._changed()
+        self._wake.set()
+        return job
+
+    def remove_finished(self):
+        with self._lock:
+            self.jobs = [j for j in self.jobs if j["status"] != JOB_DONE]
+        self._changed()
+
+    def remove_job(self, job_id):
+        """Rimuove un job non in esecuzione"""
+        with self._lock:
+            self.jobs = [j for j in self.jobs if j["id"] != job_id or j["status"] == JOB_RUNNING]
+        self._changed()
+
+    def cancel_job(self, job_id):
+        """Annulla un job in corso (fallito senza retry); True se era in esecuzione"""
+        with self._lock:
+            controller = self._controllers.get(job_id)
+        if controller is None:
+            return False
+        controller.cancel()
+        return True
+
+    def retry_failed(self):
+        with self._lock:
+            for job in self.jobs:
+                if job["status"] == JOB_FAILED:
+                    job.update(status=JOB_PENDING, attempts=0, error=None, progress="")
+        self._changed()
+        self._wake.set()
+
+    def start(self):
+        """Avvia il dispatcher (idempotente)"""
+        with self._lock:
+            self.active = True
+            if self._dispatcher is None or not self._dispatcher.is_alive():
+                self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True,
+                                                    name="render-dispatch")
+                self._dispatcher.start()
+        self._changed()
+        self._wake.set()
+
+    def stop(self):
+        """Sospende l'avvio di nuovi job (quelli in corso terminano)"""
+        with self._lock:
+            self.active = False
+        self._changed()
+        self._wake.set()
+
+    def is_running(self):
+        with self._lock:
+            return any(j["status"] == JOB_RUNNING for j in self.jobs)
+
+    def _next_pending(self):
+        with self._lock:
+            for job in self.jobs:
+                if job["status"] == JOB_PENDING:
+                    job["status"] = JOB_RUNNING
+                    job["attempts"] += 1
+                    job["progress"] = "Avvio..."
+                    return job
+        return None
+
+    def _dispatch_loop(self):
+        while True:
+            with self._lock:
+                if not self.active:
+                    self._dispatcher = None
+                    return
+            if not self.compositor_slots.acquire(timeout=0.5):
+                continue
+            job = self._next_pending()
+            if job is None:
+                self.compositor_slots.release()
+                self._wake.wait(timeout=1.0)
+                self._wake.clear()
+                continue
+            self._changed()
+            threading.Thread(target=self._run_job, args=(job,), daemon=True,
+                             name=f"render-{job['id']}").start()
+
+    def _run_job(self, job):
+        def report(text):
+            with self._lock:
+                job["progress"] = text
+            if self.on_change:
+                self.on_change()
+
+        controller = ExportController()
+        with self._lock:
+            self._controllers[job["id"]] = controller
+        try:
+            outputs = ", ".join(path for _, path in render_job_targets(job))
+            logger.info(f"Render job {job['id']} avviato (tentativo {job['attempts']}): {outputs}")
+            self.runner(job, report, controller)
+            with self._lock:
+                job.update(status=JOB_DONE, error=None, progress="100%", finished=time.time())
+            logger.info(f"Render job {job['id']} completato")
+        except ExportCancelled:
+            logger.info(f"Render job {job['id']} annullato")
+            with self._lock:
+                job.update(status=JOB_FAILED, error="Annullato", progress="", finished=time.time())
+        except Exception as e:
+            logger.error(f"Render job {job['id']} fallito: {e}")
+            with self._lock:
+                job["error"] = str(e)[-300:]
+                if job["attempts"] < RENDER_MAX_ATTEMPTS:
+                    job.update(status=JOB_PENDING, progress="Nuovo tentativo...")
+                else:
+                    job.update(status=JOB_FAILED, progress="", finished=time.time())
+        finally:
+            with self._lock:
+                self._controllers.pop(job["id"], None)
+            self.compositor_slots.release()
+            self._changed()
+            self._wake.set()
+
+
+def render_output_path(output_dir, project_path, led_wall, software_target, output_hz, ext):
+    """Nome file deterministico per un job: <progetto>_<ledwall>_<software>_<Hz>Hz<ext>"""
+    stem = Path(project_path).stem
+    safe_led = re.sub(r"[^\w.-]+", "_", led_wall).strip("_")
+    return str(Path(output_dir) / f"{stem}_{safe_led}_{software_target}_{output_hz}Hz{ext}")
+
+
+def render_job_targets(job):
+    """Target di un job [(software, output_path)]: un job multi-software renderizza in un solo pass"""
+    if job.get("software_targets"):
+        return list(zip(job["software_targets"], job["output_paths"]))
+    return [(job["software_target"], job["output_path"])]  # Job salvati prima del multi-target
+
+
+def build_project_layers(project, resolved):
+    """Crea i layer di un progetto dagli asset risolti (ordine Z preservato, nessun accesso Tk).
+    resolved: {hash: (media, hash, sorgente)} da resolve_project_asset.
+    Restituisce (layers, nomi dei layer video senza sorgente su disco).
+    """
+    layers = []
+    missing_video = []
+    for entry in project.get("layers", []):
+        item = resolved.get(entry.get("asset"))
+        if item is None:
+            continue
+        media, _, source = item
+        state = entry.get("state", {})
+        layer = ImageLayer(media["image"], state.get("name", "Layer"))
+        layer.set_state(state)
+        layer.source_path = source
+        if layer.is_video:
+            layer.video_path = source
+            if source is None:
+                missing_video.append(layer.name)
+        layers.append(layer)
+    return layers, missing_video
+
+
+class RConverter:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("R-Converter PRO  •  Broadcast LED Wall")
+        self.root.state('zoomed')  # Fullscreen su Windows
+        self.root.minsize(1100, 700)
+
+        # Lista delle immagini (layers)
+        self.layers = []
+        self.selected_layer = None
+
+        # Stato video (per il primo layer se è video)
+        self.is_video = False
+        self.video_file = None
+
+        # Parametri output (default: Holiday Inn 3840x1152 @ 50Hz)
+        self.output_width = tk.IntVar(value=3840)
+        self.output_height = tk.IntVar(value=1152)
+        self.bg_color_var = tk.StringVar(value="#000000")
+
+        # Parametri qualità (inizializzati qui, usati nel pannello export)
+        self.img_quality = tk.IntVar(value=100)
+
+        # Stato UI
+        self.display_image = None
+        self.canvas_bounds = None
+        self.preview_scale = 1.0
+        self.handles = {}
+
+        # Stato trascinamento
+        self.is_dragging = False
+        self.active_handle = None
+        self.drag_start_x = 0
+        self.drag_start_y = 0
+        self.drag_start_offset_x = 0
+        self.drag_start_offset_y = 0
+        self.resize_start_zoom = 100
+        self.resize_start_pos = (0, 0)
+        self.rotation_start_angle = 0
+        self.rotation_start_value = 0
+        self.rotation_center = (0, 0)
+
+        # Debounce per redraw
+        self._redraw_scheduled = False
+        self._redraw_job = None
+        self._resize_job = None
+
+        # Cache dimensioni canvas (evita update_idletasks nel hot path)
+        self._cached_canvas_size = (0, 0)
+
+        # Oggetti canvas riutilizzabili (evita delete/create ogni frame)
+        self._canvas_persistent_ids = None
+
+        # Flag per evitare re-bind ricorsivo scroll
+        self._scroll_bound = False
+        self._scroll_bound_right = False
+
+        # Parametri qualità export (gestiti da IMAGE_PROFILES via get_export_profile)
+
+        # PRO: Broadcast - variabili pannello destro
+        self.output_hz = tk.IntVar(value=HZ_DEFAULT)
+        self.led_wall_var = tk.StringVar(value="novastar_a8_plus")
+        self.software_target_var = tk.StringVar(value="resolume")
+        self.custom_presets = {}
+        # Processing sempre attivo al massimo (nascosto, obbligatorio)
+        self.proc_uniform = tk.BooleanVar(value=True)
+        self.proc_anti_solar = tk.BooleanVar(value=True)
+        self.proc_anti_flicker = tk.BooleanVar(value=True)
+        self.proc_anti_pixel = tk.BooleanVar(value=True)
+        self.proc_intensity = tk.DoubleVar(value=100.0)  # 0-100 per Scale, convertito a 0-1 in processing
+        self.ffmpeg_path = None
+
+        # Import parallelo in corso (vedi import_files_async)
+        self._import_job = None
+        # Export video GUI in corso: ExportController (Pausa / Annulla Export)
+        self._export_controller = None
+
+        # Cache asset content-addressed per i progetti (.rcproj)
+        self.asset_cache = AssetCache(_get_app_data_dir() / "cache")
+        self.current_project_path = None
+
+        # Coda render persistente (job multi LED wall / software / Hz senza dialog)
+        self.render_queue = RenderQueue(_get_app_data_dir() / "render_queue.json", self._run_render_job,
+                                        on_change=self._on_render_queue_change)
+        self.render_queue_window = None
+        self._rq_refresh_scheduled = False
+
+        # Setup
+        self.setup_style()
+        self.create_widgets()
+        self.setup_bindings()
+        self.setup_drag_and_drop()
+        self._find_ffmpeg()
+        self._load_presets_from_appdata()
+
+        # Inizializza canvas con preview area LED wall (retry se dimensioni non ancora pronte)
+        self.root.after(100, self._init_canvas_preview_with_retry)
+
+        # Coda render attiva alla chiusura: riprende i job in attesa
+        if self.render_queue.active:
+            self.root.after(2000, self.render_queue.start)
+
+    def setup_style(self):
+        style = ttk.Style()
+        style.theme_use('clam')
+
+        # Palette Blu Moderna - Tech/Cyber style
+        self.bg_color = "#0a1929"        # Sfondo blu notte profondo
+        self.bg_secondary = "#132f4c"    # Sfondo secondario blu scuro
+        self.bg_tertiary = "#1a3a5c"     # Terziario per hover
+        self.fg_color = "#e3f2fd"        # Testo bianco-blu
+        self.fg_secondary = "#90caf9"    # Testo secondario blu chiaro
+        self.accent_color = "#29b6f6"    # Cyan/azzurro brillante
+        self.accent_hover = "#4fc3f7"    # Hover più chiaro
+        self.accent_glow = "#0288d1"     # Blu più scuro per contrasto
+        self.success_color = "#66bb6a"   # Verde per export immagine
+        self.video_color = "#7c4dff"     # Viola per export video
+        self.border_color = "#1e4976"    # Bordi blu
+
+        self.root.configure(bg=self.bg_color)
+
+        # Stili base
+        style.configure("TFrame", background=self.bg_color)
+        style.configure("TLabel", background=self.bg_color, foreground=self.fg_color,
+                       font=('Segoe UI', 10))
+        style.configure("Header.TLabel", background=self.bg_color, foreground=self.accent_color,
+                       font=('Segoe UI', 11, 'bold'))
+
+        # Pulsanti moderni
+        style.configure("TButton", font=('Segoe UI', 10), padding=8,
+                       background=self.bg_secondary, foreground=self.fg_color)
+        style.map("TButton",
+                 background=[('active', self.bg_tertiary), ('pressed', self.accent_color)])
+
+        # Pulsante accent (esportazione)
+        style.configure("Accent.TButton", font=('Segoe UI', 11, 'bold'), padding=10,
+                       background=self.accent_color, foreground="#0a1929")
+        style.map("Accent.TButton",
+                 background=[('active', self.accent_hover), ('disabled', self.border_color)])
+
+        # Pulsante verde (export immagine)
+        style.configure("Green.TButton", font=('Segoe UI', 10, 'bold'), padding=8,
+                       background=self.success_color, foreground="#0a1929")
+        style.map("Green.TButton",
+                 background=[('active', '#81c784'), ('disabled', self.border_color)])
+
+        # Pulsante viola (export video)
+        style.configure("Blue.TButton", font=('Segoe UI', 10, 'bold'), padding=8,
+                       background=self.video_color, foreground="#ffffff")
+        style.map("Blue.TButton",
+                 background=[('active', '#9575cd'), ('disabled', self.border_color)])
+
+        # Scale/Slider
+        style.configure("TScale", background=self.bg_color, troughcolor=self.bg_secondary)
+        style.configure("Horizontal.TScale", background=self.bg_color)
+
+        # Combobox - colori leggibili
+        style.configure("TCombobox",
+                       font=('Segoe UI', 10),
+                       fieldbackground=self.bg_secondary,
+                       background=self.bg_secondary,
+                       foreground=self.fg_color,
+                       arrowcolor=self.fg_color,
+                       selectbackground=self.accent_color,
+                       selectforeground="#0a1929")
+        style.map("TCombobox",
+                 fieldbackground=[('readonly', self.bg_secondary), ('disabled', self.bg_color)],
+                 foreground=[('readonly', self.fg_color), ('disabled', self.border_color)],
                  background=[('active', self.bg_tertiary), ('readonly', self.bg_secondary)])
 
         # Configura anche il dropdown del combobox
@@ -764,6 +2709,14 @@ class RConverter:
         # Progressbar
         style.configure("TProgressbar", background=self.accent_color, troughcolor=self.bg_secondary)
 
+        # Treeview (coda render)
+        style.configure("Treeview", background=self.bg_secondary, fieldbackground=self.bg_secondary,
+                       foreground=self.fg_color, font=('Segoe UI', 9), rowheight=22)
+        style.configure("Treeview.Heading", background=self.bg_tertiary, foreground=self.fg_color,
+                       font=('Segoe UI', 9, 'bold'))
+        style.map("Treeview", background=[('selected', self.accent_color)],
+                 foreground=[('selected', '#0a1929')])
+
     def create_widgets(self):
         main_frame = ttk.Frame(self.root)
         main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -1006,6 +2959,11 @@ class RConverter:
         btn_frame.pack(pady=10)
         ttk.Button(btn_frame, text="⊕ Aggiungi File", command=self.add_image).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="⊗ Rimuovi Tutto", command=self.clear_all).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="📂 Apri Progetto", command=self.open_project).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="💾 Salva Progetto", command=self.save_project).pack(side=tk.LEFT, padx=5)
+        self.cancel_import_btn = ttk.Button(btn_frame, text="✕ Annulla Import", command=self.cancel_import,
+                                            state='disabled')
+        self.cancel_import_btn.pack(side=tk.LEFT, padx=5)
 
         self.info_label = ttk.Label(canvas_frame, text="", font=('Segoe UI', 9))
         self.info_label.pack()
@@ -1120,9 +3078,31 @@ class RConverter:
         self.export_pro_btn = ttk.Button(export_frame, text="▶ ESPORTA COMPOSITO", style="Green.TButton",
                                          command=self.export_project)
         self.export_pro_btn.pack(fill=tk.X, ipady=4)
+        ttk.Button(export_frame, text="⧉ Video Multi-Software", command=self.export_video_multi).pack(fill=tk.X, pady=(6, 0))
+        ttk.Button(export_frame, text="⏱ Video da Statico", command=self.export_still_video).pack(fill=tk.X, pady=(6, 0))
+        ttk.Button(export_frame, text="📏 Stima Export", command=self.estimate_export).pack(fill=tk.X, pady=(6, 0))
+        ttk.Button(export_frame, text="⏲ Analisi Decodifica", command=self.analyze_decode).pack(fill=tk.X, pady=(6, 0))
+        ttk.Button(export_frame, text="⚙ Tuning HAP", command=self.tune_hap).pack(fill=tk.X, pady=(6, 0))
+        ttk.Button(export_frame, text="☰ Coda Render", command=self.open_render_queue).pack(fill=tk.X, pady=(6, 0))
+        # Key/Fill: accanto al video anche <nome>_key (alpha del composito) per mixer/media server
+        self.key_fill_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(export_frame, text="Key/Fill separati (alpha)",
+                        variable=self.key_fill_var).pack(anchor=tk.W, pady=(6, 0))
+        # Alpha nel file: HAP Alpha (Resolume/Millumin) o ProRes 4444 (Millumin broadcast)
+        self.alpha_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(export_frame, text="Video con alpha (HAP Alpha / ProRes 4444)", variable=self.alpha_var,
+                        command=lambda: self._on_software_change(None)).pack(anchor=tk.W)
 
         self.progress = ttk.Progressbar(right_frame, mode='indeterminate')
-        self.progress.pack(fill=tk.X, pady=(5, 10))
+        self.progress.pack(fill=tk.X, pady=(5, 0))
+        export_ctrl = ttk.Frame(right_frame)
+        export_ctrl.pack(fill=tk.X, pady=(4, 10))
+        self.pause_export_btn = ttk.Button(export_ctrl, text="⏸ Pausa", command=self.toggle_export_pause,
+                                           state='disabled')
+        self.pause_export_btn.pack(side=tk.LEFT, expand=True, fill=tk.X)
+        self.cancel_export_btn = ttk.Button(export_ctrl, text="✕ Annulla Export", command=self.cancel_export,
+                                            state='disabled')
+        self.cancel_export_btn.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=(6, 0))
 
         self.fps_var = tk.IntVar(value=30)
 
@@ -1342,23 +3322,17 @@ class RConverter:
         logger.warning("Drag & Drop non disponibile (installa windnd: pip install windnd)")
 
     def _process_dropped_files(self, files):
-        """Processa la lista di file droppati (chiamato nel main thread Tk)"""
-        for filepath in files:
-            try:
-                filepath = str(filepath).strip()
-                if not filepath or not os.path.isfile(filepath):
-                    logger.warning(f"File non valido nel drop: {filepath}")
-                    continue
-
-                ext = Path(filepath).suffix.lower()
-                if ext in VIDEO_FORMATS:
-                    self.load_video(filepath)
-                elif ext in IMAGE_FORMATS:
-                    self.load_image(filepath)
-                else:
-                    logger.info(f"Formato non supportato nel drop: {ext}")
-            except Exception as e:
-                logger.error(f"Errore elaborazione file droppato: {e}")
+        """Processa la lista di file droppati (chiamato nel main thread Tk).
+        La decodifica avviene nel thread pool di import_files_async: la UI resta reattiva.
+        """
+        try:
+            projects = [f for f in files if str(f).strip().lower().endswith(PROJECT_EXT)]
+            if projects:
+                self.open_project(str(projects[0]).strip())
+                return
+            self.import_files_async(files)
+        except Exception as e:
+            logger.error(f"Errore elaborazione file droppati: {e}")
 
     def _on_drop_windnd(self, files):
         """Gestisce il drop di file tramite windnd"""
@@ -1527,13 +3501,8 @@ class RConverter:
         ]
 
         filepaths = filedialog.askopenfilenames(title="Seleziona immagini o video", filetypes=filetypes)
-
-        for filepath in filepaths:
-            ext = Path(filepath).suffix.lower()
-            if ext in VIDEO_FORMATS:
-                self.load_video(filepath)
-            else:
-                self.load_image(filepath)
+        if filepaths:
+            self.import_files_async(filepaths)
 
     def load_image(self, filepath):
         """Carica un'immagine come nuovo layer"""
@@ -1542,53 +3511,7 @@ class RConverter:
             if not os.path.isfile(filepath):
                 logger.warning(f"File non trovato: {filepath}")
                 return
-
-            img = Image.open(filepath)
-            img.load()  # Forza il caricamento e rilascia il file handle
-            if img.mode not in ('RGB', 'RGBA'):
-                img = img.convert('RGBA')
-
-            name = Path(filepath).stem[:20]
-            layer = ImageLayer(img, name)
-
-            # Calcola zoom per far stare l'immagine nel canvas
-            output_w = self.output_width.get()
-            output_h = self.output_height.get()
-            img_w, img_h = img.size
-
-            if img_w == 0 or img_h == 0:
-                logger.warning(f"Immagine con dimensioni zero: {filepath}")
-                return
-
-            # Calcola la scala per contenere l'immagine nell'output (evita div-by-zero)
-            out_w = max(1, output_w)
-            out_h = max(1, output_h)
-            scale_x = out_w / img_w
-            scale_y = out_h / img_h
-            fit_scale = min(scale_x, scale_y)
-
-            # Converti in percentuale zoom (massimo 100% per non ingrandire)
-            fit_zoom = int(fit_scale * 100)
-            fit_zoom = min(fit_zoom, 100)  # Non ingrandire oltre 100%
-            fit_zoom = max(fit_zoom, 10)   # Minimo 10%
-
-            layer.zoom = fit_zoom
-
-            self.layers.append(layer)
-            self.update_layers_list()
-
-            # Seleziona il nuovo layer
-            self.selected_layer = layer
-            self.layers_listbox.selection_clear(0, tk.END)
-            self.layers_listbox.selection_set(len(self.layers) - 1)
-            self.update_layer_controls()
-
-            self.file_label.config(text=f"📚 {len(self.layers)} elementi nel collage")
-            self.update_export_panels()
-            self.redraw_canvas()
-
-            logger.info(f"Immagine caricata: {name} ({img_w}x{img_h}) zoom={fit_zoom}%")
-
+            self._add_media_layer(decode_media_file(filepath))
         except Exception as e:
             logger.error(f"Errore caricamento immagine {filepath}: {e}")
             messagebox.showerror("Errore", f"Impossibile caricare:\n{filepath}\n{str(e)}")
@@ -1598,82 +3521,166 @@ class RConverter:
         if not VIDEO_SUPPORT:
             messagebox.showerror("Errore", "OpenCV non installato. Installa con: pip install opencv-python")
             return
-
-        cap = None
         try:
             filepath = str(filepath)
             if not os.path.isfile(filepath):
                 logger.warning(f"File video non trovato: {filepath}")
                 return
+            self._add_media_layer(decode_media_file(filepath, self.ffmpeg_path, _find_ffprobe(self.ffmpeg_path)))
+        except Exception as e:
+            logger.error(f"Errore caricamento video {filepath}: {e}")
+            messagebox.showerror("Errore", f"Impossibile caricare video:\n{filepath}\n{str(e)}")
 
-            cap = cv2.VideoCapture(filepath)
-            if not cap.isOpened():
-                raise Exception("Impossibile aprire il video")
-
-            ret, frame = cap.read()
-            if not ret:
-                raise Exception("Impossibile leggere il primo frame")
-
-            # Converti BGR -> RGB -> PIL Image
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame_rgb)
-
-            # Ottieni info video
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            if fps <= 0:
-                fps = 30.0  # Fallback sicuro
-            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            duration = frame_count / fps if fps > 0 else 0
-
-            cap.release()
-            cap = None
+    def _add_media_layer(self, media):
+        """Crea il layer da un risultato di decode_media_file e lo seleziona (main thread Tk).
+        Restituisce il layer creato o None se l'immagine ha dimensioni zero.
+        """
+        if not media:
+            return None
+        filepath = media["path"]
+        img = media["image"]
+        img_w, img_h = img.size
+        if img_w == 0 or img_h == 0:
+            logger.warning(f"Media con dimensioni zero: {filepath}")
+            return None
 
-            name = f"🎬{Path(filepath).stem[:15]}"
-            layer = ImageLayer(img, name)
+        if media["is_video"]:
+            layer = ImageLayer(img, f"🎬{Path(filepath).stem[:15]}")
             layer.video_path = filepath
-            layer.video_fps = fps
-            layer.video_frames = frame_count
+            layer.video_fps = media["fps"]
+            layer.video_frames = media["frame_count"]
             layer.is_video = True
+        else:
+            layer = ImageLayer(img, Path(filepath).stem[:20])
+        layer.source_path = filepath
+
+        # Calcola la scala per contenere l'immagine nell'output (evita div-by-zero)
+        out_w = max(1, self.output_width.get())
+        out_h = max(1, self.output_height.get())
+        fit_scale = min(out_w / img_w, out_h / img_h)
+        # Converti in percentuale zoom (massimo 100% per non ingrandire, minimo 10%)
+        fit_zoom = max(10, min(int(fit_scale * 100), 100))
+        layer.zoom = fit_zoom
+
+        self.layers.append(layer)
+        self.update_layers_list()
 
-            # Calcola zoom per far stare nel canvas
-            output_w = self.output_width.get()
-            output_h = self.output_height.get()
-            img_w, img_h = img.size
-
-            if img_w == 0 or img_h == 0:
-                logger.warning(f"Video con frame di dimensioni zero: {filepath}")
-                return
-
-            out_w = max(1, output_w)
-            out_h = max(1, output_h)
-            scale_x = out_w / img_w
-            scale_y = out_h / img_h
-            fit_scale = min(scale_x, scale_y)
-            fit_zoom = int(fit_scale * 100)
-            fit_zoom = min(fit_zoom, 100)
-            fit_zoom = max(fit_zoom, 10)
-            layer.zoom = fit_zoom
-
-            self.layers.append(layer)
-            self.update_layers_list()
-
-            self.selected_layer = layer
-            self.layers_listbox.selection_clear(0, tk.END)
-            self.layers_listbox.selection_set(len(self.layers) - 1)
-            self.update_layer_controls()
+        # Seleziona il nuovo layer
+        self.selected_layer = layer
+        self.layers_listbox.selection_clear(0, tk.END)
+        self.layers_listbox.selection_set(len(self.layers) - 1)
+        self.update_layer_controls()
 
+        if layer.is_video:
+            duration, fps = media["duration"], media["fps"]
             self.file_label.config(text=f"📚 {len(self.layers)} elementi | Video: {duration:.1f}s @ {fps:.0f}fps")
-            self.update_export_panels()
-            self.redraw_canvas()
+            logger.info(f"Video caricato: {layer.name} ({img_w}x{img_h}) {duration:.1f}s @ {fps:.0f}fps")
+        else:
+            self.file_label.config(text=f"📚 {len(self.layers)} elementi nel collage")
+            logger.info(f"Immagine caricata: {layer.name} ({img_w}x{img_h}) zoom={fit_zoom}%")
+        self.update_export_panels()
+        self.redraw_canvas()
+        return layer
 
-            logger.info(f"Video caricato: {name} ({img_w}x{img_h}) {duration:.1f}s @ {fps:.0f}fps")
+    def import_files_async(self, files):
+        """Import parallelo: decodifica anteprime e metadata nel thread pool,
+        aggiunge i layer nel main thread man mano che sono pronti. Annullabile (Esc / pulsante).
+        Drop successivi durante un import in corso si accodano allo stesso batch.
+        """
+        valid = []
+        for filepath in files:
+            filepath = str(filepath).strip()
+            if not filepath or not os.path.isfile(filepath):
+                logger.warning(f"File non valido nell'import: {filepath}")
+                continue
+            ext = Path(filepath).suffix.lower()
+            if ext not in VIDEO_FORMATS and ext not in IMAGE_FORMATS:
+                logger.info(f"Formato non supportato nell'import: {ext}")
+                continue
+            if ext in VIDEO_FORMATS and not VIDEO_SUPPORT:
+                logger.warning(f"Video ignorato (OpenCV assente): {filepath}")
+                continue
+            valid.append(filepath)
+        if not valid:
+            return
 
+        job = self._import_job
+        if job is None or job["cancel"].is_set():
+            job = {
+                "cancel": threading.Event(),
+                "executor": ThreadPoolExecutor(max_workers=IMPORT_MAX_WORKERS, thread_name_prefix="import"),
+                "total": 0, "done": 0, "added": 0, "errors": [],
+            }
+            self._import_job = job
+            self.progress.start()
+            self._set_import_cancel_enabled(True)
+        job["total"] += len(valid)
+        self._update_import_progress(job)
+
+        ffmpeg_path = self.ffmpeg_path
+        ffprobe_path = _find_ffprobe(ffmpeg_path)
+        for filepath in valid:
+            future = job["executor"].submit(decode_media_file, filepath, ffmpeg_path, ffprobe_path, job["cancel"])
+            future.add_done_callback(
+                lambda f, p=filepath: self.root.after(0, lambda: self._on_import_file_done(job, p, f)))
+
+    def _on_import_file_done(self, job, filepath, future):
+        """Callback main thread: aggiunge il layer decodificato e aggiorna il progresso"""
+        if job is not self._import_job or job["cancel"].is_set():
+            return
+        job["done"] += 1
+        try:
+            media = None if future.cancelled() else future.result()
+            if media is not None and self._add_media_layer(media) is not None:
+                job["added"] += 1
         except Exception as e:
-            logger.error(f"Errore caricamento video {filepath}: {e}")
-            messagebox.showerror("Errore", f"Impossibile caricare video:\n{filepath}\n{str(e)}")
-        finally:
-            if cap is not None:
-                cap.release()
+            logger.error(f"Errore import {filepath}: {e}")
+            job["errors"].append(f"{Path(filepath).name}: {e}")
+        if job["done"] >= job["total"]:
+            self._finish_import(job)
+        else:
+            self._update_import_progress(job)
+
+    def _update_import_progress(self, job):
+        """Mostra avanzamento import nella info label"""
+        try:
+            self.info_label.config(text=f"Import: {job['done']}/{job['total']}  •  Esc per annullare")
+        except tk.TclError:
+            pass
+
+    def _finish_import(self, job, cancelled=False):
+        """Chiude il batch di import: ferma progress, rilascia il pool, riepiloga errori"""
+        job["executor"].shutdown(wait=False)
+        if self._import_job is job:
+            self._import_job = None
+        self.progress.stop()
+        self._set_import_cancel_enabled(False)
+        self.info_label.config(text="")
+        if cancelled:
+            logger.info(f"Import annullato: {job['added']}/{job['total']} file caricati")
+            self.file_label.config(text=f"📚 {len(self.layers)} elementi | Import annullato")
+            return
+        logger.info(f"Import completato: {job['added']}/{job['total']} file caricati")
+        if job["errors"]:
+            shown = "\n".join(job["errors"][:10])
+            more = f"\n... e altri {len(job['errors']) - 10}" if len(job["errors"]) > 10 else ""
+            messagebox.showerror("Errore", f"Impossibile caricare {len(job['errors'])} file:\n{shown}{more}")
+
+    def cancel_import(self):
+        """Annulla l'import in corso: i file non ancora decodificati vengono scartati"""
+        job = self._import_job
+        if job is None:
+            return False
+        job["cancel"].set()
+        self._finish_import(job, cancelled=True)
+        return True
+
+    def _set_import_cancel_enabled(self, enabled):
+        """Abilita/disabilita il pulsante Annulla import"""
+        try:
+            self.cancel_import_btn.config(state='normal' if enabled else 'disabled')
+        except (AttributeError, tk.TclError):
+            pass
 
     def update_layers_list(self):
         """Aggiorna la lista dei layer"""
@@ -1763,6 +3770,7 @@ class RConverter:
             new_layer.offset_y = self.selected_layer.offset_y + 50
             new_layer.flip_h = self.selected_layer.flip_h
             new_layer.flip_v = self.selected_layer.flip_v
+            new_layer.source_path = self.selected_layer.source_path
 
             self.layers.append(new_layer)
             self.selected_layer = new_layer
@@ -1997,14 +4005,27 @@ class RConverter:
 
         return (x, y, final_w, final_h)
 
-    def _apply_image_processing(self, img, filters, intensity=1.0, bayer_tiled=None, skip_bilateral=False):
+    def _apply_image_processing(self, img, filters, intensity=1.0, bayer_tiled=None, skip_bilateral=False,
+                                as_array=False, bit_depth=8, dither_bits=8, temporal=None, frame_pixels=None,
+                                grain_plane=None):
         """Pipeline broadcast ottimizzata: color levels, deband, denoise, bilateral, sharpen, dither.
         OPT-3: bayer_tiled pre-calcolato evita allocazione per frame. OPT-4: sharpen+dither in numpy.
         intensity: 0-1 scala i parametri (da proc_intensity)
         skip_bilateral: se True e risoluzione > 2.5Mpx, salta bilateral (export video, ~50-200ms/frame risparmiati)
+        as_array: restituisce l'ndarray RGB uint8 invece di un'immagine PIL (OPT-6, pipe FFmpeg)
+        bit_depth: 16 -> livelli/deband/dither in uint16 e ndarray uint16 (pipe rgb48le, codec 10-bit);
+        il dither lavora sull'LSB del codec (dither_bits), non sugli 8 bit del composito.
+        Deband: grain e dither solo nelle zone piatte (deband_flat_mask); frame senza zone piatte
+        saltano entrambi.
+        temporal: stato per denoise temporale (export video, frame in sequenza) al posto del median.
+        frame_pixels: pixel del frame intero quando img è una regione (dirty rect): il bilateral
+        segue la scelta del frame, così regione e resto del frame sono processati allo stesso modo.
+        grain_plane: grain fisso (_precompute_grain_plane) al posto del grain casuale per frame.
         """
-        if not filters or img is None:
+        if img is None:
             return img
+        if not filters:
+            return unprocessed_frame_array(img, bit_depth) if as_array else img
         try:
             arr = np.array(img)
             if arr.size == 0:
@@ -2014,30 +4035,54 @@ class RConverter:
             else:
                 bgr = cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
             scale = max(0.01, min(1.0, float(intensity)))
+            # 16 bit: stessa pipeline con valori 0-65535 (unit = 1 LSB a 8 bit), solo operazioni vettoriali
+            high = bit_depth > 8
+            peak = 65535.0 if high else 255.0
+            dtype = np.uint16 if high else np.uint8
+            unit = peak / 255.0
             # 1+2. Color levels + deband combinati (float32, evita allocazioni intermedie)
-            bl = int(filters.get("black_level", 0) * scale)
-            wl = int(255 - (255 - filters.get("white_level", 255)) * scale)
-            wl = max(wl, bl + 1)
-            scale_val = 255.0 / (wl - bl)
-            bgr_f = (bgr.astype(np.float32) - bl) * scale_val
+            # LUT colore (gamma wall / calibrazione): un gather al posto dei livelli lineari
+            color_lut = build_color_lut(filters, scale, peak)
+            if color_lut is not None:
+                bgr_f = apply_color_lut(bgr, color_lut)
+            else:
+                bl, wl = color_transform_params(filters, scale)[:2]
+                scale_val = peak / (wl - bl)
+                bgr_f = (bgr.astype(np.float32) - bl) * scale_val
+            # Deband: grain (e dither) solo nelle zone piatte sotto deband_threshold
             grain = int(filters.get("deband_grain", 2) * scale)
-            if grain > 0 and VIDEO_SUPPORT:
-                noise = np.random.randint(-grain, grain + 1, bgr.shape, dtype=np.int16)
-                bgr_f = np.clip(bgr_f + noise.astype(np.float32), 0, 255)
-            bgr = np.clip(bgr_f, 0, 255).astype(np.uint8)
-            # 3. Denoise (median blur su BGR)
+            deband_thr = filters.get("deband_threshold", 0) * scale
+            flat_mask = deband_flat_mask(bgr, deband_thr) if deband_thr > 0 and VIDEO_SUPPORT else None
+            if grain > 0 and VIDEO_SUPPORT and (flat_mask is not None or deband_thr <= 0):
+                if grain_plane is not None and grain_plane.shape == bgr.shape:
+                    noise = grain_plane.astype(np.float32)
+                else:
+                    noise = np.random.randint(-grain, grain + 1, bgr.shape, dtype=np.int16).astype(np.float32)
+                if high:
+                    noise *= unit
+                if flat_mask is not None:
+                    noise *= flat_mask
+                bgr_f = np.clip(bgr_f + noise, 0, peak)
+            bgr = np.clip(bgr_f, 0, peak).astype(dtype)
+            # 3. Denoise: temporale sui video (niente flicker tra frame), median blur sulle immagini
             dn = filters.get("denoise_strength", 0) * scale
-            if dn > 0.2 and VIDEO_SUPPORT:
+            if dn > 0.2 and VIDEO_SUPPORT and temporal is not None:
+                bgr = temporal_denoise(bgr, temporal, dn, unit)
+            elif dn > 0.2 and VIDEO_SUPPORT:
                 k = 3 if dn < 0.5 else 5
                 bgr = cv2.medianBlur(bgr, k)
             # 4. Bilateral (su BGR) - skip per export video su risoluzioni > 2.5Mpx (performance)
-            pixels = bgr.shape[0] * bgr.shape[1]
+            pixels = frame_pixels or bgr.shape[0] * bgr.shape[1]
             do_bilateral = (VIDEO_SUPPORT and pixels < 4_500_000 and
                             not (skip_bilateral and pixels > 2_500_000))
             if do_bilateral:
                 sigma_s = max(1, int(filters.get("bilateral_sigma_s", 2) * scale))
                 sigma_r = filters.get("bilateral_sigma_r", 0.08) * scale
-                bgr = cv2.bilateralFilter(bgr, d=5, sigmaColor=int(sigma_r * 255), sigmaSpace=sigma_s)
+                if high:  # bilateralFilter: solo 8U/32F
+                    bgr = cv2.bilateralFilter(bgr.astype(np.float32), d=5, sigmaColor=sigma_r * peak,
+                                              sigmaSpace=sigma_s).astype(dtype)
+                else:
+                    bgr = cv2.bilateralFilter(bgr, d=5, sigmaColor=int(sigma_r * 255), sigmaSpace=sigma_s)
             # 5+6. Sharpen + Dither in numpy (OPT-4: evita round-trip PIL<->numpy)
             rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
             amt = filters.get("sharpen_amount", 0) * scale
@@ -2054,12 +4099,24 @@ class RConverter:
                     tiled = bayer_tiled
                 else:
                     tiled = _precompute_bayer_tiled(h, w)
-                if tiled is not None:
+                if tiled is not None and not (deband_thr > 0 and flat_mask is None):
                     strength = dither_scale_val * 1.5
-                    rgb = np.clip(arr_f + tiled * strength, 0, 255).astype(np.uint8)
+                    if high:
+                        strength *= peak / ((1 << max(8, dither_bits)) - 1)
+                    dither = tiled * strength
+                    if flat_mask is not None:
+                        dither = dither * flat_mask
+                    rgb = np.clip(arr_f + dither, 0, peak).astype(dtype)
+            if as_array:
+                return rgb
+            if high:
+                rgb = (rgb >> 8).astype(np.uint8)
             img = Image.fromarray(rgb)
         except Exception as e:
             logger.warning(f"Processing filtri: {e}")
+            if as_array:
+                # Pipe rawvideo: anche il frame non processato deve avere il formato atteso (rgb48le a 16 bit)
+                return unprocessed_frame_array(img, bit_depth)
         return img
 
     def _apply_layer_transforms_to_image(self, img, layer, for_export=False):
@@ -2081,7 +4138,8 @@ class RConverter:
         return img
 
     def create_composite_image(self, output_w, output_h, for_export=False, target_size=None,
-                               video_frame_overrides=None, layers=None):
+                               video_frame_overrides=None, layers=None, bg_color=None, with_alpha=False,
+                               transparent=False):
         """Crea l'immagine composita di tutti i layer (immagini + video)
 
         Args:
@@ -2090,23 +4148,29 @@ class RConverter:
             target_size: (w, h) - se fornito, crea direttamente a questa dimensione
             video_frame_overrides: {layer: PIL.Image} - frame corrente per layer video (export video)
             layers: se fornito usa questi layer (thread-safe export); altrimenti self.layers
+            bg_color: colore sfondo (export da coda render); default bg_color_var
+            with_alpha: restituisce (composito RGB, key L) - key = copertura alpha dei layer (key/fill)
+            transparent: sfondo trasparente e 'over' dell'alpha, restituisce RGBA (run statici
+                pre-appiattiti dell'export video)
         """
         output_w = max(1, output_w)
         output_h = max(1, output_h)
         video_frame_overrides = video_frame_overrides or {}
         layers = layers if layers is not None else self.layers
+        bg_color = bg_color or self.bg_color_var.get()
 
         if target_size:
             target_w, target_h = target_size
             target_w = max(1, target_w)
             target_h = max(1, target_h)
             scale = min(target_w / output_w, target_h / output_h)
-            out_img = Image.new('RGBA', (target_w, target_h), color=self.bg_color_var.get())
+            out_img = Image.new('RGBA', (target_w, target_h), color=bg_color)
             resample = Image.Resampling.NEAREST
         else:
             scale = 1.0
-            out_img = Image.new('RGBA', (output_w, output_h), color=self.bg_color_var.get())
+            out_img = Image.new('RGBA', (output_w, output_h), color=(0, 0, 0, 0) if transparent else bg_color)
             resample = Image.Resampling.LANCZOS if for_export else Image.Resampling.BILINEAR
+        key = Image.new('L', out_img.size, 0) if with_alpha else None
 
         for layer in layers:
             try:
@@ -2132,6 +4196,12 @@ class RConverter:
                     x = (output_w - new_w) // 2 + layer.offset_x
                     y = (output_h - new_h) // 2 + layer.offset_y
 
+                if transparent:
+                    # paste con maschera mescola anche l'alpha col trasparente: serve l'over vero
+                    placed = Image.new('RGBA', out_img.size, (0, 0, 0, 0))
+                    placed.paste(img.convert('RGBA'), (x, y))
+                    out_img = Image.alpha_composite(out_img, placed)
+                    continue
                 try:
                     out_img.paste(img, (x, y), img)
                 except ValueError:
@@ -2139,10 +4209,16 @@ class RConverter:
                         out_img.paste(img, (x, y))
                     except Exception as paste_ex:
                         logger.debug(f"Paste fallback layer {layer.name}: {paste_ex}")
+                if key is not None:
+                    key = screen_alpha(key, img, x, y)
             except Exception as e:
                 logger.warning(f"Errore rendering layer {layer.name}: {e}")
                 continue
 
+        if transparent:
+            return out_img
+        if key is not None:
+            return out_img.convert('RGB'), key
         return out_img.convert('RGB')
 
     def _schedule_redraw(self, delay_ms=16):
@@ -2490,6 +4566,8 @@ class RConverter:
             self.remove_selected_layer()
 
     def on_escape_key(self, event=None):
+        if self.cancel_import():
+            return
         self.selected_layer = None
         self.layers_listbox.selection_clear(0, tk.END)
         self.update_layers_list()
@@ -2568,7 +4646,7 @@ class RConverter:
             key = SOFTWARE_KEYS[idx]
             self.software_target_var.set(key)
             profile = get_export_profile(self.led_wall_var.get(), key, self.output_hz.get(),
-                                         custom_presets=self.custom_presets)
+                                         custom_presets=self.custom_presets, alpha=self.alpha_var.get())
             v = profile["video"]
             codec = v.get("format_name") or v.get("codec", "")
             if v.get("profile"):
@@ -2589,7 +4667,8 @@ class RConverter:
                 self.led_wall_var.get(),
                 self.software_target_var.get(),
                 self.output_hz.get(),
-                custom_presets=self.custom_presets
+                custom_presets=self.custom_presets,
+                alpha=self.alpha_var.get()
             )
             v, a, f = profile["video"], profile["audio"], profile["filters"]
             codec = v.get("format_name") or v.get("codec", "?")
@@ -2602,9 +4681,13 @@ class RConverter:
             audio_str = f"PCM {a['bit_depth']}bit" if a["codec"].startswith("pcm") else f"AAC {a.get('bitrate_kbps', 0)}k"
             txt = f"Video: {codec} / {v.get('container', 'mov').upper()}\n"
             txt += f"Bitrate: {br} Mbps @ 1080p | FPS: {v.get('framerate', 30)}\n"
-            txt += f"Bit: {bd}bit | Spazio colore: {cs} {pf.upper()}\n"
+            txt += f"Bit: {bd}bit (processing {processing_bit_depth(profile)}bit) | Spazio colore: {cs} {pf.upper()}\n"
             txt += f"Audio: {audio_str} @ {a['sample_rate']}Hz\n"
-            txt += f"Filtri: Deband({f['deband_threshold']}) | Sharp({f['sharpen_amount']})"
+            txt += f"Filtri: Deband({f['deband_threshold']}) | Sharp({f['sharpen_amount']})\n"
+            workers = SEGMENT_MAX_WORKERS if is_intra_only(profile) else 1
+            plan = plan_encoder_resources(profile, self.output_width.get(), self.output_height.get(),
+                                          RENDER_CPU_COUNT, encoders=workers, compositors=workers)
+            txt += f"Encoder: {describe_encoder_plan(plan)}"
             self.summary_label.config(text=txt)
         except Exception as e:
             logger.warning(f"update_export_summary: {e}")
@@ -2774,7 +4857,8 @@ class RConverter:
             "led_wall_name": parsed.get("led_wall_name", "Importato"),
             "hardware": {"brand": parsed.get("brand", "?"), "receiving_card": parsed.get("receiving_card", "?")},
             "physical_specs": ps,
-            "grayscale_specs": {"gray_depth_bits": gray, "scan_ratio": parsed.get("scan_type", "1/16")},
+            "grayscale_specs": {"gray_depth_bits": gray, "scan_ratio": parsed.get("scan_type", "1/16"),
+                                "gamma": parsed.get("gamma", CONTENT_GAMMA)},
             "magic_upscale_filters": dict(base_filters),
             "input_signal_hz": parsed.get("input_signal_hz", 50),
         }
@@ -2906,22 +4990,458 @@ class RConverter:
         if not path:
             return
         try:
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
-            logger.info(f"Preset salvato: {path}")
-            messagebox.showinfo("Successo", f"Preset salvato:\n{path}")
-        except Exception as e:
-            logger.error(f"Salva preset: {e}")
-            messagebox.showerror("Errore", str(e))
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            logger.info(f"Preset salvato: {path}")
+            messagebox.showinfo("Successo", f"Preset salvato:\n{path}")
+        except Exception as e:
+            logger.error(f"Salva preset: {e}")
+            messagebox.showerror("Errore", str(e))
+
+    # ==================== PROGETTO ====================
+
+    def _project_settings_snapshot(self):
+        """Impostazioni output + selezione profilo export da salvare nel progetto"""
+        led_key = self.led_wall_var.get()
+        custom = None
+        if led_key.startswith("custom_"):
+            custom = self.custom_presets.get(led_key[7:])
+        return {
+            "output_width": self.output_width.get(),
+            "output_height": self.output_height.get(),
+            "output_hz": self.output_hz.get(),
+            "bg_color": self.bg_color_var.get(),
+            "proc_intensity": self.proc_intensity.get(),
+            "led_wall": led_key,
+            "software_target": self.software_target_var.get(),
+            "custom_preset": custom,
+        }
+
+    def save_project(self):
+        """Salva il progetto (.rcproj): trasformazioni layer, profilo export, asset per hash"""
+        if not self.layers:
+            messagebox.showwarning("Avviso", "Aggiungi almeno un elemento al progetto")
+            return
+        filepath = filedialog.asksaveasfilename(
+            title="Salva progetto",
+            defaultextension=PROJECT_EXT,
+            initialfile=f"progetto{PROJECT_EXT}",
+            filetypes=[("Progetto R-Converter", f"*{PROJECT_EXT}"), ("Tutti", "*.*")]
+        )
+        if not filepath:
+            return
+        if not Path(filepath).parent.exists():
+            messagebox.showerror("Errore", f"Cartella di destinazione non esiste:\n{Path(filepath).parent}")
+            return
+        # Snapshot nel main thread (le immagini originali non vengono mai modificate in place)
+        layers_snapshot = [(l.get_state(), l.source_path, l.original_image) for l in self.layers]
+        settings = self._project_settings_snapshot()
+        self.progress.start()
+        threading.Thread(target=self._do_save_project, args=(filepath, layers_snapshot, settings),
+                         daemon=True).start()
+
+    def _do_save_project(self, filepath, layers_snapshot, settings):
+        """Thread: calcola hash asset, popola la cache proxy e scrive il JSON"""
+        try:
+            project_dir = os.path.dirname(os.path.abspath(filepath))
+            assets = {}
+            hash_by_source = {}
+            layer_entries = []
+            for state, source, img in layers_snapshot:
+                if source and os.path.isfile(source):
+                    asset_hash = hash_by_source.get(source)
+                    if asset_hash is None:
+                        asset_hash = compute_asset_hash(source)
+                        hash_by_source[source] = asset_hash
+                        size, mtime_ns = _asset_stat(source)
+                        try:
+                            rel_path = os.path.relpath(source, project_dir)
+                        except ValueError:
+                            rel_path = None  # Windows: drive diverso
+                        assets[asset_hash] = {"hash": asset_hash, "path": os.path.abspath(source),
+                                              "rel_path": rel_path, "size": size, "mtime_ns": mtime_ns}
+                else:
+                    # Layer senza sorgente su disco: asset identificato dai pixel, vive solo in cache
+                    asset_hash = compute_image_hash(img)
+                    assets.setdefault(asset_hash, {"hash": asset_hash, "path": None})
+                media = {"image": img, "is_video": state["is_video"], "fps": state["video_fps"],
+                         "frame_count": state["video_frames"],
+                         "duration": state["video_frames"] / max(state["video_fps"] or 1, 1)}
+                self.asset_cache.store(asset_hash, media)
+                layer_entries.append({"asset": asset_hash, "state": state})
+
+            project = {
+                "format": PROJECT_FORMAT,
+                "version": PROJECT_VERSION,
+                "settings": settings,
+                "assets": list(assets.values()),
+                "layers": layer_entries,
+            }
+            write_project_file(filepath, project)
+            self.asset_cache.prune()
+            logger.info(f"Progetto salvato: {filepath} ({len(layer_entries)} layer, {len(assets)} asset)")
+            self.current_project_path = filepath
+            self.root.after(0, lambda: self.progress.stop())
+            self.root.after(0, lambda: messagebox.showinfo("Successo", f"Progetto salvato:\n{filepath}"))
+        except Exception as ex:
+            logger.error(f"Errore salvataggio progetto: {ex}")
+            self.root.after(0, lambda: self.progress.stop())
+            self.root.after(0, lambda err=str(ex): messagebox.showerror("Errore", err))
+
+    def open_project(self, filepath=None):
+        """Apre un progetto .rcproj: asset dalla cache content-addressed (fallback sorgente)"""
+        if filepath is None:
+            filepath = filedialog.askopenfilename(
+                title="Apri progetto",
+                filetypes=[("Progetto R-Converter", f"*{PROJECT_EXT}"), ("Tutti", "*.*")]
+            )
+        if not filepath:
+            return
+        try:
+            project = read_project_file(filepath)
+        except Exception as e:
+            logger.error(f"Apertura progetto {filepath}: {e}")
+            messagebox.showerror("Errore", f"Impossibile aprire il progetto:\n{e}")
+            return
+        if self.layers and not messagebox.askyesno("Conferma", "Sostituire il progetto corrente?"):
+            return
+        self.cancel_import()
+        self.progress.start()
+        self.info_label.config(text="Apertura progetto...")
+        threading.Thread(target=self._do_open_project, args=(filepath, project), daemon=True).start()
+
+    def _do_open_project(self, filepath, project):
+        """Thread: risolve gli asset in parallelo (proxy in cache = nessuna decodifica)"""
+        try:
+            resolved, errors = resolve_project_assets(project, filepath, self.asset_cache, self.ffmpeg_path)
+            self.root.after(0, lambda: self._apply_opened_project(filepath, project, resolved, errors))
+        except Exception as ex:
+            logger.error(f"Errore apertura progetto: {ex}")
+            self.root.after(0, lambda: self.progress.stop())
+            self.root.after(0, lambda: self.info_label.config(text=""))
+            self.root.after(0, lambda err=str(ex): messagebox.showerror("Errore", err))
+
+    def _apply_project_settings(self, settings):
+        """Ripristina risoluzione, sfondo, intensità processing, LED wall, software target e Hz
+        (in quest'ordine: il cambio LED wall imposta Hz dal preset, quindi Hz del progetto va applicato
+        per ultimo)"""
+        self.output_width.set(int(settings.get("output_width", self.output_width.get())))
+        self.output_height.set(int(settings.get("output_height", self.output_height.get())))
+        self.preset_combo.set("Personalizzato")
+        self.bg_color_var.set(settings.get("bg_color", self.bg_color_var.get()))
+        self.proc_intensity.set(float(settings.get("proc_intensity", self.proc_intensity.get())))
+
+        led_key = settings.get("led_wall", "")
+        if led_key in LED_WALL_SPECS:
+            self.led_wall_combo.set(LED_WALL_SPECS[led_key]["name"])
+        elif led_key.startswith("custom_") and settings.get("custom_preset"):
+            name = led_key[7:]
+            self.custom_presets[name] = settings["custom_preset"]
+            led_names = list(self.led_wall_combo["values"])
+            if name not in led_names:
+                led_names.append(name)
+                self.led_wall_combo["values"] = led_names
+            self.led_wall_combo.set(name)
+        self._on_led_wall_change(None)
+
+        sw_key = settings.get("software_target")
+        if sw_key in SOFTWARE_KEYS:
+            self.software_combo.set(self.software_combo["values"][SOFTWARE_KEYS.index(sw_key)])
+        self._on_software_change(None)
+
+        hz = settings.get("output_hz")
+        if hz in HZ_PRESETS:
+            self.hz_combo.set(f"{hz} Hz")
+            self._on_hz_change(None)
+
+    def _apply_opened_project(self, filepath, project, resolved, errors):
+        """Main thread: sostituisce i layer con quelli del progetto (ordine Z preservato)"""
+        try:
+            self.progress.stop()
+            self.info_label.config(text="")
+            for layer in self.layers:
+                layer.cleanup()
+            self.layers.clear()
+            self.selected_layer = None
+            self._apply_project_settings(project.get("settings", {}))
+
+            layers, missing_video = build_project_layers(project, resolved)
+            self.layers.extend(layers)
+
+            self.update_layers_list()
+            self.update_layer_controls()
+            self.update_export_panels()
+            self.file_label.config(text=f"📚 {len(self.layers)} elementi | {Path(filepath).name}")
+            self.redraw_canvas()
+            logger.info(f"Progetto aperto: {filepath} ({len(self.layers)} layer)")
+            self.current_project_path = filepath
+            if missing_video:
+                errors.append("Video sorgente mancanti (solo anteprima): " + ", ".join(missing_video))
+            if errors:
+                messagebox.showwarning("Progetto", "Progetto aperto con avvisi:\n" + "\n".join(errors[:10]))
+        except Exception as e:
+            logger.error(f"Applicazione progetto: {e}")
+            messagebox.showerror("Errore", f"Impossibile aprire il progetto:\n{e}")
+
+    # ==================== CODA RENDER ====================
+
+    def _run_render_job(self, job, report, controller=None):
+        """Runner coda render (thread): carica il progetto dalla cache asset e renderizza senza dialog.
+        Output scritto su file .partial e rinominato solo a render completato.
+        controller: ExportController del job (Annulla job nella finestra Coda Render).
+        """
+        project_path = job["project"]
+        project = read_project_file(project_path)
+        report("Caricamento asset...")
+        resolved, errors = resolve_project_assets(project, project_path, self.asset_cache, self.ffmpeg_path)
+        if errors:
+            raise Exception("Asset mancanti: " + "; ".join(errors[:3]))
+        layers, missing_video = build_project_layers(project, resolved)
+        if missing_video:
+            raise Exception("Video sorgente mancanti: " + ", ".join(missing_video))
+        if not layers:
+            raise Exception("Progetto senza layer")
+
+        led_key = job["led_wall"]
+        custom = {}
+        if led_key.startswith("custom_") and job.get("custom_preset"):
+            custom[led_key[7:]] = job["custom_preset"]
+        hz = int(job["output_hz"])
+        settings = project.get("settings", {})
+        ctx = {
+            "output_w": int(settings.get("output_width", 1920)),
+            "output_h": int(settings.get("output_height", 1080)),
+            "fps": max(1, min(hz, 60)),
+            # Intensità del processing salvata nel progetto (progetti vecchi: massimo, default GUI)
+            "proc_int": float(settings.get("proc_intensity", 100.0)) / 100.0,
+            "bg_color": settings.get("bg_color", "#000000"),
+            "encoder_slot": self.render_queue.encoder_slots,
+            "segment_workers": 1,  # Coda: il parallelismo è tra job (compositor_slots)
+            "core_budget": self.render_queue.core_budget(),
+            "controller": controller,
+        }
+
+        # (file parziale, file finale, profilo) per ogni software del job
+        targets = []
+        for sw_key, output_path in render_job_targets(job):
+            out_path = Path(output_path)
+            part_path = str(out_path.with_name(f"{out_path.stem}.partial{out_path.suffix}"))
+            targets.append((part_path, out_path, get_export_profile(led_key, sw_key, hz, custom_presets=custom,
+                                                                    alpha=job.get("alpha", False))))
+        try:
+            if any(l.is_video for l in layers):
+                self._render_video([(part, profile) for part, _, profile in targets], layers, ctx, report)
+            else:
+                for part_path, _, profile in targets:
+                    self._render_image(part_path, layers, dict(ctx, profile=profile))
+            for part_path, out_path, _ in targets:
+                os.replace(part_path, out_path)
+        finally:
+            for layer in layers:
+                layer.cleanup()
+            for part_path, _, _ in targets:
+                if os.path.isfile(part_path):
+                    try:
+                        os.remove(part_path)
+                    except OSError as e:
+                        logger.debug(f"Rimozione file parziale: {e}")
+            gc.collect()
+
+    def _on_render_queue_change(self):
+        """Notifica dalla coda (qualsiasi thread): refresh vista raggruppato, max ~4/s"""
+        if self._rq_refresh_scheduled:
+            return
+        self._rq_refresh_scheduled = True
+        try:
+            self.root.after(250, self._refresh_render_queue_view)
+        except (RuntimeError, tk.TclError):
+            self._rq_refresh_scheduled = False
+
+    def open_render_queue(self):
+        """Finestra Coda Render: aggiunta job (progetti x LED wall x software x Hz) e stato"""
+        if self.render_queue_window is not None and self.render_queue_window.winfo_exists():
+            self.render_queue_window.lift()
+            return
+        win = tk.Toplevel(self.root)
+        win.title("Coda Render")
+        win.configure(bg=self.bg_color)
+        win.geometry("900x560")
+        self.render_queue_window = win
+        self._rq_projects = [self.current_project_path] if self.current_project_path else []
+        self._rq_output_dir = str(Path(self.current_project_path).parent) if self.current_project_path else ""
+
+        add_frame = ttk.LabelFrame(win, text="➕ Nuovi job", padding=8)
+        add_frame.pack(fill=tk.X, padx=10, pady=(10, 5))
+
+        row = ttk.Frame(add_frame)
+        row.pack(fill=tk.X)
+        ttk.Button(row, text="Progetti...", command=self._rq_choose_projects).pack(side=tk.LEFT)
+        self._rq_projects_label = ttk.Label(row, text="", font=('Segoe UI', 9))
+        self._rq_projects_label.pack(side=tk.LEFT, padx=8)
+        ttk.Button(row, text="Cartella output...", command=self._rq_choose_output_dir).pack(side=tk.LEFT, padx=(20, 0))
+        self._rq_output_label = ttk.Label(row, text="", font=('Segoe UI', 9))
+        self._rq_output_label.pack(side=tk.LEFT, padx=8)
+
+        sel = ttk.Frame(add_frame)
+        sel.pack(fill=tk.X, pady=(6, 0))
+        list_opts = dict(selectmode=tk.MULTIPLE, height=6, exportselection=False, bg=self.bg_secondary,
+                         fg=self.fg_color, selectbackground=self.accent_color, selectforeground="#0a1929",
+                         font=('Segoe UI', 9), bd=0, highlightthickness=0)
+        ttk.Label(sel, text="LED Wall:").grid(row=0, column=0, sticky=tk.W)
+        self._rq_led_list = tk.Listbox(sel, width=34, **list_opts)
+        for name in self.led_wall_combo["values"]:
+            self._rq_led_list.insert(tk.END, name)
+        self._rq_led_list.grid(row=1, column=0, padx=(0, 10))
+        ttk.Label(sel, text="Software:").grid(row=0, column=1, sticky=tk.W)
+        self._rq_sw_list = tk.Listbox(sel, width=28, **list_opts)
+        for name in self.software_combo["values"]:
+            self._rq_sw_list.insert(tk.END, name)
+        self._rq_sw_list.grid(row=1, column=1, padx=(0, 10))
+        ttk.Label(sel, text="Hz:").grid(row=0, column=2, sticky=tk.W)
+        hz_frame = ttk.Frame(sel)
+        hz_frame.grid(row=1, column=2, sticky=tk.N)
+        self._rq_hz_vars = {}
+        for hz in HZ_PRESETS:
+            var = tk.BooleanVar(value=(hz == self.output_hz.get()))
+            self._rq_hz_vars[hz] = var
+            ttk.Checkbutton(hz_frame, text=f"{hz} Hz", variable=var).pack(anchor=tk.W)
+        ttk.Button(sel, text="➕ Aggiungi alla coda", style="Green.TButton",
+                   command=self._rq_add_jobs).grid(row=1, column=3, sticky=tk.S, padx=(10, 0))
+
+        columns = ("project", "led", "software", "hz", "status", "progress")
+        self._rq_tree = ttk.Treeview(win, columns=columns, show="headings", height=10)
+        for col, title, width in (("project", "Progetto", 180), ("led", "LED Wall", 180),
+                                  ("software", "Software", 110), ("hz", "Hz", 50),
+                                  ("status", "Stato", 90), ("progress", "Avanzamento", 240)):
+            self._rq_tree.heading(col, text=title)
+            self._rq_tree.column(col, width=width, anchor=tk.W)
+        self._rq_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        btns = ttk.Frame(win)
+        btns.pack(fill=tk.X, padx=10, pady=(0, 10))
+        ttk.Button(btns, text="▶ Avvia", command=self.render_queue.start).pack(side=tk.LEFT)
+        ttk.Button(btns, text="⏸ Sospendi", command=self.render_queue.stop).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btns, text="↻ Riprova falliti", command=self.render_queue.retry_failed).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btns, text="✕ Rimuovi", command=self._rq_remove_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btns, text="■ Annulla job", command=self._rq_cancel_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btns, text="Rimuovi completati", command=self.render_queue.remove_finished).pack(side=tk.LEFT, padx=5)
+        self._rq_status_label = ttk.Label(btns, text="", font=('Segoe UI', 9))
+        self._rq_status_label.pack(side=tk.RIGHT)
+
+        self._rq_update_selection_labels()
+        self._refresh_render_queue_view()
+
+    def _rq_update_selection_labels(self):
+        n = len(self._rq_projects)
+        self._rq_projects_label.config(text=f"{n} progetti" if n != 1 else Path(self._rq_projects[0]).name)
+        self._rq_output_label.config(text=self._rq_output_dir or "(cartella del progetto)")
+
+    def _rq_choose_projects(self):
+        paths = filedialog.askopenfilenames(parent=self.render_queue_window, title="Progetti da renderizzare",
+                                            filetypes=[("Progetto R-Converter", f"*{PROJECT_EXT}")])
+        if paths:
+            self._rq_projects = list(paths)
+            self._rq_update_selection_labels()
+
+    def _rq_choose_output_dir(self):
+        path = filedialog.askdirectory(parent=self.render_queue_window, title="Cartella output")
+        if path:
+            self._rq_output_dir = path
+            self._rq_update_selection_labels()
+
+    def _rq_add_jobs(self):
+        """Aggiunge alla coda il prodotto progetti x LED wall x Hz selezionati.
+        I software selezionati formano un unico job multi-target (composito calcolato una volta).
+        """
+        led_names = [self._rq_led_list.get(i) for i in self._rq_led_list.curselection()]
+        sw_idx = list(self._rq_sw_list.curselection())
+        hz_list = [hz for hz, var in self._rq_hz_vars.items() if var.get()]
+        alpha = self.alpha_var.get()  # Opzione alpha corrente, salvata nel job
+        if not (self._rq_projects and led_names and sw_idx and hz_list):
+            messagebox.showwarning("Coda Render", "Seleziona almeno un progetto, un LED wall, un software e un Hz.",
+                                   parent=self.render_queue_window)
+            return
+        added = 0
+        for project_path in self._rq_projects:
+            try:
+                project = read_project_file(project_path)
+            except Exception as e:
+                logger.error(f"Coda render, progetto {project_path}: {e}")
+                messagebox.showerror("Errore", f"Progetto non valido:\n{project_path}\n{e}",
+                                     parent=self.render_queue_window)
+                continue
+            has_video = any(l.get("state", {}).get("is_video") for l in project.get("layers", []))
+            out_dir = self._rq_output_dir or str(Path(project_path).parent)
+            for led_name in led_names:
+                led_key = next((k for k in LED_WALL_KEYS if LED_WALL_SPECS[k]["name"] == led_name),
+                               f"custom_{led_name}")
+                custom = self.custom_presets.get(led_name) if led_key.startswith("custom_") else None
+                for hz in hz_list:
+                    sw_keys = [SOFTWARE_KEYS[i] for i in sw_idx]
+                    output_paths = []
+                    for sw_key in sw_keys:
+                        profile = get_export_profile(led_key, sw_key, hz, custom_presets=self.custom_presets,
+                                                     alpha=alpha)
+                        if has_video:
+                            ext = ".mov" if profile["video"].get("container") == "mov" else ".mp4"
+                        else:
+                            ext = f".{profile.get('image_format', 'png')}"
+                        output_paths.append(render_output_path(out_dir, project_path, led_name, sw_key, hz, ext))
+                    self.render_queue.add_job(
+                        project=project_path, led_wall=led_key, led_wall_name=led_name,
+                        software_targets=sw_keys, output_hz=hz, custom_preset=custom,
+                        output_paths=output_paths, alpha=alpha)
+                    added += 1
+        logger.info(f"Coda render: {added} job aggiunti")
+
+    def _rq_remove_selected(self):
+        for item in self._rq_tree.selection():
+            self.render_queue.remove_job(item)
+
+    def _rq_cancel_selected(self):
+        """Annulla i job selezionati in corso (encoder terminati, nessun nuovo tentativo)"""
+        for item in self._rq_tree.selection():
+            self.render_queue.cancel_job(item)
+
+    def _refresh_render_queue_view(self):
+        """Aggiorna la Treeview della coda (main thread)"""
+        self._rq_refresh_scheduled = False
+        win = self.render_queue_window
+        if win is None or not win.winfo_exists():
+            return
+        try:
+            tree = self._rq_tree
+            jobs = list(self.render_queue.jobs)
+            ids = {j["id"] for j in jobs}
+            for item in tree.get_children():
+                if item not in ids:
+                    tree.delete(item)
+            for job in jobs:
+                progress = job.get("error") if job["status"] == JOB_FAILED else job.get("progress", "")
+                software = ", ".join(sw for sw, _ in render_job_targets(job))
+                values = (Path(job["project"]).stem, job.get("led_wall_name", job["led_wall"]),
+                          software, job["output_hz"],
+                          JOB_STATUS_LABELS.get(job["status"], job["status"]), progress or "")
+                if tree.exists(job["id"]):
+                    tree.item(job["id"], values=values)
+                else:
+                    tree.insert("", tk.END, iid=job["id"], values=values)
+            counts = {s: sum(1 for j in jobs if j["status"] == s) for s in JOB_STATUS_LABELS}
+            state = "attiva" if self.render_queue.active else "sospesa"
+            self._rq_status_label.config(
+                text=f"Coda {state} | {counts[JOB_RUNNING]} in corso, {counts[JOB_PENDING]} in attesa, "
+                     f"{counts[JOB_DONE]} completati, {counts[JOB_FAILED]} falliti | "
+                     f"max {self.render_queue.max_compositors} job")
+        except tk.TclError as e:
+            logger.debug(f"refresh coda render: {e}")
 
     def export_project(self):
-        """Export composito - placeholder, usa export_image per ora"""
+        """Export composito: video se il progetto contiene almeno un video, altrimenti immagine"""
         if not self.layers:
             messagebox.showwarning("Avviso", "Aggiungi almeno un elemento al progetto")
             return
         has_video = any(getattr(l, "is_video", False) for l in self.layers)
         if has_video:
-            video_layers = [l for l in self.layers if getattr(l, "is_video", False)]
             self.export_video()
         else:
             self.export_image()
@@ -2981,6 +5501,7 @@ class RConverter:
         """Rimuove tutti i layer e libera risorse"""
         if self.layers:
             if messagebox.askyesno("Conferma", "Rimuovere tutti gli elementi?"):
+                self.cancel_import()
                 for layer in self.layers:
                     layer.cleanup()
                 self.layers.clear()
@@ -3020,7 +5541,7 @@ class RConverter:
             return
 
         self.progress.start()
-        thread = threading.Thread(target=self._do_export_image, args=(filepath,), daemon=True)
+        thread = threading.Thread(target=self._do_export_image, args=(filepath, list(self.layers)), daemon=True)
         thread.start()
 
     def export_video(self):
@@ -3036,12 +5557,13 @@ class RConverter:
         # Trova video nei layer
         video_layers = [layer for layer in self.layers if hasattr(layer, 'is_video') and layer.is_video]
         if not video_layers:
-            messagebox.showwarning("Avviso", "Nessun video caricato. Per esportare video carica almeno un file video.")
+            messagebox.showwarning("Avviso", "Nessun video caricato. Per esportare video carica almeno un file video\n"
+                                   "(per un video da sole immagini usa \"Video da Statico\").")
             return
 
         profile = get_export_profile(
             self.led_wall_var.get(), self.software_target_var.get(), self.output_hz.get(),
-            custom_presets=self.custom_presets
+            custom_presets=self.custom_presets, alpha=self.alpha_var.get()
         )
         container = profile["video"].get("container", "mp4")
         ext = ".mov" if container == "mov" else ".mp4"
@@ -3066,10 +5588,303 @@ class RConverter:
         thread = threading.Thread(target=self._do_export_video, args=(filepath, layers_snapshot), daemon=True)
         thread.start()
 
+    def export_still_video(self):
+        """Esporta il composito statico come video di N secondi (composito e processing una volta)"""
+        from tkinter import simpledialog
+        if not self.layers:
+            messagebox.showwarning("Avviso", "Aggiungi almeno un elemento al progetto")
+            return
+        if not VIDEO_SUPPORT:
+            messagebox.showerror("Errore", "OpenCV non installato. Installa con: pip install opencv-python")
+            return
+        if any(getattr(l, 'is_video', False) and (l.video_frames or 0) > 1 for l in self.layers):
+            if not messagebox.askyesno("Video da Statico",
+                                       "I layer video verranno congelati al primo frame. Continuare?"):
+                return
+        seconds = simpledialog.askinteger("Video da Statico", "Durata (secondi):", parent=self.root,
+                                          initialvalue=STILL_VIDEO_DEFAULT_SECONDS, minvalue=1, maxvalue=24 * 3600)
+        if not seconds:
+            return
+
+        profile = get_export_profile(
+            self.led_wall_var.get(), self.software_target_var.get(), self.output_hz.get(),
+            custom_presets=self.custom_presets, alpha=self.alpha_var.get()
+        )
+        container = profile["video"].get("container", "mp4")
+        ext = ".mov" if container == "mov" else ".mp4"
+        fmt = "MOV" if container == "mov" else "MP4"
+        filepath = filedialog.asksaveasfilename(
+            title="Salva video",
+            defaultextension=ext,
+            initialfile=f"video_statico{ext}",
+            filetypes=[(fmt, f"*{ext}"), ("Tutti", "*.*")]
+        )
+        if not filepath:
+            return
+        if not Path(filepath).parent.exists():
+            messagebox.showerror("Errore", f"Cartella di destinazione non esiste:\n{Path(filepath).parent}")
+            return
+
+        self.progress.start()
+        thread = threading.Thread(target=self._do_export_video, args=(filepath, list(self.layers), seconds),
+                                  daemon=True)
+        thread.start()
+
+    def export_video_multi(self):
+        """Esporta lo stesso composito per più software target in un solo pass (LED wall e Hz correnti)"""
+        if not VIDEO_SUPPORT:
+            messagebox.showerror("Errore", "OpenCV non installato. Installa con: pip install opencv-python")
+            return
+        if not any(getattr(l, 'is_video', False) for l in self.layers):
+            messagebox.showwarning("Avviso", "Nessun video caricato. Per esportare video carica almeno un file video\n"
+                                   "(per un video da sole immagini usa \"Video da Statico\").")
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Video Multi-Software")
+        dialog.configure(bg=self.bg_color)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        ttk.Label(dialog, text="Software target (composito calcolato una sola volta):",
+                  font=('Segoe UI', 9)).pack(anchor=tk.W, padx=12, pady=(12, 6))
+        current = self.software_target_var.get()
+        sw_vars = []
+        for key, name in zip(SOFTWARE_KEYS, self.software_combo["values"]):
+            var = tk.BooleanVar(value=(key == current))
+            sw_vars.append((key, var))
+            ttk.Checkbutton(dialog, text=name, variable=var,
+                            command=lambda: refresh_plans()).pack(anchor=tk.W, padx=20)
+        plans_label = ttk.Label(dialog, text="", font=('Segoe UI', 8), justify=tk.LEFT)
+        plans_label.pack(anchor=tk.W, padx=12, pady=(6, 0))
+        selected = []
+
+        def refresh_plans():
+            """Piano encoder per target: i core sono divisi tra tutti gli encoder dello stesso pass"""
+            output_w, output_h = self.output_width.get(), self.output_height.get()
+            chosen = [(key, get_export_profile(self.led_wall_var.get(), key, self.output_hz.get(),
+                                               custom_presets=self.custom_presets, alpha=self.alpha_var.get()))
+                      for key, var in sw_vars if var.get()]
+            lines = []
+            for group in group_targets_by_filters(chosen):
+                workers = SEGMENT_MAX_WORKERS if all(is_intra_only(prof) for _, prof in group) else 1
+                for key, prof in group:
+                    plan = plan_encoder_resources(prof, output_w, output_h, RENDER_CPU_COUNT,
+                                                  encoders=workers * len(group), compositors=workers)
+                    lines.append(f"{key}: {describe_encoder_plan(plan)}")
+            plans_label.config(text="\n".join(lines))
+
+        refresh_plans()
+
+        def confirm():
+            selected.extend(key for key, var in sw_vars if var.get())
+            dialog.destroy()
+
+        btns = ttk.Frame(dialog)
+        btns.pack(fill=tk.X, padx=12, pady=12)
+        ttk.Button(btns, text="Esporta", style="Green.TButton", command=confirm).pack(side=tk.RIGHT)
+        ttk.Button(btns, text="Annulla", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        self.root.wait_window(dialog)
+        if not selected:
+            return
+
+        out_dir = filedialog.askdirectory(title="Cartella output video")
+        if not out_dir:
+            return
+        targets = []
+        for sw_key in selected:
+            profile = get_export_profile(self.led_wall_var.get(), sw_key, self.output_hz.get(),
+                                         custom_presets=self.custom_presets, alpha=self.alpha_var.get())
+            ext = ".mov" if profile["video"].get("container", "mp4") == "mov" else ".mp4"
+            targets.append((str(Path(out_dir) / f"video_output_{sw_key}{ext}"), profile))
+        existing = [Path(fp).name for fp, _ in targets if os.path.exists(fp)]
+        if existing and not messagebox.askyesno("Sovrascrivi", "File esistenti:\n" + "\n".join(existing) +
+                                                "\n\nSovrascrivere?"):
+            return
+        if not self.ffmpeg_path:
+            messagebox.showwarning("FFmpeg non trovato",
+                "FFmpeg non è nel PATH. L'export userà OpenCV (più lento).\n"
+                "Per export veloce: installa FFmpeg e aggiungilo al PATH.")
+
+        self.progress.start()
+        thread = threading.Thread(target=self._do_export_video, args=(targets, list(self.layers)), daemon=True)
+        thread.start()
+
+    def estimate_export(self):
+        """Stima dimensione, bitrate e banda del video prima dell'export (frame campione codificati)"""
+        if not self.layers:
+            messagebox.showwarning("Avviso", "Aggiungi almeno un elemento al progetto")
+            return
+        if not VIDEO_SUPPORT:
+            messagebox.showerror("Errore", "OpenCV non installato. Installa con: pip install opencv-python")
+            return
+        out_dir = filedialog.askdirectory(title="Cartella di destinazione (verifica spazio libero)")
+        if not out_dir:
+            return
+        self.progress.start()
+        thread = threading.Thread(target=self._do_estimate_export, args=(out_dir, list(self.layers)), daemon=True)
+        thread.start()
+
+    def _do_estimate_export(self, out_dir, layers):
+        try:
+            ctx = self._snapshot_export_context()
+            est = self._estimate_export(layers, ctx, out_dir, self._report_export_progress)
+            source = (f"{est['samples']} frame campione codificati" if est["measured"]
+                      else "stima nominale (FFmpeg non disponibile)")
+            lines = [f"Codec: {est['codec']} ({source})",
+                     f"Durata: {format_duration(est['total_frames'] / est['fps'])} "
+                     f"({est['total_frames']} frame @ {est['fps']} fps)",
+                     f"Dimensione: ~{format_size(est['size'])}"
+                     + (f" + key ~{format_size(est['key_size'])}" if est["key_size"] else ""),
+                     f"Bitrate: {est['bitrate_mbps']:.0f} Mbit/s",
+                     f"Lettura disco in playback: {est['playback_mbps']:.1f} MB/s"]
+            if "free" in est:
+                lines.append(f"Spazio libero: {format_size(est['free'])}")
+            text = "\n".join(lines + [""] + ["⚠ " + w for w in est["warnings"]])
+            self.root.after(0, lambda: self.progress.stop())
+            self.root.after(0, lambda: self.info_label.config(text=""))
+            if est["warnings"]:
+                self.root.after(0, lambda: messagebox.showwarning("Stima Export", text))
+            else:
+                self.root.after(0, lambda: messagebox.showinfo("Stima Export", text))
+        except Exception as ex:
+            logger.error(f"Errore stima export: {ex}")
+            self.root.after(0, lambda: self.progress.stop())
+            self.root.after(0, lambda: self.info_label.config(text=""))
+            self.root.after(0, lambda err=str(ex): messagebox.showerror("Errore", err))
+
+    def analyze_decode(self):
+        """Analisi decodifica in playback: file già esportato o clip campione del profilo corrente"""
+        if not self.ffmpeg_path:
+            messagebox.showwarning("FFmpeg non trovato", "L'analisi di decodifica richiede FFmpeg nel PATH.")
+            return
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Analisi Decodifica")
+        dialog.configure(bg=self.bg_color)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        ttk.Label(dialog, text=f"Decodifica locale rispetto a {self.output_hz.get()} Hz "
+                               f"({DECODE_BENCH_LAYERS} layer contemporanei):",
+                  font=('Segoe UI', 9)).pack(anchor=tk.W, padx=12, pady=(12, 6))
+        choice = []
+
+        def pick(mode):
+            choice.append(mode)
+            dialog.destroy()
+
+        btns = ttk.Frame(dialog)
+        btns.pack(fill=tk.X, padx=12, pady=12)
+        ttk.Button(btns, text="File esportato...", command=lambda: pick("file")).pack(side=tk.LEFT)
+        ttk.Button(btns, text="Profilo corrente", style="Green.TButton",
+                   command=lambda: pick("profile")).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btns, text="Annulla", command=dialog.destroy).pack(side=tk.RIGHT)
+        self.root.wait_window(dialog)
+        if not choice:
+            return
+        paths = None
+        if choice[0] == "file":
+            selected = filedialog.askopenfilenames(title="Video da analizzare (fill e key insieme)",
+                                                   filetypes=[("Video", "*.mov *.mp4"), ("Tutti", "*.*")])
+            if not selected:
+                return
+            paths = list(selected)
+            # Key/Fill: la key accanto al fill è riprodotta insieme, entra nello stesso layer
+            for path in list(paths):
+                key_path = key_output_path(path)
+                if os.path.isfile(key_path) and key_path not in paths:
+                    paths.append(key_path)
+        else:
+            if not self.layers:
+                messagebox.showwarning("Avviso", "Aggiungi almeno un elemento al progetto")
+                return
+            if not VIDEO_SUPPORT:
+                messagebox.showerror("Errore", "OpenCV non installato. Installa con: pip install opencv-python")
+                return
+        self.progress.start()
+        thread = threading.Thread(target=self._do_analyze_decode,
+                                  args=(paths, list(self.layers), self.output_hz.get()), daemon=True)
+        thread.start()
+
+    def _do_analyze_decode(self, paths, layers, output_hz):
+        import tempfile
+        try:
+            with tempfile.TemporaryDirectory(prefix="rconverter-decode-") as tmp:
+                source = "file esportato"
+                if paths is None:
+                    # Profilo pianificato: clip campione codificata con le impostazioni reali
+                    ctx = self._snapshot_export_context()
+                    est = self._estimate_export(layers, ctx, report=self._report_export_progress, sample_dir=tmp)
+                    paths = est["sample_paths"]
+                    source = f"clip campione {est['codec']} {ctx['output_w']}x{ctx['output_h']}"
+                result = analyze_playback_decode(self.ffmpeg_path, paths, output_hz,
+                                                 report=self._report_export_progress)
+            lines = [f"Sorgente: {source}", f"Target: {output_hz} Hz (margine minimo {DECODE_HEADROOM_MIN:g}x)", ""]
+            for stream in result["streams"]:
+                lines.append(f"{'✔' if stream['ok'] else '✘'} {Path(stream['path']).name}: "
+                             f"{stream['fps']:.0f} fps ({stream['headroom']:.1f}x)")
+            lines.append(f"{result['layers']} layer contemporanei: {result['layer_fps']:.0f} fps per layer "
+                         f"({'tempo reale' if result['layer_fps'] >= output_hz else 'sotto il tempo reale'})")
+            lines.append(f"{'✔' if result['max_layers'] >= 1 else '✘'} Layer sostenibili stimati: "
+                         f"~{result['max_layers']}")
+            lines += ["", "RISULTATO: " + ("OK" if result["ok"] else
+                                           "INSUFFICIENTE - ridurre risoluzione/fps o scegliere un codec più leggero")]
+            text = "\n".join(lines)
+            self.root.after(0, lambda: self.progress.stop())
+            self.root.after(0, lambda: self.info_label.config(text=""))
+            if result["ok"]:
+                self.root.after(0, lambda: messagebox.showinfo("Analisi Decodifica", text))
+            else:
+                self.root.after(0, lambda: messagebox.showwarning("Analisi Decodifica", text))
+        except Exception as ex:
+            logger.error(f"Errore analisi decodifica: {ex}")
+            self.root.after(0, lambda: self.progress.stop())
+            self.root.after(0, lambda: self.info_label.config(text=""))
+            self.root.after(0, lambda err=str(ex): messagebox.showerror("Errore", err))
+
+    def tune_hap(self):
+        """Auto-tuning chunks e formato HAP per la risoluzione corrente (encode di prova + decodifica)"""
+        if not self.layers:
+            messagebox.showwarning("Avviso", "Aggiungi almeno un elemento al progetto")
+            return
+        if not VIDEO_SUPPORT:
+            messagebox.showerror("Errore", "OpenCV non installato. Installa con: pip install opencv-python")
+            return
+        if not self.ffmpeg_path:
+            messagebox.showwarning("FFmpeg non trovato", "Il tuning HAP richiede FFmpeg nel PATH.")
+            return
+        ctx = self._snapshot_export_context()
+        if ctx["profile"]["video"].get("codec") != "hap":
+            messagebox.showinfo("Tuning HAP", "Il software target corrente non usa HAP (Resolume / Millumin).")
+            return
+        self.progress.start()
+        thread = threading.Thread(target=self._do_tune_hap, args=(list(self.layers), ctx), daemon=True)
+        thread.start()
+
+    def _do_tune_hap(self, layers, ctx):
+        try:
+            choice, results = self._tune_hap(layers, ctx, self._report_export_progress)
+            lines = [f"{ctx['output_w']}x{ctx['output_h']} - decodifica locale su frame campione:", ""]
+            for r in results:
+                mark = "▶" if (r["format"], r["chunks"]) == (choice["format"], choice["chunks"]) else "  "
+                lines.append(f"{mark} {r['format']} {r['chunks']:>2} chunks: {r['decode_fps']:.0f} fps, "
+                             f"{format_size(r['frame_bytes'])}/frame")
+            lines += ["", f"Scelto: {choice['format']} {choice['chunks']} chunks (usato negli export HAP "
+                          f"a questa risoluzione)"]
+            text = "\n".join(lines)
+            self.root.after(0, lambda: self.progress.stop())
+            self.root.after(0, lambda: self.info_label.config(text=""))
+            self.root.after(0, self.update_export_summary)
+            self.root.after(0, lambda: messagebox.showinfo("Tuning HAP", text))
+        except Exception as ex:
+            logger.error(f"Errore tuning HAP: {ex}")
+            self.root.after(0, lambda: self.progress.stop())
+            self.root.after(0, lambda: self.info_label.config(text=""))
+            self.root.after(0, lambda err=str(ex): messagebox.showerror("Errore", err))
+
     def _build_ffmpeg_filter_chain(self, filters, intensity=1.0):
         """Costruisce -vf filter chain FFmpeg equivalente alla pipeline Python. OPT-2.
-        Ordine: colorlevels -> noise (deband) -> hqdn3d (denoise) -> bilateral -> unsharp.
+        Ordine: colorlevels -> deband (noise se deband_threshold = 0) -> hqdn3d (denoise) -> bilateral -> unsharp.
         Dither Bayer non disponibile in FFmpeg, resta in Python quando use_ffmpeg_filters=False.
+        Gamma wall / gain di calibrazione: lutrgb (tabella calcolata una volta da FFmpeg).
         """
         if not filters:
             return None
@@ -3077,13 +5892,24 @@ class RConverter:
         chain = []
         bl = filters.get("black_level", 0) * scale
         wl_deficit = (255 - filters.get("white_level", 255)) * scale
-        if bl > 0 or wl_deficit > 0:
+        lut_bl, lut_wl, exponent, gains = color_transform_params(filters, intensity)
+        if exponent != 1.0 or gains != (1.0, 1.0, 1.0):
+            # Stessa curva di build_color_lut: livelli, gamma, gain per canale
+            curve = f"pow(clip((val*255/maxval-{lut_bl})/{lut_wl - lut_bl},0,1),{exponent})"
+            channels = ":".join(f"{c}='clip({curve}*{g},0,1)*maxval'" for c, g in zip("rgb", gains))
+            chain.append(f"lutrgb={channels}")
+        elif bl > 0 or wl_deficit > 0:
             rimin = bl / 255.0
             rimax = max(rimin + 0.01, (255.0 - wl_deficit) / 255.0)
             chain.append(f"colorlevels=rimin={rimin:.4f}:gimin={rimin:.4f}:bimin={rimin:.4f}"
                          f":rimax={rimax:.4f}:gimax={rimax:.4f}:bimax={rimax:.4f}")
         grain = int(filters.get("deband_grain", 2) * scale)
-        if grain > 0:
+        deband_thr = filters.get("deband_threshold", 0) * scale
+        if grain > 0 and deband_thr > 0:
+            # deband FFmpeg: soglia normalizzata (stessa scala di deband_flat_mask), solo zone piatte
+            thr = min(0.5, max(0.00003, deband_thr / DEBAND_THRESHOLD_UNIT / 255.0))
+            chain.append(f"deband=1thr={thr:.5f}:2thr={thr:.5f}:3thr={thr:.5f}:range={4 * DEBAND_MASK_SCALE}:blur=1")
+        elif grain > 0:
             noise_strength = min(grain * 3, 20)
             chain.append(f"noise=alls={noise_strength}:allf=u+t")
         dn = filters.get("denoise_strength", 0) * scale
@@ -3099,17 +5925,24 @@ class RConverter:
             chain.append(f"unsharp=3:3:{amount:.2f}:3:3:0")
         return ",".join(chain) if chain else None
 
-    def _build_ffmpeg_video_command(self, filepath, output_w, output_h, fps, profile, ext, vf_chain=None):
+    def _build_ffmpeg_video_command(self, filepath, output_w, output_h, fps, profile, ext, vf_chain=None,
+                                    resources=None, input_pix_fmt="rgb24"):
         """Costruisce comando FFmpeg per export video broadcast.
         HAP: -an (no audio). ProRes: -vendor apl0 solo per Millumin. DNxHR: profilo, no bitrate.
         vf_chain: se fornita, aggiunge -vf per filtri broadcast (OPT-2).
+        resources: piano da plan_encoder_resources (-threads, pools x265, formato e chunks HAP).
+        input_pix_fmt: pix_fmt della pipe (rawvideo_pix_fmt): rgb24 default, rgb48le per il processing
+        a 16 bit, rgba/rgba64le per frame con alpha già intercalato (video da statico).
         """
         if not self.ffmpeg_path:
             return None
         v = profile["video"]
         software = profile.get("software_target", "resolume")
-        cmd = [self.ffmpeg_path, "-y", "-f", "rawvideo", "-pix_fmt", "rgb24",
-               "-s", f"{output_w}x{output_h}", "-r", str(fps), "-i", "pipe:0"]
+        cmd = [self.ffmpeg_path, "-y"]
+        if resources and vf_chain:
+            cmd.extend(["-filter_threads", str(resources["threads"])])
+        cmd.extend(["-f", "rawvideo", "-pix_fmt", input_pix_fmt,
+                    "-s", f"{output_w}x{output_h}", "-r", str(fps), "-i", "pipe:0"])
         codec = v.get("codec", "libx264")
         # vMix DNxHR: input pipe ha solo video, serve anullsrc per traccia audio silenziosa
         if software == "vmix" and codec == "dnxhd":
@@ -3118,12 +5951,11 @@ class RConverter:
             cmd.extend(["-vf", vf_chain])
         pf = v.get("pixel_format", "yuv420p")
         container = v.get("container", "mp4")
-        if codec == "hap" or v.get("format_name") in ("hap", "hap_q"):
-            fmt_hap = v.get("format_name", "hap")
-            base_chunks = v.get("hap_chunks", 8)
+        if codec == "hap" or v.get("format_name") in ("hap", "hap_q", "hap_alpha"):
+            fmt_hap = (resources or {}).get("hap_format") or v.get("format_name", "hap")
             # Chunks dinamici: 4 per < 4K (riduce overhead, file più piccoli), 8 per 4K+
-            pixels = output_w * output_h
-            chunks = 4 if pixels < 3840 * 2160 else min(base_chunks, 8)
+            chunks = resources.get("hap_chunks") if resources else None
+            chunks = chunks or hap_chunks_for(output_w, output_h, v)
             # -compressor snappy rimosso: FFmpeg usa snappy di default se disponibile;
             # il flag può far fallire build Essentials (libsnappy mancante) -> nero in Resolume
             cmd.extend(["-c:v", "hap", "-format", fmt_hap, "-chunks", str(chunks), "-an"])
@@ -3136,7 +5968,7 @@ class RConverter:
                 cmd.extend(["-c:a", "pcm_s16le", "-ar", "48000", "-ac", "2"])
         elif "prores" in codec:
             cmd.extend(["-c:v", "prores_ks", "-profile:v", v.get("profile", "2"),
-                        "-pix_fmt", "yuv422p10le"])
+                        "-pix_fmt", v.get("pixel_format", "yuv422p10le")])
             if software == "millumin":
                 cmd.extend(["-vendor", "apl0"])
             cmd.extend(["-c:a", "pcm_s24le", "-ar", "48000", "-ac", "2"])
@@ -3147,7 +5979,8 @@ class RConverter:
             cmd.extend(["-c:v", "libx265", "-preset", v.get("preset", "medium"),
                         "-b:v", f"{br_kbps}k", "-maxrate", f"{br_kbps}k",
                         "-bufsize", f"{br_kbps * 2}k",
-                        "-x265-params", f"vbv-maxrate={br_kbps}:vbv-bufsize={br_kbps * 2}:strict-cbr=1"])
+                        "-x265-params", f"vbv-maxrate={br_kbps}:vbv-bufsize={br_kbps * 2}:strict-cbr=1"
+                        + (f":pools={resources['x265_pools']}" if resources and resources.get("x265_pools") else "")])
             cmd.extend(["-c:a", "aac", "-b:a", "320k", "-ar", "48000"])
         else:
             denom = max(1920 * 1080, 1)
@@ -3157,8 +5990,10 @@ class RConverter:
                         "-profile:v", "high", "-b:v", f"{br_kbps}k",
                         "-maxrate", f"{br_kbps}k", "-bufsize", f"{br_kbps * 2}k"])
             cmd.extend(["-c:a", "aac", "-b:a", "320k", "-ar", "48000"])
+        if resources:
+            cmd.extend(["-threads", str(resources["threads"])])
         # Color metadata bt709 (broadcast LED wall - Resolume/vMix/NovaStar)
-        if codec == "hap" or v.get("format_name") in ("hap", "hap_q"):
+        if codec == "hap" or v.get("format_name") in ("hap", "hap_q", "hap_alpha"):
             cmd.extend(["-color_primaries", "bt709", "-color_trc", "iec61966-2-1", "-colorspace", "rgb"])
         else:
             cmd.extend(["-color_primaries", "bt709", "-color_trc", "bt709",
@@ -3171,56 +6006,33 @@ class RConverter:
         cmd.append(filepath)
         return cmd
 
-    def _do_export_image(self, filepath):
-        try:
-            # Snapshot completo contesto (thread-safety, lettura una sola volta)
-            output_w = self.output_width.get()
-            output_h = self.output_height.get()
-            proc_int = self.proc_intensity.get() / 100.0
-            led_key = self.led_wall_var.get()
-            sw_key = self.software_target_var.get()
-            hz_val = self.output_hz.get()
-            custom = self.custom_presets
-
-            profile = get_export_profile(led_key, sw_key, hz_val, custom_presets=custom)
-            quality = profile.get("image_quality_pct", 95)
-            bit_depth = profile.get("image_bit_depth", 16)
-            dpi = profile.get("image_dpi", 150)
-            compress = profile.get("image_compression", 3)
-            filters = profile.get("filters", {})
-
-            if not (64 <= output_w <= 8192 and 64 <= output_h <= 8192):
-                raise ValueError(f"Risoluzione non valida: {output_w}x{output_h}")
-
-            logger.info(f"Export immagine: {output_w}x{output_h} -> {filepath} (profilo: {quality}%, {bit_depth}bit)")
-
-            # Composito + processing broadcast (filtri dal preset LED wall)
-            img = self.create_composite_image(output_w, output_h, for_export=True)
-            img = self._apply_image_processing(img, filters, intensity=proc_int)
-            ext = Path(filepath).suffix.lower()
+    def _snapshot_export_context(self):
+        """Snapshot contesto export dalle variabili Tk (thread-safety, lettura una sola volta).
+        Il contesto è un dict puro: lo stesso motore di rendering serve export GUI e coda render.
+        """
+        profile = get_export_profile(self.led_wall_var.get(), self.software_target_var.get(),
+                                     self.output_hz.get(), custom_presets=self.custom_presets,
+                                     alpha=self.alpha_var.get())
+        return {
+            "output_w": self.output_width.get(),
+            "output_h": self.output_height.get(),
+            "fps": max(1, self.fps_var.get()),
+            "proc_int": self.proc_intensity.get() / 100.0,
+            "bg_color": self.bg_color_var.get(),
+            "profile": profile,
+            "core_budget": RENDER_CPU_COUNT,
+            "key_fill": self.key_fill_var.get(),
+        }
 
-            if ext in ['.jpg', '.jpeg']:
-                img.convert('RGB').save(filepath, 'JPEG', quality=quality, optimize=True,
-                                        dpi=(dpi, dpi))
-            elif ext == '.png':
-                if bit_depth >= 16:
-                    if img.mode == 'RGB':
-                        img = img.convert('RGBA')
-                    elif img.mode not in ('RGBA', 'LA'):
-                        img = img.convert('RGBA')
-                img.info['dpi'] = (dpi, dpi)
-                img.save(filepath, 'PNG', optimize=True, compress_level=min(9, max(0, compress)))
-            elif ext == '.webp':
-                img.save(filepath, 'WEBP', quality=quality)
-            else:
-                img.save(filepath)
+    def _report_export_progress(self, text):
+        """Callback progresso export GUI (thread-safe via root.after)"""
+        self.root.after(0, lambda: self.info_label.config(text=text))
 
-            file_size = Path(filepath).stat().st_size
-            size_str = f"{file_size / 1024:.1f} KB" if file_size < 1048576 else f"{file_size / 1048576:.2f} MB"
-            logger.info(f"Export completato: {size_str} | {output_w}x{output_h} | {bit_depth}bit | {dpi}dpi | {ext}")
-            del img
+    def _do_export_image(self, filepath, layers=None):
+        try:
+            ctx = self._snapshot_export_context()
+            self._render_image(filepath, layers if layers is not None else list(self.layers), ctx)
             gc.collect()
-
             self.root.after(0, lambda: self.progress.stop())
             self.root.after(0, lambda: messagebox.showinfo("Successo", f"Collage salvato:\n{filepath}"))
         except Exception as ex:
@@ -3228,22 +6040,520 @@ class RConverter:
             self.root.after(0, lambda: self.progress.stop())
             self.root.after(0, lambda err=str(ex): messagebox.showerror("Errore", err))
 
-    def _do_export_video(self, filepath, all_layers):
-        """Esporta video composito di TUTTI i layer (immagini + video)"""
+    def _render_image(self, filepath, layers, ctx):
+        """Motore export immagine (nessun accesso Tk). Solleva eccezione in caso di errore."""
+        output_w = ctx["output_w"]
+        output_h = ctx["output_h"]
+        proc_int = ctx["proc_int"]
+        profile = ctx["profile"]
+        quality = profile.get("image_quality_pct", 95)
+        bit_depth = profile.get("image_bit_depth", 16)
+        dpi = profile.get("image_dpi", 150)
+        compress = profile.get("image_compression", 3)
+        filters = profile.get("filters", {})
+
+        if not (64 <= output_w <= 8192 and 64 <= output_h <= 8192):
+            raise ValueError(f"Risoluzione non valida: {output_w}x{output_h}")
+
+        logger.info(f"Export immagine: {output_w}x{output_h} -> {filepath} (profilo: {quality}%, {bit_depth}bit)")
+
+        # Composito + processing broadcast (filtri dal preset LED wall)
+        img = self.create_composite_image(output_w, output_h, for_export=True, layers=layers,
+                                          bg_color=ctx["bg_color"])
+        img = self._apply_image_processing(img, filters, intensity=proc_int)
+        ext = Path(filepath).suffix.lower()
+
+        if ext in ['.jpg', '.jpeg']:
+            img.convert('RGB').save(filepath, 'JPEG', quality=quality, optimize=True,
+                                    dpi=(dpi, dpi))
+        elif ext == '.png':
+            if bit_depth >= 16:
+                if img.mode == 'RGB':
+                    img = img.convert('RGBA')
+                elif img.mode not in ('RGBA', 'LA'):
+                    img = img.convert('RGBA')
+            img.info['dpi'] = (dpi, dpi)
+            img.save(filepath, 'PNG', optimize=True, compress_level=min(9, max(0, compress)))
+        elif ext == '.webp':
+            img.save(filepath, 'WEBP', quality=quality)
+        else:
+            img.save(filepath)
+
+        file_size = Path(filepath).stat().st_size
+        size_str = f"{file_size / 1024:.1f} KB" if file_size < 1048576 else f"{file_size / 1048576:.2f} MB"
+        logger.info(f"Export completato: {size_str} | {output_w}x{output_h} | {bit_depth}bit | {dpi}dpi | {ext}")
+        del img
+        return file_size
+
+    def _do_export_video(self, targets, all_layers, still_seconds=None):
+        """Esporta video composito di TUTTI i layer (immagini + video).
+        targets: percorso singolo (profilo corrente) o lista [(filepath, profile)] multi-software.
+        still_seconds: se indicato, video da composito statico di questa durata.
+        """
+        controller = ExportController()
+        self._export_controller = controller
+        self.root.after(0, lambda: self._set_export_controls_enabled(True))
+        try:
+            ctx = self._snapshot_export_context()
+            ctx["controller"] = controller
+            if still_seconds is not None:
+                ctx["still_seconds"] = still_seconds
+            frame_count = self._render_video(targets, all_layers, ctx, self._report_export_progress)
+            gc.collect()
+            paths = [targets] if isinstance(targets, str) else [fp for fp, _ in targets]
+            kind = "GIF" if Path(paths[0]).suffix.lower() == '.gif' else "Video"
+            saved = "\n".join(paths)
+            # Avvisi del motore (es. GIF accorciata dalla RAM): l'export riuscito non li deve nascondere
+            notices = "".join(f"\n\n⚠ {n}" for n in ctx.get("notices", []))
+            self.root.after(0, lambda: self.progress.stop())
+            self.root.after(0, lambda: self.info_label.config(text=""))
+            if notices:
+                self.root.after(0, lambda: messagebox.showwarning(
+                    "Completato con avvisi", f"{kind} salvato:\n{saved}\n{frame_count} frames{notices}"))
+            else:
+                self.root.after(0, lambda: messagebox.showinfo("Successo", f"{kind} salvato:\n{saved}\n{frame_count} frames"))
+        except ExportCancelled:
+            logger.info("Export video annullato")
+            self.root.after(0, lambda: self.progress.stop())
+            self.root.after(0, lambda: self.info_label.config(text="Export annullato"))
+        except Exception as ex:
+            logger.error(f"Errore export video: {ex}")
+            self.root.after(0, lambda: self.progress.stop())
+            self.root.after(0, lambda: self.info_label.config(text=""))
+            self.root.after(0, lambda err=str(ex): messagebox.showerror("Errore", err))
+        finally:
+            if self._export_controller is controller:
+                self._export_controller = None
+                self.root.after(0, lambda: self._set_export_controls_enabled(False))
+
+    def cancel_export(self):
+        """Annulla l'export video in corso: FFmpeg terminato, video sorgente rilasciati"""
+        controller = self._export_controller
+        if controller is None:
+            return False
+        controller.cancel()
+        self.info_label.config(text="Annullamento export...")
+        return True
+
+    def toggle_export_pause(self):
+        """Pausa / riprendi l'export video in corso (FFmpeg resta in attesa di frame)"""
+        controller = self._export_controller
+        if controller is None:
+            return
+        if controller.paused:
+            controller.resume()
+            self.progress.start()
+        else:
+            controller.pause()
+            self.progress.stop()
+        self.pause_export_btn.config(text="▶ Riprendi" if controller.paused else "⏸ Pausa")
+
+    def _set_export_controls_enabled(self, enabled):
+        """Abilita/disabilita Pausa e Annulla Export"""
+        try:
+            self.pause_export_btn.config(state='normal' if enabled else 'disabled', text="⏸ Pausa")
+            self.cancel_export_btn.config(state='normal' if enabled else 'disabled')
+        except (AttributeError, tk.TclError):
+            pass
+
+    def _render_video(self, targets, all_layers, ctx, report=None):
+        """Motore export video composito (nessun accesso Tk). Restituisce il numero di frame scritti.
+        targets: percorso singolo (profilo da ctx["profile"]) oppure lista [(filepath, profile)].
+        Target con la stessa catena filtri condividono un pass: ogni frame è composto e processato
+        una volta e lo stesso buffer rawvideo va a tutti gli encoder FFmpeg del gruppo.
+        report: callback(testo) per l'avanzamento, chiamata dal thread di export.
+        ctx["notices"]: avvisi per l'utente di un export comunque riuscito (es. GIF accorciata).
+        """
+        if isinstance(targets, (str, os.PathLike)):
+            targets = [(str(targets), ctx["profile"])]
+        # Solo layer statici (o video congelati a 1 frame): composito unico in loop
+        video_layers = [l for l in all_layers if getattr(l, 'is_video', False)]
+        still = ctx.get("still_seconds") is not None or (
+            video_layers and all(0 < (l.video_frames or 0) <= 1 for l in video_layers))
+        groups = group_targets_by_filters(targets)
+        frame_count = 0
+        for index, group in enumerate(groups):
+            if len(groups) > 1:
+                logger.info(f"Pass composito {index + 1}/{len(groups)}: {len(group)} target")
+            if still:
+                frame_count = self._render_still_video(group, all_layers, ctx, report)
+            else:
+                frame_count = self._render_video_pass(group, all_layers, ctx, report)
+        return frame_count
+
+    def _render_still_video(self, targets, all_layers, ctx, report=None):
+        """Video da composito statico: composito + processing calcolati una volta sola.
+        Codec intra-only: encode di un blocco di 1 secondo, poi concat -c copy del blocco ripetuto
+        (10 minuti = 1 blocco codificato + remux). Altri codec/OpenCV: stesso buffer ripetuto.
+        """
+        report = report or (lambda text: None)
+        controller = ctx.get("controller") or ExportController()
+        output_w = ctx["output_w"]
+        output_h = ctx["output_h"]
+        fps = max(1, ctx["fps"])
+        seconds = ctx.get("still_seconds") or STILL_VIDEO_DEFAULT_SECONDS
+        total_frames = max(1, int(round(seconds * fps)))
+        filters = targets[0][1].get("filters", {})
+
+        logger.info(f"Export statico: {output_w}x{output_h} @ {fps}fps, {seconds}s ({total_frames} frame)")
+        if ctx.get("key_fill"):
+            logger.warning("Key/Fill non disponibile per il video da statico: esportato solo il fill")
+        alpha = any(has_alpha(prof) for _, prof in targets)
+        composite = self.create_composite_image(output_w, output_h, for_export=True, layers=all_layers,
+                                                bg_color=ctx["bg_color"], with_alpha=alpha)
+        if alpha:
+            composite, key = composite
+        proc_bits = processing_bit_depth(targets[0][1])
+        if proc_bits > 8:
+            # Codec 10-bit: frame processato a 16 bit (pipe rgb48le); PIL 8 bit per GIF/OpenCV
+            frame = self._apply_image_processing(composite, filters, intensity=ctx["proc_int"], as_array=True,
+                                                 bit_depth=proc_bits,
+                                                 dither_bits=targets[0][1]["video"].get("bit_depth", 8))
+            composite = Image.fromarray((frame >> 8).astype(np.uint8))
+            data = bytes(frame_buffer(frame))
+        else:
+            composite = self._apply_image_processing(composite, filters, intensity=ctx["proc_int"]).convert('RGB')
+            frame = None
+            data = composite.tobytes()
+        if alpha:
+            # Frame unico: alpha intercalato una volta sola, pipe rgba / rgba64le
+            if frame is not None:
+                rgba_data = bytes(frame_buffer(np.dstack([frame, np.asarray(key, dtype=np.uint16) * 257])))
+            else:
+                rgba = composite.copy()
+                rgba.putalpha(key)
+                rgba_data = rgba.tobytes()
+
+        # Coda render: i target sono codificati uno alla volta, basta uno slot encoder
+        encoder_slot = ctx.get("encoder_slot")
+        slots_held = encoder_slot.acquire(1, controller) if encoder_slot is not None and self.ffmpeg_path else 0
+        try:
+            self._encode_still_targets(targets, ctx, composite, data, rgba_data if alpha else None,
+                                       proc_bits, total_frames, controller, report)
+        finally:
+            if slots_held:
+                encoder_slot.release(slots_held)
+        return total_frames
+
+    def _encode_still_targets(self, targets, ctx, composite, data, rgba_data, proc_bits, total_frames,
+                              controller, report):
+        """Encode del composito statico già processato per ogni target (FFmpeg, fallback OpenCV)"""
+        output_w = ctx["output_w"]
+        output_h = ctx["output_h"]
+        fps = max(1, ctx["fps"])
+        for filepath, profile in targets:
+            ext = Path(filepath).suffix.lower()
+            report(f"Video statico: {Path(filepath).name}")
+            if ext == '.gif':
+                composite.save(filepath)
+                continue
+            resources = plan_encoder_resources(profile, output_w, output_h,
+                                               ctx.get("core_budget", RENDER_CPU_COUNT), compositors=0)
+            cmd = self._build_ffmpeg_video_command(filepath, output_w, output_h, fps, profile, ext,
+                                                   resources=resources,
+                                                   input_pix_fmt=rawvideo_pix_fmt(proc_bits, has_alpha(profile)))
+            if cmd:
+                try:
+                    self._encode_still(cmd, filepath, rgba_data if has_alpha(profile) else data,
+                                       total_frames, fps, is_intra_only(profile), controller)
+                    continue
+                except ExportCancelled:
+                    raise
+                except Exception as ff_ex:
+                    logger.warning(f"FFmpeg fallback a OpenCV: {ff_ex}")
+            fourcc = cv2.VideoWriter_fourcc(*'XVID') if ext == '.avi' else \
+                     cv2.VideoWriter_fourcc(*'VP80') if ext == '.webm' else \
+                     cv2.VideoWriter_fourcc(*'mp4v')
+            out = cv2.VideoWriter(filepath, fourcc, fps, (output_w, output_h))
+            try:
+                if not out.isOpened():
+                    raise Exception(f"Impossibile creare il file video di output: {filepath}")
+                output_frame = cv2.cvtColor(np.array(composite), cv2.COLOR_RGB2BGR)
+                for _ in range(total_frames):
+                    controller.checkpoint()
+                    out.write(output_frame)
+            finally:
+                out.release()
+
+    def _encode_still(self, cmd, filepath, data, total_frames, fps, intra_only, controller=None):
+        """Encode FFmpeg di un frame ripetuto; intra-only: blocco da 1s + resto, uniti con concat"""
+        controller = controller or ExportController()
+        if not intra_only or total_frames <= fps:
+            encoder = EncoderPipe(cmd, label=Path(filepath).name)
+            try:
+                for _ in range(total_frames):
+                    controller.checkpoint()
+                    encoder.write(data)
+                encoder.finish(timeout=120)
+            except Exception:
+                encoder.abort()
+                raise
+            return
+        seg_dir = segment_dir_for(filepath)
+        seg_dir.mkdir(parents=True, exist_ok=True)
+        ext = Path(filepath).suffix.lower() or ".mov"
+        blocks = []
+        repeats, rest = divmod(total_frames, fps)
+        for name, count in (("still_block", fps), ("still_rest", rest)):
+            if count == 0:
+                continue
+            block_path = seg_dir / f"{name}{ext}"
+            encoder = EncoderPipe(cmd[:-1] + [str(block_path)], label=Path(filepath).name)
+            try:
+                for _ in range(count):
+                    controller.checkpoint()
+                    encoder.write(data)
+                encoder.finish(timeout=120)
+            except Exception:
+                encoder.abort()
+                raise
+            blocks.append(block_path)
+        try:
+            concat_segments(self.ffmpeg_path, [blocks[0]] * repeats + blocks[1:], filepath)
+        finally:
+            for block_path in blocks:
+                try:
+                    block_path.unlink()
+                except OSError as e:
+                    logger.debug(f"Rimozione blocco statico: {e}")
+
+    def _open_sample_caps(self, all_layers, ctx):
+        """Video sorgente per i frame campione (stima export, tuning HAP) -> (caps, frame totali, indici).
+        Stessa durata del pass video (limite 3000 frame); senza video multi-frame o con still_seconds
+        il composito è statico e basta un campione. Frame per layer (ffprobe) in ctx["frame_counts"].
+        """
+        caps = {}
+        if ctx.get("still_seconds") is None:
+            for layer in all_layers:
+                vpath = getattr(layer, 'video_path', None)
+                if not getattr(layer, 'is_video', False) or (layer.video_frames or 0) <= 1 or not vpath:
+                    continue
+                cap = cv2.VideoCapture(vpath)
+                if cap.isOpened():
+                    caps[layer] = cap
+                else:
+                    cap.release()
+        if caps:
+            ctx["frame_counts"] = video_frame_counts(caps, self.ffmpeg_path)
+            total_frames = min(max(1, max(ctx["frame_counts"].values())), 3000)
+            return caps, total_frames, sample_frame_indices(total_frames)
+        seconds = ctx.get("still_seconds") or STILL_VIDEO_DEFAULT_SECONDS
+        return caps, max(1, int(round(seconds * max(1, ctx["fps"])))), [0]
+
+    def _compose_sample_frame(self, all_layers, ctx, caps, index, with_key=False):
+        """Frame campione index: composito + processing del profilo (ndarray per la pipe rawvideo).
+        with_key: restituisce anche la key (L) per key/fill e codec alpha, altrimenti None.
+        """
+        profile = ctx["profile"]
+        overrides = {}
+        for layer, cap in caps.items():
+            # Video più corti: ultimo frame, come nel pass video
+            count = ctx.get("frame_counts", {}).get(layer) or int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            last = max(0, count - 1)
+            cap.set(cv2.CAP_PROP_POS_FRAMES, min(index, last))
+            ret, frame = cap.read()
+            if ret:
+                overrides[layer] = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        composite = self.create_composite_image(ctx["output_w"], ctx["output_h"], for_export=True,
+                                                video_frame_overrides=overrides, layers=all_layers,
+                                                bg_color=ctx["bg_color"], with_alpha=with_key)
+        key = None
+        if with_key:
+            composite, key = composite
+        frame = self._apply_image_processing(composite.convert('RGB'), profile.get("filters", {}),
+                                             intensity=ctx["proc_int"], skip_bilateral=True, as_array=True,
+                                             bit_depth=processing_bit_depth(profile),
+                                             dither_bits=profile["video"].get("bit_depth", 8))
+        return frame, key
+
+    def _tune_hap(self, all_layers, ctx, report=None):
+        """Auto-tuning HAP per la risoluzione di ctx (nessun accesso Tk): i frame campione (composito e
+        processing reali) sono codificati con ogni formato ammesso dal tier (hap_tuning_formats) e ogni
+        HAP_TUNING_CHUNKS, poi decodificati in locale (measure_decode_fps). La scelta (choose_hap_config)
+        è salvata in HAP_TUNING e usata da plan_encoder_resources. Restituisce (scelta, risultati).
+        """
+        report = report or (lambda text: None)
+        profile = ctx["profile"]
+        if profile["video"].get("codec") != "hap":
+            raise ValueError("Auto-tuning disponibile solo per i profili HAP (Resolume / Millumin)")
+        if not self.ffmpeg_path:
+            raise Exception("Auto-tuning HAP: FFmpeg non disponibile")
+        output_w = ctx["output_w"]
+        output_h = ctx["output_h"]
+        fps = max(1, ctx["fps"])
+        alpha = has_alpha(profile)
+        caps, _, indices = self._open_sample_caps(all_layers, ctx)
+        samples = []
+        try:
+            for n, index in enumerate(indices):
+                report(f"Tuning HAP: frame campione {n + 1}/{len(indices)}")
+                frame, key = self._compose_sample_frame(all_layers, ctx, caps, index, with_key=alpha)
+                samples.append((bytes(frame_buffer(frame)), key.tobytes() if key is not None else None))
+        finally:
+            for cap in caps.values():
+                cap.release()
+
+        import tempfile
+        results = []
+        core_budget = ctx.get("core_budget", RENDER_CPU_COUNT)
+        with tempfile.TemporaryDirectory(prefix="rconverter-hap-") as tmp:
+            for fmt in hap_tuning_formats(profile):
+                for chunks in HAP_TUNING_CHUNKS:
+                    report(f"Tuning HAP: {fmt}, {chunks} chunks")
+                    path = os.path.join(tmp, f"{fmt}_{chunks}.mov")
+                    resources = {"core_budget": core_budget, "encoders": 1, "threads": min(core_budget, chunks),
+                                 "hap_format": fmt, "hap_chunks": chunks}
+                    cmd = self._build_ffmpeg_video_command(path, output_w, output_h, fps, profile, ".mov",
+                                                           resources=resources)
+                    side = None
+                    if alpha:
+                        side = FfmpegInputPipe(label="tuning alpha")
+                        cmd = alpha_merge_command(cmd, side.path, output_w, output_h, fps)
+                    encoder = EncoderPipe(cmd, label=f"tuning {fmt} {chunks}", extra_inputs=[side] if side else ())
+                    try:
+                        for data, key in samples:
+                            encoder.write(data)
+                            if key is not None:
+                                encoder.write(key, stream=1)
+                        encoder.finish(timeout=120)
+                    except Exception:
+                        encoder.abort()
+                        raise
+                    results.append({"format": fmt, "chunks": chunks,
+                                    "frame_bytes": os.path.getsize(path) / len(samples),
+                                    "decode_fps": measure_decode_fps(self.ffmpeg_path, path)})
+        choice = dict(choose_hap_config(results), measured=time.strftime("%Y-%m-%d %H:%M"))
+        HAP_TUNING.store(profile, output_w, output_h, choice)
+        logger.info(f"Tuning HAP {output_w}x{output_h}: {choice['format']} {choice['chunks']} chunks "
+                    f"({choice['decode_fps']:.0f} fps decodifica, {format_size(choice['frame_bytes'])}/frame) su "
+                    f"{len(results)} configurazioni")
+        return choice, results
+
+    def _estimate_export(self, all_layers, ctx, output_dir=None, report=None, sample_dir=None):
+        """Stima dimensione e banda dell'export video prima di lanciarlo (nessun accesso Tk).
+        EXPORT_ESTIMATE_SAMPLES frame distribuiti sulla timeline passano per composito, processing e
+        il comando FFmpeg reale del profilo (key/alpha compresi): i codec sono intra-only, quindi il
+        peso medio del frame estrapolato alla durata stima anche i VBR (HAP, ProRes).
+        Senza FFmpeg: stima nominale da bitrate_1080p_mbps. Restituisce un dict con dimensione, bitrate,
+        throughput disco in playback e avvisi (spazio in output_dir, banda del media server).
+        sample_dir: cartella in cui lasciare la clip campione (estimate["sample_paths"], fill ed
+        eventuale key) per l'analisi di decodifica; default cartella temporanea rimossa a fine stima.
+        """
+        report = report or (lambda text: None)
+        output_w = ctx["output_w"]
+        output_h = ctx["output_h"]
+        fps = max(1, ctx["fps"])
+        profile = ctx["profile"]
+        alpha = has_alpha(profile)
+        caps, total_frames, indices = self._open_sample_caps(all_layers, ctx)
+        try:
+            # Key separata solo nel pass video (il video da statico esporta solo il fill)
+            key_fill = bool(ctx.get("key_fill")) and not alpha and bool(caps)
+            v = profile["video"]
+            estimate = {"total_frames": total_frames, "fps": fps, "samples": len(indices), "key_size": 0,
+                        "measured": False, "segments": bool(caps),
+                        "codec": v.get("format_name") or (v.get("profile") if v.get("codec") == "dnxhd"
+                                                          else v.get("codec", ""))}
+            ext = ".mov" if profile["video"].get("container", "mp4") == "mov" else ".mp4"
+            proc_bits = processing_bit_depth(profile)
+            cmd = self._build_ffmpeg_video_command(
+                "stima" + ext, output_w, output_h, fps, profile, ext,
+                resources=plan_encoder_resources(profile, output_w, output_h,
+                                                 ctx.get("core_budget", RENDER_CPU_COUNT), compositors=0),
+                input_pix_fmt=rawvideo_pix_fmt(proc_bits))
+            if cmd:
+                import tempfile
+                from contextlib import nullcontext
+                with (nullcontext(sample_dir) if sample_dir else
+                      tempfile.TemporaryDirectory(prefix="rconverter-stima-")) as tmp:
+                    fill_path = os.path.join(tmp, "fill" + ext)
+                    key_path = os.path.join(tmp, "key" + ext)
+                    side = None
+                    if alpha:
+                        side = FfmpegInputPipe(label="stima alpha")
+                        cmd = alpha_merge_command(cmd[:-1] + [fill_path], side.path, output_w, output_h, fps)
+                    elif key_fill:
+                        side = FfmpegInputPipe(label="stima key")
+                        cmd = key_fill_command(cmd, fill_path, key_path, side.path, output_w, output_h, fps)
+                    else:
+                        cmd = cmd[:-1] + [fill_path]
+                    encoder = EncoderPipe(cmd, label="stima export", extra_inputs=[side] if side else ())
+                    try:
+                        for n, index in enumerate(indices):
+                            report(f"Stima export: frame campione {n + 1}/{len(indices)}")
+                            frame, key = self._compose_sample_frame(all_layers, ctx, caps, index,
+                                                                    with_key=side is not None)
+                            encoder.write(frame_buffer(frame))
+                            if key is not None:
+                                encoder.write(key.tobytes(), stream=1)
+                        encoder.finish(timeout=120)
+                    except Exception:
+                        encoder.abort()
+                        raise
+                    estimate["measured"] = True
+                    bytes_per_frame = os.path.getsize(fill_path) / len(indices)
+                    if key_fill:
+                        estimate["key_size"] = os.path.getsize(key_path) / len(indices) * total_frames
+                    if sample_dir:
+                        estimate["sample_paths"] = [fill_path] + ([key_path] if key_fill else [])
+            else:
+                # Nominale: bitrate del profilo scalato sui pixel (stesso calcolo del comando FFmpeg)
+                mbps = profile["video"].get("bitrate_1080p_mbps", 200) * output_w * output_h / (1920 * 1080)
+                bytes_per_frame = mbps * 1e6 / 8 / fps
+        finally:
+            for cap in caps.values():
+                cap.release()
+
+        estimate["size"] = bytes_per_frame * total_frames
+        estimate["bitrate_mbps"] = bytes_per_frame * 8 * fps / 1e6
+        estimate["playback_mbps"] = bytes_per_frame * fps / 1024 ** 2
+        warnings = []
+        budget = MEDIA_SERVER_PLAYBACK_MBPS.get(profile.get("software_target"))
+        if budget and estimate["playback_mbps"] > budget:
+            warnings.append(f"Playback {estimate['playback_mbps']:.0f} MB/s oltre la banda del media server "
+                            f"({budget:g} MB/s per file): ridurre risoluzione o fps, o scegliere un codec "
+                            f"più leggero")
+        if output_dir:
+            import shutil
+            # Export FFmpeg: i segmenti restano accanto all'output (riuso), quindi su disco servono file + segmenti
+            total = estimate["size"] + estimate["key_size"]
+            segmented = estimate["measured"] and estimate["segments"]
+            needed = total * (2 if segmented else 1) * EXPORT_ESTIMATE_MARGIN
+            try:
+                estimate["free"] = shutil.disk_usage(output_dir).free
+                if estimate["free"] < needed:
+                    warnings.append(f"Spazio libero insufficiente in {output_dir}: {format_size(estimate['free'])}"
+                                    f" disponibili, servono ~{format_size(needed)}"
+                                    + (" (file + segmenti)" if segmented else ""))
+            except OSError as e:
+                logger.debug(f"Spazio libero {output_dir}: {e}")
+        estimate["warnings"] = warnings
+        logger.info(f"Stima export ({'campioni codificati' if estimate['measured'] else 'nominale'}): "
+                    f"{format_size(estimate['size'])}, {estimate['bitrate_mbps']:.0f} Mbit/s, "
+                    f"{estimate['playback_mbps']:.1f} MB/s in playback" +
+                    "".join(f" | {w}" for w in warnings))
+        return estimate
+
+    def _render_video_pass(self, targets, all_layers, ctx, report=None):
+        """Un pass di composito per target [(filepath, profile)] con filtri identici"""
+        report = report or (lambda text: None)
+        controller = ctx.get("controller") or ExportController()
         caps = {}
-        out = None
+        outs = []
+        encoder_slot = ctx.get("encoder_slot")
+        slots_held = 0
         try:
-            # Snapshot contesto (thread-safety, lettura una sola volta)
-            output_w = self.output_width.get()
-            output_h = self.output_height.get()
-            fps = max(1, self.fps_var.get())
+            output_w = ctx["output_w"]
+            output_h = ctx["output_h"]
+            fps = max(1, ctx["fps"])
+            filepath, profile = targets[0]
             ext = Path(filepath).suffix.lower()
-            led_key = self.led_wall_var.get()
-            sw_key = self.software_target_var.get()
-            hz_val = self.output_hz.get()
-            proc_int = self.proc_intensity.get() / 100.0
-            profile = get_export_profile(led_key, sw_key, hz_val, custom_presets=self.custom_presets)
+            if ext == '.gif' and len(targets) > 1:
+                raise ValueError("Export GIF non supportato in multi-target")
+            proc_int = ctx["proc_int"]
+            bg_color = ctx["bg_color"]
             filters = profile.get("filters", {})
+            target_names = ", ".join(Path(fp).name for fp, _ in targets)
 
             video_layers = [l for l in all_layers if getattr(l, 'is_video', False) and l.is_video]
             if not video_layers:
@@ -3265,81 +6575,227 @@ class RConverter:
                 caps.clear()
                 raise
 
-            total_frames = max((int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) for cap in caps.values()), default=0)
+            frame_counts = video_frame_counts(caps, self.ffmpeg_path)
+            total_frames = max(frame_counts.values(), default=0)
             total_frames = min(max(1, total_frames), 3000)  # Limite GIF, evita div-by-zero in progress
             last_frame = {}  # Ultimo frame per video più corti
 
-            logger.info(f"Export composito: {output_w}x{output_h} @ {fps}fps, {len(all_layers)} layer -> {filepath}")
+            logger.info(f"Export composito: {output_w}x{output_h} @ {fps}fps, {len(all_layers)} layer -> {target_names}")
 
-            # OPT-1: Pre-composito layer statici (tutti i statici prima dei video in Z order)
+            # OPT-1: Compositor a run di layer: ogni run contiguo di layer statici è appiattito una volta
+            # (il primo sullo sfondo, i successivi in RGBA premoltiplicato); per frame si alternano
+            # solo i run pre-appiattiti e i layer video, in qualunque Z order (loghi/maschere sopra i video)
             static_layers = [l for l in all_layers if not getattr(l, 'is_video', False)]
             video_only_layers = [l for l in all_layers if getattr(l, 'is_video', False)]
-            static_before_video = True
-            found_video = False
+            layer_runs = []
             for l in all_layers:
                 if getattr(l, 'is_video', False):
-                    found_video = True
-                elif found_video:
-                    static_before_video = False
-                    break
+                    layer_runs.append(("video", l))
+                elif layer_runs and layer_runs[-1][0] == "static":
+                    layer_runs[-1][1].append(l)
+                else:
+                    layer_runs.append(("static", [l]))
             static_base = None
-            if static_layers and video_only_layers and static_before_video:
+            static_key = None
+            static_stack = []  # sopra la base: ("video", layer) | ("static", (premul, inv_alpha, bbox), crop RGBA)
+            key_fill = bool(ctx.get("key_fill"))
+            alpha = any(has_alpha(prof) for _, prof in targets)
+            # Copertura dei layer (key): per Key/Fill e per i codec alpha
+            need_key = key_fill or alpha
+            if static_layers and video_only_layers:
+                bottom = layer_runs[0][1] if layer_runs[0][0] == "static" else []
                 static_base = self.create_composite_image(
                     output_w, output_h, for_export=True,
                     video_frame_overrides={},
-                    layers=static_layers
+                    layers=bottom, bg_color=bg_color, with_alpha=need_key
                 )
+                if need_key:
+                    static_base, static_key = static_base
                 static_base = static_base.convert('RGBA')
-                logger.info(f"Pre-composito statico: {len(static_layers)} layer renderizzati una volta")
+                for kind, run in layer_runs[1 if bottom else 0:]:
+                    if kind == "video":
+                        static_stack.append((kind, run))
+                        continue
+                    flat = self.create_composite_image(output_w, output_h, for_export=True,
+                                                       video_frame_overrides={}, layers=run,
+                                                       transparent=True)
+                    premul = premultiply_layer_run(flat)
+                    if premul is not None:
+                        static_stack.append((kind, premul, flat.crop(premul[2])))
+                overlay_runs = sum(1 for entry in static_stack if entry[0] == "static")
+                logger.info(f"Pre-composito statico: {len(static_layers)} layer renderizzati una volta "
+                            f"(base + {overlay_runs} run sopra i video)")
 
             # OPT-3: Pre-calcolo matrice Bayer dither (riusata per ogni frame)
             dither_type = filters.get("dither_type", "")
             bayer_tiled = None
             if dither_type == "bayer" and VIDEO_SUPPORT:
                 bayer_tiled = _precompute_bayer_tiled(output_h, output_w)
+            # Grain deband fisso: base statica e dirty rect ricevono lo stesso grain (come il Bayer)
+            grain_plane = None
+            if VIDEO_SUPPORT:
+                grain_plane = _precompute_grain_plane(
+                    output_h, output_w, int(filters.get("deband_grain", 2) * max(0.01, min(1.0, proc_int))))
 
             # OPT-2: Filtri FFmpeg - quando dither non serve, FFmpeg applica filtri (20-50x piu veloce)
             vf_chain = self._build_ffmpeg_filter_chain(filters, proc_int)
             dither_scale_val = int(filters.get("dither_scale", 2) * max(0.01, min(1.0, proc_int)))
             dither_needed = (dither_type == "bayer" and dither_scale_val > 0)
             use_ffmpeg_filters = (vf_chain is not None and len(vf_chain) > 0 and not dither_needed)
-
-            def make_composite_frame(video_frame_overrides):
-                """Crea il composito: base statica (pre-cached) + layer video, oppure composito completo."""
-                if static_base is not None and video_only_layers:
+            # Denoise temporale attivo (stessa soglia di _apply_image_processing): i segmenti lo scaldano
+            temporal_active = (VIDEO_SUPPORT and not use_ffmpeg_filters and
+                               filters.get("denoise_strength", 0) * max(0.01, min(1.0, proc_int)) > 0.2)
+            # Codec 10-bit: processing a 16 bit e pipe rgb48le (solo con processing Python)
+            proc_bits = 8 if use_ffmpeg_filters else processing_bit_depth(profile)
+            dither_bits = profile["video"].get("bit_depth", 8)
+            if proc_bits > 8:
+                logger.info(f"Processing a {proc_bits} bit (codec {dither_bits}-bit), pipe {rawvideo_pix_fmt(proc_bits)}")
+
+            def compose_stack(composite, key, placed, dx=0, dy=0):
+                """Run sopra la base in Z order su composite (in place): frame video posizionati
+                {layer: (img, x, y)} e run statici premoltiplicati. dx, dy: origine nel frame."""
+                for entry in static_stack:
+                    if entry[0] == "video":
+                        if entry[1] not in placed:
+                            continue
+                        img, x, y = placed[entry[1]]
+                        try:
+                            composite.paste(img, (x - dx, y - dy), img)
+                        except ValueError:
+                            composite.paste(img, (x - dx, y - dy))
+                    else:
+                        _, premul, img = entry
+                        composite_premultiplied(composite, premul, dx, dy)
+                        x, y = premul[2][:2]
+                    if key is not None:
+                        key = screen_alpha(key, img, x - dx, y - dy)
+                return key
+
+            static_full = static_full_key = None
+            if static_base is not None:
+                # Frame senza video: base + run statici sopra (fuori dal dirty rect)
+                static_full = static_base.copy()
+                static_full_key = compose_stack(static_full, static_key if need_key else None, {})
+            static_outputs = {}
+            static_outputs_lock = threading.Lock()
+
+            def static_output(bits):
+                """Frame statico già processato (ndarray, una volta per profondità): fuori dal dirty
+                rect il frame è sempre questo. Senza processing Python: solo il composito RGB."""
+                with static_outputs_lock:
+                    if bits not in static_outputs:
+                        rgb = static_full.convert('RGB')
+                        if use_ffmpeg_filters:
+                            static_outputs[bits] = np.asarray(rgb)
+                        else:
+                            # temporal vuoto: nessun median, come le regioni (denoise temporale)
+                            static_outputs[bits] = self._apply_image_processing(
+                                rgb, filters, intensity=proc_int, bayer_tiled=bayer_tiled, skip_bilateral=True,
+                                as_array=True, bit_depth=bits, dither_bits=dither_bits, temporal={},
+                                grain_plane=grain_plane)
+                    return static_outputs[bits]
+
+            def place_video_layers(video_frame_overrides):
+                """Frame video trasformati e posizionati: {layer: (img RGBA, x, y)}"""
+                placed = {}
+                for layer in video_only_layers:
+                    if layer in video_frame_overrides and video_frame_overrides[layer] is not None:
+                        img = self._apply_layer_transforms_to_image(
+                            video_frame_overrides[layer], layer, for_export=True)
+                        if img is None:
+                            continue
+                        zoom_pct = layer.zoom / 100.0
+                        new_w = max(1, int(img.size[0] * zoom_pct))
+                        new_h = max(1, int(img.size[1] * zoom_pct))
+                        img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
+                        x = (output_w - new_w) // 2 + layer.offset_x
+                        y = (output_h - new_h) // 2 + layer.offset_y
+                        placed[layer] = (img, x, y)
+                return placed
+
+            def make_dirty_frame(placed, rects, as_array, with_key, temporal):
+                """OPT-8: composito e processing solo nel dirty rect (layer video + alone), copiato
+                su una copia della base statica processata: costo proporzionale all'area video."""
+                (ix0, iy0, ix1, iy1), (x0, y0, x1, y1) = rects
+                region = static_base.crop((x0, y0, x1, y1))
+                key = static_key.crop((x0, y0, x1, y1)) if with_key else None
+                key = compose_stack(region, key, placed, x0, y0)
+                region = region.convert('RGB')
+                bits = proc_bits if as_array else 8
+                if use_ffmpeg_filters:
+                    patch = np.asarray(region)
+                else:
+                    patch = self._apply_image_processing(
+                        region, filters, intensity=proc_int,
+                        bayer_tiled=bayer_tiled[y0:y1, x0:x1] if bayer_tiled is not None else None,
+                        skip_bilateral=True, as_array=True, bit_depth=bits, dither_bits=dither_bits,
+                        temporal=temporal, frame_pixels=output_w * output_h,
+                        grain_plane=grain_plane[y0:y1, x0:x1] if grain_plane is not None else None)
+                # Copia (non patch in place): il buffer del frame precedente può essere ancora in coda
+                frame = static_output(bits).copy()
+                frame[iy0:iy1, ix0:ix1] = patch[iy0 - y0:iy1 - y0, ix0 - x0:ix1 - x0]
+                if not as_array:
+                    frame = Image.fromarray(frame)
+                if with_key:
+                    full_key = static_full_key.copy()
+                    full_key.paste(key.crop((ix0 - x0, iy0 - y0, ix1 - x0, iy1 - y0)), (ix0, iy0))
+                    return frame, full_key
+                return frame
+
+            def make_composite_frame(video_frame_overrides, as_array=False, with_key=False, temporal=None):
+                """Crea il composito: base statica e run statici pre-appiattiti + layer video, oppure
+                composito completo. Con video piccoli: solo il dirty rect (make_dirty_frame).
+                as_array: restituisce l'ndarray RGB del processing (nessuna conversione PIL, pipe FFmpeg),
+                a proc_bits bit per canale.
+                with_key: restituisce (composito, key L); la key non passa dal processing.
+                temporal: stato del denoise temporale della sequenza in corso (un dict per segmento).
+                """
+                key = None
+                if static_base is not None:
+                    placed = place_video_layers(video_frame_overrides)
+                    rects = dirty_rect([(x, y) + img.size for img, x, y in placed.values()],
+                                       output_w, output_h) if placed else None
+                    if rects is not None:
+                        return make_dirty_frame(placed, rects, as_array, with_key, temporal)
                     composite = static_base.copy()
-                    for layer in video_only_layers:
-                        if layer in video_frame_overrides and video_frame_overrides[layer] is not None:
-                            img = self._apply_layer_transforms_to_image(
-                                video_frame_overrides[layer], layer, for_export=True)
-                            if img is None:
-                                continue
-                            zoom_pct = layer.zoom / 100.0
-                            new_w = max(1, int(img.size[0] * zoom_pct))
-                            new_h = max(1, int(img.size[1] * zoom_pct))
-                            img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-                            x = (output_w - new_w) // 2 + layer.offset_x
-                            y = (output_h - new_h) // 2 + layer.offset_y
-                            try:
-                                composite.paste(img, (x, y), img)
-                            except ValueError:
-                                composite.paste(img, (x, y))
+                    key = compose_stack(composite, static_key if with_key else None, placed)
                     composite = composite.convert('RGB')
                 else:
                     composite = self.create_composite_image(output_w, output_h, for_export=True,
                                                             video_frame_overrides=video_frame_overrides,
-                                                            layers=all_layers)
+                                                            layers=all_layers, bg_color=bg_color,
+                                                            with_alpha=with_key)
+                    if with_key:
+                        composite, key = composite
                 if not use_ffmpeg_filters:
                     composite = self._apply_image_processing(composite, filters, intensity=proc_int,
-                                                            bayer_tiled=bayer_tiled, skip_bilateral=True)
+                                                            bayer_tiled=bayer_tiled, skip_bilateral=True,
+                                                            as_array=as_array,
+                                                            bit_depth=proc_bits if as_array else 8,
+                                                            dither_bits=dither_bits, temporal=temporal,
+                                                            grain_plane=grain_plane)
+                if with_key:
+                    return composite, key
                 return composite
 
             if ext == '.gif':
+                if need_key:
+                    logger.warning("Key/Fill e alpha non disponibili per GIF: esportato solo il fill")
                 frames = []
                 frame_count = 0
                 GIF_MAX_FRAMES = 3000
-
-                while frame_count < min(GIF_MAX_FRAMES, total_frames):
+                temporal = {}
+                # Pillow tiene tutti i frame quantizzati (1 byte/pixel) fino al salvataggio
+                gif_frames = EXPORT_MEMORY.frame_budget(output_w * output_h, min(GIF_MAX_FRAMES, total_frames))
+                if gif_frames < min(GIF_MAX_FRAMES, total_frames):
+                    notice = (f"GIF limitata a {gif_frames} frame su {total_frames} dalla RAM disponibile: "
+                              f"per il video completo esporta MP4/MOV")
+                    logger.warning(notice)
+                    ctx.setdefault("notices", []).append(notice)
+                progress = ExportProgress(gif_frames, fps=fps)
+
+                while frame_count < gif_frames:
+                    controller.checkpoint()
                     video_frame_overrides = {}
                     for layer, cap in caps.items():
                         ret, frame = cap.read()
@@ -3350,15 +6806,14 @@ class RConverter:
                         elif layer in last_frame:
                             video_frame_overrides[layer] = last_frame[layer]
 
-                    composite = make_composite_frame(video_frame_overrides)
+                    composite = make_composite_frame(video_frame_overrides, temporal=temporal)
                     frames.append(composite.quantize(colors=256, method=Image.Quantize.MEDIANCUT))
                     del composite
                     frame_count += 1
 
-                    if frame_count % 10 == 0:
-                        progress_pct = int((frame_count / max(total_frames, 1)) * 100)
-                        self.root.after(0, lambda p=progress_pct:
-                                       self.info_label.config(text=f"Esportazione GIF: {p}%"))
+                    progress.advance()
+                    if progress.due():
+                        report(progress.describe("Esportazione GIF"))
 
                 for cap in caps.values():
                     cap.release()
@@ -3368,80 +6823,46 @@ class RConverter:
                     frames[0].save(filepath, save_all=True, append_images=frames[1:],
                                    duration=int(1000 / max(fps, 1)), loop=0, optimize=True)
                     del frames
-                    gc.collect()
 
                 logger.info(f"GIF esportata: {frame_count} frames (composito completo)")
-                self.root.after(0, lambda: self.progress.stop())
-                self.root.after(0, lambda: self.info_label.config(text=""))
-                self.root.after(0, lambda: messagebox.showinfo("Successo", f"GIF salvata:\n{filepath}\n{frame_count} frames"))
-                return
+                return frame_count
 
             # MP4/AVI/WEBM: usa FFmpeg se disponibile (10-50x più veloce), altrimenti OpenCV
-            ff_cmd = self._build_ffmpeg_video_command(
-                filepath, output_w, output_h, fps, profile, ext,
-                vf_chain=vf_chain if use_ffmpeg_filters else None
-            )
-            if ff_cmd and ext != '.gif':
-                # Export via FFmpeg pipe con double-buffering (pre-fetch frame)
-                try:
-                    creationflags = getattr(subprocess, 'CREATE_NO_WINDOW', 0) if sys.platform == 'win32' else 0
-                    proc = subprocess.Popen(ff_cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE,
-                                            creationflags=creationflags)
-                    frame_queue = Queue(maxsize=16)
-
-                    def frame_reader():
-                        """Producer: legge frame in anticipo e li mette in coda"""
-                        try:
-                            lf = {}
-                            for _ in range(total_frames):
-                                overrides = {}
-                                for layer, cap in caps.items():
-                                    ret, frame = cap.read()
-                                    if ret:
-                                        pil_frame = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-                                        overrides[layer] = pil_frame
-                                        lf[layer] = pil_frame
-                                    elif layer in lf:
-                                        overrides[layer] = lf[layer]
-                                frame_queue.put(overrides)
-                            frame_queue.put(None)
-                        except Exception as e:
-                            logger.warning(f"Frame reader: {e}")
-                            frame_queue.put(None)
-
-                    threading.Thread(target=frame_reader, daemon=True).start()
-                    frame_count = 0
-                    while True:
-                        overrides = frame_queue.get()
-                        if overrides is None:
-                            break
-                        composite = make_composite_frame(overrides)
-                        proc.stdin.write(composite.tobytes())
-                        del composite
-                        frame_count += 1
-                        if frame_count % 30 == 0:
-                            pct = int((frame_count / max(total_frames, 1)) * 100)
-                            self.root.after(0, lambda p=pct: self.info_label.config(text=f"FFmpeg: {p}%"))
-                    proc.stdin.close()
-                    proc.wait(timeout=120)
-                    if proc.returncode != 0:
-                        err = proc.stderr.read().decode(errors='replace')[-500:]
-                        raise Exception(f"FFmpeg errore: {err}")
-                    for cap in caps.values():
-                        cap.release()
-                    caps.clear()
-                    logger.info(f"Video FFmpeg: {frame_count} frames")
-                    gc.collect()
-                    self.root.after(0, lambda: self.progress.stop())
-                    self.root.after(0, lambda: self.info_label.config(text=""))
-                    self.root.after(0, lambda: messagebox.showinfo("Successo", f"Video salvato:\n{filepath}\n{frame_count} frames"))
-                    return
-                except Exception as ff_ex:
-                    logger.warning(f"FFmpeg fallback a OpenCV: {ff_ex}")
-                    use_ffmpeg_filters = False  # OpenCV non usa filtri FFmpeg, applica processing Python
-                    for cap in caps.values():
-                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    # Ricrea caps se necessario (alcuni non supportano seek)
+            # Budget core: thread encoder divisi tra worker segmento x target (nessun oversubscription)
+            workers = ctx.get("segment_workers", SEGMENT_MAX_WORKERS)
+            if not all(is_intra_only(prof) for _, prof in targets):
+                workers = 1
+            workers = max(1, min(workers, -(-total_frames // SEGMENT_FRAMES)))
+            # Ogni worker tiene composito, intermedi del processing e un frame per coda encoder:
+            # niente worker oltre quelli che la RAM libera regge
+            frame_bytes = output_w * output_h * (3 * proc_bits // 8 + (1 if need_key else 0))
+            memory_workers = EXPORT_MEMORY.frame_budget(
+                frame_bytes * (SEGMENT_WORKER_FRAME_COPIES + len(targets)), workers)
+            if memory_workers < workers:
+                logger.info(f"Encode parallelo limitato a {memory_workers} worker dalla RAM disponibile")
+                workers = memory_workers
+            ff_cmds = []
+            plans = []
+            for fp, prof in targets:
+                resources = plan_encoder_resources(prof, output_w, output_h,
+                                                   ctx.get("core_budget", RENDER_CPU_COUNT),
+                                                   encoders=workers * len(targets), compositors=workers)
+                plans.append((fp, resources))
+                ff_cmds.append(self._build_ffmpeg_video_command(
+                    fp, output_w, output_h, fps, prof, Path(fp).suffix.lower(),
+                    vf_chain=vf_chain if use_ffmpeg_filters else None, resources=resources,
+                    input_pix_fmt=rawvideo_pix_fmt(proc_bits)))
+            if all(ff_cmds) and ext != '.gif':
+                for fp, resources in plans:
+                    logger.info(f"Encoder {Path(fp).name}: {describe_encoder_plan(resources)}")
+                # Coda render: uno slot per encode FFmpeg contemporaneo (worker x target, key separata
+                # = secondo encode nello stesso processo), rilasciati nel finally
+                if encoder_slot is not None:
+                    encodes = sum(2 if key_fill and not has_alpha(prof) else 1 for _, prof in targets)
+                    slots_held = encoder_slot.acquire(workers * encodes, controller)
+
+                def reopen_caps():
+                    # Ricrea caps dal frame 0 (alcuni non supportano seek)
                     for layer in list(caps.keys()):
                         caps[layer].release()
                     caps.clear()
@@ -3450,18 +6871,59 @@ class RConverter:
                         if cap.isOpened():
                             caps[layer] = cap
 
-            # Fallback OpenCV: sempre processing Python (FFmpeg non in uso)
+                base_key = self._render_base_key(all_layers, ctx, filters)
+                attempt = 0
+                while True:
+                    try:
+                        frame_count = self._encode_segmented(
+                            targets, ff_cmds, total_frames, base_key, caps, make_composite_frame, report,
+                            workers=workers, key_fill=key_fill, frame_format=(output_w, output_h, fps),
+                            controller=controller, frame_counts=frame_counts,
+                            temporal_warmup=TEMPORAL_WARMUP_FRAMES if temporal_active else 0)
+                        for cap in caps.values():
+                            cap.release()
+                        caps.clear()
+                        logger.info(f"Video FFmpeg: {frame_count} frames -> {len(targets)} target")
+                        return frame_count
+                    except Exception as ff_ex:
+                        if controller.cancelled:
+                            raise ExportCancelled("Export annullato") from ff_ex
+                        # Segmenti completati: ripresa dal checkpoint invece di ripartire da zero
+                        done = min(checkpointed_frames(segment_dir_for(fp)) for fp, _ in targets)
+                        reason = str(ff_ex).strip()
+                        if not done:
+                            logger.warning(f"FFmpeg fallback a OpenCV: {ff_ex}")
+                            break
+                        if attempt >= EXPORT_RESUME_ATTEMPTS:
+                            raise Exception(f"Export interrotto ({reason}). {done}/{total_frames} frame già "
+                                            f"codificati sono conservati: riesporta per riprendere") from ff_ex
+                        attempt += 1
+                        logger.warning(f"Export interrotto ({reason}): ripresa da {done}/{total_frames} frame "
+                                       f"(tentativo {attempt + 1})")
+                        reopen_caps()
+                use_ffmpeg_filters = False  # OpenCV non usa filtri FFmpeg, applica processing Python
+                reopen_caps()
+
+            # Fallback OpenCV: sempre processing Python (FFmpeg non in uso), un writer per target
             use_ffmpeg_filters = False
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v') if ext == '.mp4' else \
-                     cv2.VideoWriter_fourcc(*'XVID') if ext == '.avi' else \
-                     cv2.VideoWriter_fourcc(*'VP80') if ext == '.webm' else \
-                     cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(filepath, fourcc, fps, (output_w, output_h))
-            if not out.isOpened():
-                raise Exception("Impossibile creare il file video di output")
+            if need_key:
+                logger.warning("Key/Fill e alpha richiedono FFmpeg: esportato solo il fill")
+            for fp, _ in targets:
+                fp_ext = Path(fp).suffix.lower()
+                fourcc = cv2.VideoWriter_fourcc(*'mp4v') if fp_ext == '.mp4' else \
+                         cv2.VideoWriter_fourcc(*'XVID') if fp_ext == '.avi' else \
+                         cv2.VideoWriter_fourcc(*'VP80') if fp_ext == '.webm' else \
+                         cv2.VideoWriter_fourcc(*'mp4v')
+                out = cv2.VideoWriter(fp, fourcc, fps, (output_w, output_h))
+                outs.append(out)
+                if not out.isOpened():
+                    raise Exception(f"Impossibile creare il file video di output: {fp}")
 
             frame_count = 0
+            temporal = {}
+            progress = ExportProgress(total_frames, fps=fps)
             while frame_count < total_frames:
+                controller.checkpoint()
                 video_frame_overrides = {}
                 for layer, cap in caps.items():
                     ret, frame = cap.read()
@@ -3472,33 +6934,375 @@ class RConverter:
                     elif layer in last_frame:
                         video_frame_overrides[layer] = last_frame[layer]
 
-                composite = make_composite_frame(video_frame_overrides)
+                composite = make_composite_frame(video_frame_overrides, temporal=temporal)
                 output_frame = cv2.cvtColor(np.array(composite), cv2.COLOR_RGB2BGR)
-                out.write(output_frame)
+                for out in outs:
+                    out.write(output_frame)
                 del composite
                 frame_count += 1
 
-                if frame_count % 30 == 0:
-                    progress_pct = int((frame_count / max(total_frames, 1)) * 100)
-                    self.root.after(0, lambda p=progress_pct:
-                                   self.info_label.config(text=f"Esportazione video: {p}%"))
+                progress.advance()
+                if progress.due():
+                    report(progress.describe("Esportazione video"))
 
             logger.info(f"Video esportato: {frame_count} frames (composito completo)")
-            gc.collect()
-            self.root.after(0, lambda: self.progress.stop())
-            self.root.after(0, lambda: self.info_label.config(text=""))
-            self.root.after(0, lambda: messagebox.showinfo("Successo", f"Video salvato:\n{filepath}\n{frame_count} frames"))
-
-        except Exception as ex:
-            logger.error(f"Errore export video: {ex}")
-            self.root.after(0, lambda: self.progress.stop())
-            self.root.after(0, lambda: self.info_label.config(text=""))
-            self.root.after(0, lambda err=str(ex): messagebox.showerror("Errore", err))
+            return frame_count
         finally:
             for cap in caps.values():
                 cap.release()
-            if out is not None:
+            for out in outs:
                 out.release()
+            if slots_held:
+                encoder_slot.release(slots_held)
+            logger.info(EXPORT_MEMORY.describe())
+
+    def _render_base_key(self, all_layers, ctx, filters):
+        """Chiave deterministica degli input comuni a tutti i frame (hash per frame / re-render)"""
+        layers = []
+        for layer in all_layers:
+            state = {k: v for k, v in layer.get_state().items() if k != "name"}
+            if layer.is_video:
+                content = None  # Pixel sorgente inclusi frame per frame (frame_input_hash)
+            elif layer.original_image is not None:
+                content = compute_image_hash(layer.original_image)
+            else:
+                content = None
+            layers.append({"state": state, "content": content})
+        return json.dumps({
+            "size": [ctx["output_w"], ctx["output_h"]], "fps": ctx["fps"], "bg": ctx["bg_color"],
+            "proc_int": ctx["proc_int"], "filters": filters, "layers": layers,
+        }, sort_keys=True)
+
+    def _start_frame_reader(self, caps, count, held, base_digest, controller=None):
+        """Producer (thread): legge in anticipo count frame dai caps e accoda (overrides, hash frame).
+        held: {layer: (frame PIL, digest)} ultimo frame letto, tenuto per i video più corti.
+        Il digest dei pixel sorgente è calcolato qui (hashlib rilascia il GIL), in parallelo al composito.
+        controller: in pausa il reader si ferma, annullato chiude la coda (None) senza leggere oltre.
+        """
+        controller = controller or ExportController()
+        import hashlib
+        frame_queue = Queue(maxsize=FRAME_READ_QUEUE_FRAMES)
+        # Peso di un elemento: un frame PIL RGB (4 byte/pixel) per layer video
+        item_bytes = sum(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) * int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) * 4
+                         for cap in caps.values())
+        EXPORT_MEMORY.register(frame_queue, item_bytes, FRAME_READ_QUEUE_MIN, FRAME_READ_QUEUE_MAX,
+                               FRAME_READ_QUEUE_FRAMES)
+
+        def frame_reader():
+            try:
+                for _ in range(count):
+                    if not controller.wait():
+                        break
+                    overrides = {}
+                    digests = []
+                    for layer, cap in caps.items():
+                        ret, frame = cap.read()
+                        if ret:
+                            digest = hashlib.blake2b(frame, digest_size=16).digest()
+                            # Frame sorgente identico al precedente: stessa immagine, nessuna conversione
+                            if layer not in held or held[layer][1] != digest:
+                                held[layer] = (Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)), digest)
+                        if layer in held:
+                            overrides[layer] = held[layer][0]
+                            digests.append(held[layer][1])
+                        else:
+                            digests.append(b"")
+                    EXPORT_MEMORY.adapt(frame_queue)
+                    frame_queue.put((overrides, frame_input_hash(base_digest, digests)))
+                frame_queue.put(None)
+            except Exception as e:
+                logger.warning(f"Frame reader: {e}")
+                frame_queue.put(None)
+            finally:
+                EXPORT_MEMORY.unregister(frame_queue)
+
+        threading.Thread(target=frame_reader, daemon=True).start()
+        return frame_queue
+
+    def _hash_source_frames(self, caps, count, base_digest, report, controller=None):
+        """Pre-pass di sola decodifica: hash input di tutti i frame (per decidere i segmenti da rifare)"""
+        import hashlib
+        controller = controller or ExportController()
+        held = {}
+        hashes = []
+        for i in range(count):
+            controller.checkpoint()
+            digests = []
+            for layer, cap in caps.items():
+                ret, frame = cap.read()
+                if ret:
+                    held[layer] = hashlib.blake2b(frame, digest_size=16).digest()
+                digests.append(held.get(layer, b""))
+            hashes.append(frame_input_hash(base_digest, digests))
+            if i % 100 == 99:
+                report(f"Analisi frame modificati: {int((i + 1) / count * 100)}%")
+        for cap in caps.values():
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return hashes
+
+    def _encode_segmented(self, targets, ff_cmds, total_frames, base_key, caps,
+                          make_composite_frame, report, workers=1, key_fill=False, frame_format=None,
+                          controller=None, frame_counts=None, temporal_warmup=0):
+        """Encode a segmenti + concat -c copy per ogni target. Restituisce il numero di frame.
+        Se esistono segmenti di un export precedente, un pre-pass di decodifica calcola gli hash
+        per frame: i segmenti con hash invariato sono riutilizzati senza re-encode, gli altri
+        sono composti una volta e inviati agli encoder dei soli target che ne hanno bisogno.
+        Profili non intra-only: un unico segmento (nessun riuso parziale).
+        workers > 1: segmenti distribuiti a più worker in parallelo (encode segmentato, OPT-5).
+        Il manifest è riscritto dopo ogni segmento (checkpoint): un export interrotto (disco pieno,
+        crash FFmpeg) riparte dai segmenti completati, che il pre-pass ritrova per hash.
+        key_fill: per ogni target anche <nome>_key dallo stesso processo FFmpeg, key inviata su una
+        seconda pipe (FfmpegInputPipe) accanto al fill su stdin. frame_format: (w, h, fps) della key.
+        frame_counts: frame per layer (video_frame_counts) per il seek dei segmenti.
+        Target con profilo alpha: la stessa key va su una seconda pipe e diventa il canale alpha
+        (alphamerge in FFmpeg), quindi il composito resta RGB anche per HAP Alpha / ProRes 4444.
+        controller: ExportController controllato a ogni frame da reader e worker; annullando,
+        gli encoder del segmento in corso vengono terminati (i segmenti completati restano).
+        temporal_warmup: frame prima dell'inizio di ogni segmento composti e processati senza encode,
+        per portare a regime il denoise temporale; i loro hash entrano nell'hash del segmento.
+        """
+        import hashlib
+        controller = controller or ExportController()
+        base_digest = hashlib.blake2b(f"{RENDER_HASH_VERSION}:{base_key}".encode(), digest_size=16).digest()
+        seg_frames = SEGMENT_FRAMES if all(is_intra_only(prof) for _, prof in targets) else total_frames
+        segments = plan_segments(total_frames, seg_frames)
+
+        def hashed_range(seg):
+            """Frame che determinano il contenuto del segmento: warm-up + frame propri"""
+            return seg["start"] - min(temporal_warmup, seg["start"]), seg["start"] + seg["count"]
+
+        plans = []
+        for (filepath, profile), cmd in zip(targets, ff_cmds):
+            seg_dir = segment_dir_for(filepath)
+            seg_dir.mkdir(parents=True, exist_ok=True)
+            plan = {"filepath": filepath, "cmd": cmd, "dir": seg_dir, "signature": encoder_signature(cmd),
+                    "ext": Path(filepath).suffix.lower() or ".mov", "names": [None] * len(segments),
+                    "key": None, "alpha": has_alpha(profile)}
+            if plan["alpha"]:
+                plan["signature"] += "|alpha"
+                if key_fill:
+                    logger.info(f"{Path(filepath).name}: alpha nel file, nessuna key separata")
+            elif key_fill:
+                key_path = key_output_path(filepath)
+                key_dir = segment_dir_for(key_path)
+                key_dir.mkdir(parents=True, exist_ok=True)
+                plan["key"] = {"filepath": key_path, "dir": key_dir, "signature": plan["signature"] + "|key",
+                               "names": [None] * len(segments)}
+            plans.append(plan)
+
+        # Hash per frame noti in anticipo solo se c'è qualcosa da riutilizzare
+        frame_hashes = [None] * total_frames
+        if any(next(p["dir"].glob("seg_*"), None) is not None for p in plans):
+            frame_hashes = self._hash_source_frames(caps, total_frames, base_digest, report, controller)
+        todo = []
+        for seg in segments:
+            chunk = frame_hashes[slice(*hashed_range(seg))]
+            needing = []
+            for p in plans:
+                if chunk[0] is not None:
+                    outs = [p] + ([p["key"]] if p["key"] else [])
+                    names = [segment_filename(seg["index"], segment_hash(chunk, o["signature"]), p["ext"])
+                             for o in outs]
+                    if all((o["dir"] / name).is_file() for o, name in zip(outs, names)):
+                        for o, name in zip(outs, names):
+                            o["names"][seg["index"]] = name
+                        continue
+                needing.append(p)
+            if needing:
+                todo.append((seg, needing))
+        to_render = sum(seg["count"] for seg, _ in todo)
+        reused = len(segments) - len(todo)
+        label = "FFmpeg" if len(plans) == 1 else f"FFmpeg ({len(plans)} target)"
+        outputs = [p for plan in plans for p in (plan, plan["key"]) if p]
+        if reused:
+            resumed = any((read_segment_manifest(p["dir"]) or {}).get("status") == "partial" for p in plans)
+            if resumed:
+                logger.info(f"Ripresa export interrotto: {reused}/{len(segments)} segmenti già codificati")
+            else:
+                logger.info(f"Re-render: {reused}/{len(segments)} segmenti invariati riutilizzati")
+            label += f", {reused}/{len(segments)} segmenti riutilizzati"
+        manifest_lock = threading.Lock()
+
+        def write_manifests(status):
+            """Checkpoint dopo ogni segmento ("partial": segmenti con file = frame già codificati,
+            ripresi da un export successivo); "complete" con gli hash per frame dopo il concat"""
+            with manifest_lock:
+                for p in outputs:
+                    manifest = {
+                        "version": 1, "output": Path(p["filepath"]).name, "segment_frames": seg_frames,
+                        "status": status,
+                        "segments": [dict(seg, file=name) for seg, name in zip(segments, p["names"])],
+                    }
+                    if status == "complete":
+                        manifest["frames"] = frame_hashes
+                    write_segment_manifest(p["dir"], manifest)
+
+        # Checkpoint iniziale: solo i segmenti validi per questi input ed encoder
+        write_manifests("partial")
+
+        # Key per frame solo se un encoder la riceve (Key/Fill o alpha)
+        need_key = any(p["alpha"] or p["key"] for p in plans)
+        # fps, ETA e dimensione prevista; i segmenti riusati contano subito nella dimensione
+        progress = ExportProgress(total_frames, to_render, fps=frame_format[2] if frame_format else 25)
+        for p in outputs:
+            for seg, name in zip(segments, p["names"]):
+                if name is not None:
+                    progress.add_output(p["filepath"], (p["dir"] / name).stat().st_size, seg["count"])
+        stop = threading.Event()
+
+        def render_segment(seg, needing, seg_caps, state):
+            """Compone e codifica un segmento (caps e stato di lettura propri del worker)"""
+            held = state["held"]
+            read_start = hashed_range(seg)[0]
+            warmup = seg["start"] - read_start
+            if read_start != state["next_pos"]:
+                for layer, cap in seg_caps.items():
+                    n = (frame_counts or {}).get(layer) or int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                    if read_start < n:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, read_start)
+                        continue
+                    # Video più corto: riparte dall'ultimo frame, tenuto per tutto il segmento
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, n - 1))
+                    ret, frame = cap.read()
+                    if ret:
+                        held[layer] = (Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)),
+                                       hashlib.blake2b(frame, digest_size=16).digest())
+            encoders = []
+            parts = []
+            frame_queue = None
+            seg_hashes = []
+            warm_hashes = []
+            # Denoise temporale: stato nuovo per segmento, portato a regime dai frame di warm-up;
+            # il contenuto dipende solo da hashed_range (riuso dei segmenti e worker paralleli corretti)
+            temporal = {}
+            held_frames = 0
+            try:
+                for p in needing:
+                    part = p["dir"] / f"seg_{seg['index']:05d}.part{p['ext']}"
+                    parts.append((p, part))
+                    if p["alpha"]:
+                        alpha_pipe = FfmpegInputPipe(label=f"{Path(p['filepath']).name} alpha")
+                        cmd = alpha_merge_command(p["cmd"][:-1] + [str(part)], alpha_pipe.path, *frame_format)
+                        encoders.append(EncoderPipe(cmd, label=Path(p["filepath"]).name, extra_inputs=[alpha_pipe]))
+                        continue
+                    if p["key"] is None:
+                        encoders.append(EncoderPipe(p["cmd"][:-1] + [str(part)], label=Path(p["filepath"]).name))
+                        continue
+                    key_part = p["key"]["dir"] / f"seg_{seg['index']:05d}.part{p['ext']}"
+                    parts.append((p["key"], key_part))
+                    key_pipe = FfmpegInputPipe(label=f"{Path(p['filepath']).name} key")
+                    cmd = key_fill_command(p["cmd"], str(part), str(key_part), key_pipe.path, *frame_format)
+                    encoders.append(EncoderPipe(cmd, label=Path(p["filepath"]).name, extra_inputs=[key_pipe]))
+                for p, encoder in zip(needing, encoders):
+                    progress.watch(p["filepath"], seg["index"], encoder)
+                frame_queue = self._start_frame_reader(seg_caps, warmup + seg["count"], held, base_digest,
+                                                       controller)
+                while True:
+                    item = frame_queue.get()
+                    if item is None:
+                        frame_queue = None
+                        break
+                    controller.checkpoint()
+                    if stop.is_set():
+                        raise Exception("Segmento interrotto (errore in un altro worker)")
+                    overrides, frame_hash = item
+                    if len(warm_hashes) < warmup:
+                        # Warm-up: solo composito e processing (stato del denoise), nessun encode
+                        if not warm_hashes or frame_hash != warm_hashes[-1]:
+                            make_composite_frame(overrides, as_array=True, temporal=temporal)
+                        warm_hashes.append(frame_hash)
+                        continue
+                    # OPT-7: input identici al frame precedente (hold, slide, video finito) -> stesso
+                    # buffer di uscita, senza composito né processing (dither Bayer e grain sono fissi
+                    # per tutto l'export: il frame ricalcolato sarebbe identico)
+                    if seg_hashes and frame_hash == seg_hashes[-1]:
+                        held_frames += 1
+                    elif need_key:
+                        frame, key = make_composite_frame(overrides, as_array=True, with_key=True,
+                                                          temporal=temporal)
+                        data, key_data = frame_buffer(frame), key.tobytes()
+                    else:
+                        # OPT-6: ndarray del processing scritto come memoryview (nessuna copia tobytes)
+                        data = frame_buffer(make_composite_frame(overrides, as_array=True, temporal=temporal))
+                    seg_hashes.append(frame_hash)
+                    for encoder in encoders:
+                        encoder.write(data)
+                        if encoder.extra_inputs:
+                            encoder.write(key_data, stream=1)
+                    progress.advance()
+                    if progress.due():
+                        report(progress.describe(label))
+                controller.checkpoint()  # Reader chiuso per annullamento: niente finish del parziale
+                for encoder in encoders:
+                    encoder.finish(timeout=120)
+            except Exception:
+                for encoder in encoders:
+                    encoder.abort()
+                # Il reader deve terminare prima che i caps vengano rilasciati
+                while frame_queue is not None and frame_queue.get() is not None:
+                    pass
+                raise
+            finally:
+                for p in needing:
+                    progress.unwatch(p["filepath"], seg["index"])
+            if len(seg_hashes) != seg["count"]:
+                raise Exception(f"Lettura video interrotta al frame {seg['start'] + len(seg_hashes)}")
+            if held_frames:
+                logger.info(f"Segmento {seg['index']}: {held_frames} frame invariati, buffer riutilizzato")
+            frame_hashes[seg["start"]:seg["start"] + seg["count"]] = seg_hashes
+            for p, part in parts:
+                name = segment_filename(seg["index"], segment_hash(warm_hashes + seg_hashes, p["signature"]),
+                                        part.suffix)
+                os.replace(part, p["dir"] / name)
+                p["names"][seg["index"]] = name
+                progress.add_output(p["filepath"], (p["dir"] / name).stat().st_size, seg["count"])
+            write_manifests("partial")
+            state["next_pos"] = seg["start"] + seg["count"]
+
+        workers = max(1, min(workers, len(todo)))
+        if workers == 1:
+            state = {"next_pos": 0, "held": {}}
+            for seg, needing in todo:
+                render_segment(seg, needing, caps, state)
+        else:
+            # Segmenti indipendenti (intra-only): K worker, ognuno con propri caps, composito e FFmpeg
+            logger.info(f"Encode parallelo: {workers} worker su {len(todo)} segmenti")
+            work = Queue()
+            for item in todo:
+                work.put(item)
+
+            def worker(index):
+                seg_caps = caps if index == 0 else {
+                    layer: cv2.VideoCapture(layer.video_path) for layer in caps}
+                state = {"next_pos": 0 if index == 0 else -1, "held": {}}
+                try:
+                    while not stop.is_set():
+                        try:
+                            seg, needing = work.get_nowait()
+                        except Empty:
+                            break
+                        render_segment(seg, needing, seg_caps, state)
+                except Exception:
+                    stop.set()
+                    raise
+                finally:
+                    if index != 0:
+                        for cap in seg_caps.values():
+                            cap.release()
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(worker, i) for i in range(workers)]
+            for future in futures:
+                future.result()
+
+        controller.checkpoint()
+        report(f"{label}: unione segmenti...")
+        for p in outputs:
+            concat_segments(self.ffmpeg_path, [p["dir"] / name for name in p["names"]], p["filepath"])
+        write_manifests("complete")
+        for p in outputs:
+            remove_stale_segments(p["dir"], set(p["names"]))
+        return total_frames
 
     def _process_video_frame_optimized(self, frame, output_w, output_h,
                                         flip_h, flip_v, rotation, zoom,